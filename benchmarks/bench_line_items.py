@@ -0,0 +1,54 @@
+"""Time to add line items, one field at a time versus add_line_items().
+
+Usage: python benchmarks/bench_line_items.py [sizes...]
+
+The field-by-field path is quadratic and only run up to 1,000 lines.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from facturx import FacturX  # noqa: E402
+
+SAMPLE = os.path.join(os.path.dirname(__file__), os.pardir, 'facturx', 'tests', 'sample_invoices',
+                      'no_embedded_data.pdf')
+SIZES = (10, 1000, 50000)
+# beyond this, setting fields one by one takes too long
+SETITEM_MAX_SIZE = 1000
+
+
+def make_rows(size):
+    return [{'line_id': str(i), 'charge_amount': '10.00', 'line_total_amount': '10.00', 'tva_rate2': '20'}
+            for i in range(1, size + 1)]
+
+
+def bench_setitem(rows):
+    inv = FacturX(SAMPLE, level='en16931')
+    start = time.perf_counter()
+    for row in rows:
+        for field_name, value in row.items():
+            inv[field_name] = value
+    return time.perf_counter() - start
+
+
+def bench_bulk(rows):
+    inv = FacturX(SAMPLE, level='en16931')
+    start = time.perf_counter()
+    inv.add_line_items(rows, replace=True)
+    return time.perf_counter() - start
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+    print('%8s %14s %14s %10s' % ('lines', '__setitem__', 'bulk', 'us/line'))
+    for size in sizes:
+        rows = make_rows(size)
+        bulk = bench_bulk(rows)
+        setitem = '%12.3f s' % bench_setitem(rows) if size <= SETITEM_MAX_SIZE else '%14s' % '-'
+        print('%8d %s %12.3f s %10.1f' % (size, setitem, bulk, bulk / size * 1e6))
+
+
+if __name__ == '__main__':
+    main()
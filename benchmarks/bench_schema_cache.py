@@ -0,0 +1,51 @@
+"""Per-invoice XSD validation cost with a cold and a warm schema cache.
+
+Usage: python benchmarks/bench_schema_cache.py [rounds]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from facturx import FacturX  # noqa: E402
+from facturx.flavors.xml_flavor import XMLFlavor  # noqa: E402
+
+SAMPLES_DIR = os.path.join(os.path.dirname(__file__), os.pardir, 'facturx', 'tests', 'sample_invoices')
+
+
+def load_invoices():
+    invoices = []
+    for file_name in sorted(os.listdir(SAMPLES_DIR)):
+        inv = FacturX(os.path.join(SAMPLES_DIR, file_name))
+        invoices.append((file_name, inv.flavor, inv.xml))
+    return invoices
+
+
+def bench(invoices, rounds, cold):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for _, flavor, xml in invoices:
+            if cold:
+                XMLFlavor.clear_schema_cache()
+            flavor.check_xsd(xml)
+    elapsed = time.perf_counter() - start
+    return elapsed / (rounds * len(invoices))
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    invoices = load_invoices()
+
+    cold = bench(invoices, rounds, cold=True)
+    XMLFlavor.preload_schemas()
+    warm = bench(invoices, rounds, cold=False)
+
+    print('invoices: %d, rounds: %d' % (len(invoices), rounds))
+    print('cold cache: %8.3f ms/invoice' % (cold * 1000))
+    print('warm cache: %8.3f ms/invoice' % (warm * 1000))
+    print('speedup:    %8.1fx' % (cold / warm))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""Load test of the HTTP service (facturx.server) with the sample invoices.
+
+Unless --url is given, a server is started in a subprocess on a free local
+port, with --jobs workers, and stopped at the end. Clients send the sample
+PDFs in a loop over keep-alive connections, then latency percentiles and
+throughput are reported per endpoint.
+
+Usage:
+    python benchmarks/load_test.py [--endpoints to-dict validate] [--concurrency 8] [--requests 1000]
+    python benchmarks/load_test.py --url http://127.0.0.1:8080 [--json results.json]
+"""
+import argparse
+import collections
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+SAMPLES_DIR = os.path.join(os.path.dirname(__file__), os.pardir, 'facturx', 'tests', 'sample_invoices')
+ENDPOINTS = ('extract', 'validate', 'to-dict')
+STARTUP_TIMEOUT = 30
+
+
+def load_bodies():
+    bodies = []
+    for file_name in sorted(os.listdir(SAMPLES_DIR)):
+        if file_name.lower().endswith('.pdf'):
+            with open(os.path.join(SAMPLES_DIR, file_name), 'rb') as f:
+                bodies.append(f.read())
+    return bodies
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _health(host, port):
+    connection = http.client.HTTPConnection(host, port, timeout=1)
+    try:
+        connection.request('GET', '/health')
+        return connection.getresponse().status == 200
+    except OSError:
+        return False
+    finally:
+        connection.close()
+
+
+def start_server(jobs, executor):
+    port = _free_port()
+    command = [sys.executable, '-m', 'facturx.server', '--port', str(port), '--executor', executor]
+    if jobs:
+        command += ['--jobs', str(jobs)]
+    process = subprocess.Popen(command, cwd=os.path.join(os.path.dirname(__file__), os.pardir))
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while not _health('127.0.0.1', port):
+        if process.poll() is not None or time.monotonic() > deadline:
+            process.kill()
+            raise RuntimeError('The server did not start.')
+        time.sleep(0.1)
+    return process, port
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+
+def run_endpoint(host, port, endpoint, bodies, concurrency, total):
+    """Send total requests with concurrency clients, return the summary dict."""
+    latencies = []
+    statuses = collections.Counter()
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def client():
+        connection = http.client.HTTPConnection(host, port)
+        own_latencies, own_statuses = [], collections.Counter()
+        try:
+            for index in counter:
+                body = bodies[index % len(bodies)]
+                start = time.perf_counter()
+                try:
+                    connection.request('POST', '/' + endpoint, body=body, headers={'Content-Type': 'application/pdf'})
+                    response = connection.getresponse()
+                    response.read()
+                    status = response.status
+                    if response.will_close:
+                        connection.close()
+                except (OSError, http.client.HTTPException):
+                    status = 'error'
+                    connection.close()
+                own_latencies.append(time.perf_counter() - start)
+                own_statuses[status] += 1
+        finally:
+            connection.close()
+            with lock:
+                latencies.extend(own_latencies)
+                statuses.update(own_statuses)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'endpoint': endpoint,
+        'requests': len(latencies),
+        'concurrency': concurrency,
+        'statuses': {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        'elapsed_s': elapsed,
+        'throughput_rps': len(latencies) / elapsed if elapsed else None,
+        'p50_ms': percentile(latencies, 0.50) * 1000 if latencies else None,
+        'p99_ms': percentile(latencies, 0.99) * 1000 if latencies else None,
+        'max_ms': latencies[-1] * 1000 if latencies else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='running server to test (default: start one)')
+    parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent clients (default: 8)')
+    parser.add_argument('--requests', type=int, default=1000, help='requests per endpoint (default: 1000)')
+    parser.add_argument('--warmup', type=int, default=50, help='requests sent before measuring (default: 50)')
+    parser.add_argument('-j', '--jobs', type=int, help='workers of the started server (default: number of CPUs)')
+    parser.add_argument('--executor', choices=('process', 'thread'), default='process')
+    parser.add_argument('--json', metavar='PATH', help='write the results as JSON')
+    args = parser.parse_args(argv)
+
+    bodies = load_bodies()
+    process = None
+    if args.url:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        process, port = start_server(args.jobs, args.executor)
+        host = '127.0.0.1'
+    try:
+        results = []
+        for endpoint in args.endpoints:
+            run_endpoint(host, port, endpoint, bodies, args.concurrency, args.warmup)
+            result = run_endpoint(host, port, endpoint, bodies, args.concurrency, args.requests)
+            results.append(result)
+            print('%-9s %5d requests  %7.1f req/s  p50 %7.2f ms  p99 %7.2f ms  max %7.2f ms  %s' % (
+                endpoint, result['requests'], result['throughput_rps'], result['p50_ms'], result['p99_ms'],
+                result['max_ms'], ' '.join('%s:%d' % item for item in result['statuses'].items())))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'bodies': len(bodies), 'results': results}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
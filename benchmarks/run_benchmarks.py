@@ -0,0 +1,221 @@
+"""Benchmark suite covering the invoice lifecycle.
+
+Each case runs on the bundled sample invoices and on synthetic inputs (a PDF
+with many pages, an invoice with many line items). Wall time is measured over
+several rounds, peak memory is measured with tracemalloc on one extra round.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--json results.json]
+    python benchmarks/run_benchmarks.py --compare baseline.json [--threshold 0.2]
+
+With --compare, cases whose median time (or peak memory) grew by more than
+the threshold over the baseline are reported and the exit status is 1.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from io import BytesIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from pypdf import PdfReader, PdfWriter  # noqa: E402
+
+from facturx import FacturX, extract_xml_bytes  # noqa: E402
+from facturx.utils.logger import logger  # noqa: E402
+
+SAMPLES_DIR = os.path.join(os.path.dirname(__file__), os.pardir, 'facturx', 'tests', 'sample_invoices')
+# valid EN 16931 invoice the synthetic inputs are derived from
+SYNTHETIC_SOURCE = 'Facture_FR_EN16931.pdf'
+RESULT_FORMAT = 1
+
+GET_FIELDS = ('invoice_number', 'date', 'seller_name', 'buyer_name', 'currency', 'amount_total')
+
+
+def _open(inv_input):
+    return FacturX(inv_input['path'])
+
+
+# name -> (setup(input) -> state, run(state)). setup is not measured.
+CASES = {
+    'open_path': (lambda i: i['path'], FacturX),
+    'open_stream': (lambda i: i['data'], lambda data: FacturX(BytesIO(data))),
+    'extract_xml': (lambda i: i['data'], extract_xml_bytes),
+    'check_xsd': (_open, lambda inv: inv.flavor.check_xsd(inv.xml)),
+    'to_dict': (_open, lambda inv: inv.to_dict()),
+    'getitem': (_open, lambda inv: [inv[field] for field in GET_FIELDS]),
+    'setitem': (_open, lambda inv: inv.__setitem__('invoice_number', 'INV-BENCH-001')),
+    # mark_modified() so that the serialization cache is bypassed
+    'xml_str': (_open, lambda inv: (inv.mark_modified(), inv.xml_str)),
+    'write_pdf': (lambda i: (_open(i), i['output']), lambda state: state[0].write_pdf(state[1] + '.pdf')),
+    'write_json': (lambda i: (_open(i), i['output']), lambda state: state[0].write_json(state[1] + '.json')),
+}
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def corpus_inputs():
+    for file_name in sorted(os.listdir(SAMPLES_DIR)):
+        path = os.path.join(SAMPLES_DIR, file_name)
+        yield file_name, path, _read(path)
+
+
+def synthetic_inputs(pages, lines):
+    source = os.path.join(SAMPLES_DIR, SYNTHETIC_SOURCE)
+
+    reader = PdfReader(source)
+    writer = PdfWriter(clone_from=reader)
+    for _ in range(pages - 1):
+        writer.add_page(reader.pages[0])
+    output = BytesIO()
+    writer.write(output)
+    yield 'synthetic-%d-pages' % pages, output.getvalue()
+
+    inv = FacturX(source)
+    inv.add_line_items(({'line_id': str(n)} for n in range(1, lines + 1)), replace=True)
+    yield 'synthetic-%d-lines' % lines, inv.to_pdf_bytes()
+
+
+def build_inputs(kind, work_dir, pages, lines):
+    inputs = []
+    if kind in ('corpus', 'all'):
+        for name, path, data in corpus_inputs():
+            inputs.append({'name': name, 'path': path, 'data': data})
+    if kind in ('synthetic', 'all'):
+        for name, data in synthetic_inputs(pages, lines):
+            path = os.path.join(work_dir, name + '.pdf')
+            with open(path, 'wb') as f:
+                f.write(data)
+            inputs.append({'name': name, 'path': path, 'data': data})
+    for inv_input in inputs:
+        inv_input['output'] = os.path.join(work_dir, 'out-' + os.path.splitext(inv_input['name'])[0])
+    return inputs
+
+
+def measure(case, inv_input, rounds):
+    setup, run = CASES[case]
+    timings = []
+    for _ in range(rounds):
+        state = setup(inv_input)
+        start = time.perf_counter()
+        run(state)
+        timings.append(time.perf_counter() - start)
+
+    state = setup(inv_input)
+    tracemalloc.start()
+    try:
+        run(state)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'case': case,
+        'input': inv_input['name'],
+        'rounds': rounds,
+        'min_s': min(timings),
+        'median_s': statistics.median(timings),
+        'peak_kib': peak / 1024.0,
+    }
+
+
+def run_suite(cases, inputs, rounds, verbose=True):
+    results = []
+    for case in cases:
+        for inv_input in inputs:
+            try:
+                result = measure(case, inv_input, rounds)
+            except Exception as e:
+                result = {'case': case, 'input': inv_input['name'], 'error': '%s: %s' % (type(e).__name__, e)}
+            results.append(result)
+            if verbose:
+                print_result(result)
+    return results
+
+
+def print_result(result):
+    if 'error' in result:
+        print('%-12s %-44s ERROR %s' % (result['case'], result['input'], result['error']))
+    else:
+        print('%-12s %-44s %10.3f ms %12.1f KiB' % (
+            result['case'], result['input'], result['median_s'] * 1000, result['peak_kib']))
+
+
+def compare(results, baseline, threshold, min_delta_s=0.0):
+    """Return the results that regressed by more than threshold (a ratio) over baseline.
+
+    Time differences below min_delta_s are ignored, they are mostly noise.
+    """
+    reference = {(r['case'], r['input']): r for r in baseline['results'] if 'error' not in r}
+    regressions = []
+    for result in results:
+        base = reference.get((result['case'], result['input']))
+        if base is None or 'error' in result:
+            continue
+        for metric in ('median_s', 'peak_kib'):
+            if metric == 'median_s' and result[metric] - base[metric] < min_delta_s:
+                continue
+            if base[metric] > 0 and result[metric] > base[metric] * (1 + threshold):
+                regressions.append((result, metric, result[metric] / base[metric]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES), default=list(CASES))
+    parser.add_argument('--inputs', choices=('corpus', 'synthetic', 'all'), default='all')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--pages', type=int, default=500, help='pages of the synthetic PDF')
+    parser.add_argument('--lines', type=int, default=5000, help='line items of the synthetic invoice')
+    parser.add_argument('--json', metavar='PATH', help='write the results as JSON')
+    parser.add_argument('--compare', metavar='PATH', help='baseline JSON results to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='relative growth reported as a regression (default: 0.2)')
+    parser.add_argument('--min-delta-ms', type=float, default=0.5,
+                        help='ignore time differences below this (default: 0.5)')
+    args = parser.parse_args(argv)
+
+    logger.setLevel(logging.ERROR)
+    work_dir = tempfile.mkdtemp(prefix='facturx-bench-')
+    try:
+        inputs = build_inputs(args.inputs, work_dir, args.pages, args.lines)
+        results = run_suite(args.cases, inputs, args.rounds)
+    finally:
+        shutil.rmtree(work_dir)
+
+    report = {
+        'format': RESULT_FORMAT,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'rounds': args.rounds,
+        'results': results,
+    }
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms / 1000.0)
+        for result, metric, ratio in regressions:
+            print('REGRESSION %-12s %-44s %s x%.2f' % (result['case'], result['input'], metric, ratio))
+        if regressions:
+            return 1
+        print('No regression beyond %d%%.' % (args.threshold * 100))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
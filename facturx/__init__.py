@@ -1,3 +1,27 @@
 # -*- coding: utf-8 -*-
 
-from .facturx import FacturX
\ No newline at end of file
+import importlib
+
+__all__ = ['FacturX', 'warm_up', 'extract_xml', 'extract_xml_bytes']
+
+# Public name -> submodule defining it. The submodules pull in lxml and pypdf,
+# they are only imported when one of these names is first used (PEP 562).
+_LAZY_ATTRIBUTES = {
+    'FacturX': 'facturx',
+    'warm_up': 'facturx',
+    'extract_xml': 'extract',
+    'extract_xml_bytes': 'extract',
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    value = getattr(importlib.import_module('.' + module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
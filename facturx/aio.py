@@ -0,0 +1,88 @@
+"""
+Asyncio support for FacturX.
+
+Blocking work never runs on the event loop:
+- file reads and writes run on the loop's default executor,
+- CPU-heavy steps (PDF parsing, XML parsing, XSD validation, PDF
+  serialization) run on a configurable executor, at most `max_concurrency`
+  at a time, so that a burst of large PDFs cannot monopolize the workers.
+
+The FacturX coroutine methods (aopen, ais_valid, ato_dict, awrite_pdf) are
+built on the helpers of this module.
+"""
+
+import asyncio
+import functools
+import os
+import weakref
+
+__all__ = ['configure', 'read_file', 'run_blocking', 'write_file']
+
+_config = {
+    'executor': None,
+    'max_concurrency': os.cpu_count() or 1,
+}
+# asyncio primitives are bound to a loop, keep one semaphore per loop
+_semaphores = weakref.WeakKeyDictionary()
+# default of configure(): None is a valid executor
+_UNCHANGED = object()
+
+
+def configure(executor=_UNCHANGED, max_concurrency=None):
+    """Set the executor and concurrency limit used for CPU-heavy steps.
+
+    executor is any concurrent.futures.Executor, None meaning the loop's
+    default executor. Arguments left out keep their current value.
+    Changing max_concurrency only affects event loops that have not run
+    any FacturX step yet: the others keep their limit, so that running and
+    new steps are still limited together.
+    """
+    if executor is not _UNCHANGED:
+        _config['executor'] = executor
+    if max_concurrency is not None:
+        if max_concurrency < 1:
+            raise ValueError('max_concurrency must be at least 1.')
+        _config['max_concurrency'] = max_concurrency
+
+
+def _semaphore():
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(_config['max_concurrency'])
+        _semaphores[loop] = semaphore
+    return semaphore
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a CPU-heavy callable on the configured executor, within the concurrency limit."""
+    async with _semaphore():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_config['executor'], functools.partial(func, *args, **kwargs))
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+async def read_file(path):
+    """Read a whole file without blocking the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(None, _read, path)
+
+
+async def write_file(path_or_stream, data):
+    """Write data to a path, an asyncio StreamWriter or a binary file object."""
+    loop = asyncio.get_running_loop()
+    if isinstance(path_or_stream, (str, os.PathLike)):
+        await loop.run_in_executor(None, _write, path_or_stream, data)
+    elif hasattr(path_or_stream, 'drain'):
+        path_or_stream.write(data)
+        await path_or_stream.drain()
+    else:
+        await loop.run_in_executor(None, path_or_stream.write, data)
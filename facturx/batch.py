@@ -0,0 +1,177 @@
+"""
+Run FacturX operations over many invoices with a pool of workers.
+
+Workers are warmed up once (schemas, compiled XPaths, dispatch tables) and
+results are streamed back, either in input order or as they complete. An
+invoice failing does not abort the batch: its error is captured in its
+result.
+"""
+
+import collections
+import os
+import time
+from concurrent import futures
+
+from .facturx import FacturX, warm_up
+
+__all__ = ['BatchResult', 'EXECUTORS', 'OPERATIONS', 'make_executor', 'map_sources', 'open_output', 'output_path',
+           'process_invoice', 'run_batch']
+
+OPERATIONS = ('open', 'to_dict', 'is_valid', 'write_pdf')
+EXECUTORS = ('process', 'thread', 'serial')
+
+BatchResult = collections.namedtuple('BatchResult', ['index', 'source', 'result', 'error', 'elapsed'])
+BatchResult.__doc__ = """Outcome of the operations run on one source.
+
+- index: position of the source in the input iterable.
+- source: the source itself (path, or None for in-memory sources).
+- result: dict mapping each operation to its value, None on error.
+- error: 'ExceptionType: message' if an operation raised, else None.
+- elapsed: wall time spent on the source, in seconds.
+"""
+
+
+def output_path(output_dir, index, source, extension='.pdf'):
+    """Return the path of the file written in output_dir for the index-th source.
+
+    Names are prefixed with the index, e.g. 0003-invoice.pdf, so that sources
+    having the same name in different directories do not collide.
+    """
+    name = os.path.splitext(os.path.basename(source))[0] if isinstance(source, str) else 'invoice'
+    return os.path.join(output_dir, '%04d-%s%s' % (index, name, extension))
+
+
+def open_output(path, source=None, force=False):
+    """Open path for writing in binary mode.
+
+    An existing file raises FileExistsError unless force is true. The source
+    itself is never overwritten.
+    """
+    if isinstance(source, str) and os.path.exists(path) and os.path.samefile(path, source):
+        raise FileExistsError("Refusing to overwrite the source '%s'." % source)
+    return open(path, 'wb' if force else 'xb')
+
+
+def process_invoice(source, operations=('to_dict',), output_dir=None, flavor='factur-x',
+                    level='minimum', index=0):
+    """Open one source and run operations on it, in order.
+
+    source is a path, PDF bytes or a binary file object. Returns a dict
+    mapping each operation to its value:
+    - open: {'flavor': ..., 'level': ...}
+    - to_dict: the FacturX.to_dict() output
+    - is_valid: the FacturX.is_valid() output
+    - write_pdf: path of the written PDF, in output_dir (see output_path).
+      Existing files are not overwritten.
+    """
+    result = {}
+    with FacturX(source, flavor, level) as inv:
+        for operation in operations:
+            if operation == 'open':
+                result[operation] = {'flavor': inv.flavor.name, 'level': inv.flavor.level}
+            elif operation == 'to_dict':
+                result[operation] = inv.to_dict()
+            elif operation == 'is_valid':
+                result[operation] = inv.is_valid()
+            elif operation == 'write_pdf':
+                path = output_path(output_dir, index, source)
+                with open_output(path, source) as f:
+                    inv.write_pdf(f)
+                result[operation] = path
+    return result
+
+
+def _run_one(index, source, operations, output_dir, flavor, level):
+    # Module level so that it can be sent to process pool workers.
+    start = time.perf_counter()
+    try:
+        result = process_invoice(source, operations, output_dir, flavor, level, index)
+        error = None
+    except Exception as e:
+        # exceptions are not always picklable, keep their description only
+        result = None
+        error = '%s: %s' % (type(e).__name__, e)
+    elapsed = time.perf_counter() - start
+    return BatchResult(index, source if isinstance(source, str) else None, result, error, elapsed)
+
+
+def make_executor(executor, jobs, flavor='factur-x'):
+    """Return a pool of jobs warmed-up workers, executor being 'process' or 'thread'.
+
+    Process workers run warm_up(flavor) when they start. Threads share the
+    caches of the current process, which is warmed up here.
+    """
+    if executor == 'process':
+        return futures.ProcessPoolExecutor(max_workers=jobs, initializer=warm_up, initargs=(flavor,))
+    warm_up(flavor)
+    return futures.ThreadPoolExecutor(max_workers=jobs)
+
+
+def run_batch(sources, operations=('to_dict',), jobs=None, executor='process', ordered=True,
+              output_dir=None, flavor='factur-x', level='minimum', max_pending=None):
+    """Run operations on every source and yield a BatchResult per source.
+
+    Args:
+    - sources: iterable of paths, PDF bytes or (thread/serial only) file objects.
+      It is consumed lazily.
+    - operations: names from OPERATIONS, run in order on each invoice.
+    - jobs: number of workers, defaults to the number of CPUs.
+    - executor: 'process', 'thread' or 'serial' (no pool, for debugging).
+    - ordered: yield results in input order, or as soon as they complete.
+    - output_dir: directory receiving written PDFs, required by 'write_pdf'.
+    - flavor, level: used for PDFs without embedded XML.
+    - max_pending: maximum number of submitted but not yet yielded sources,
+      bounding memory on large batches. Defaults to 4 per worker.
+    """
+    operations = tuple(operations)
+    for operation in operations:
+        if operation not in OPERATIONS:
+            raise ValueError("Unknown operation '%s', expected one of %s." % (operation, OPERATIONS))
+    if 'write_pdf' in operations and output_dir is None:
+        raise ValueError("The 'write_pdf' operation requires an output_dir.")
+    if executor not in EXECUTORS:
+        raise ValueError("Unknown executor '%s', expected one of %s." % (executor, EXECUTORS))
+
+    args = (operations, output_dir, flavor, level)
+    return map_sources(_run_one, sources, args, jobs, executor, ordered, flavor, max_pending)
+
+
+def map_sources(func, sources, args, jobs=None, executor='process', ordered=True, flavor='factur-x',
+                max_pending=None):
+    """Yield func(index, source, *args) for every source, run by a pool of workers.
+
+    sources is consumed lazily and at most max_pending calls (4 per worker
+    by default) are in flight, so memory stays bounded. executor is one of
+    EXECUTORS; 'serial' runs everything in the current process. Results are
+    yielded in input order unless ordered is false.
+
+    func must be defined at module level to be sent to process workers.
+    """
+    if executor == 'serial':
+        warm_up(flavor)
+        for index, source in enumerate(sources):
+            yield func(index, source, *args)
+        return
+
+    jobs = jobs or os.cpu_count() or 1
+    max_pending = max_pending or jobs * 4
+    with make_executor(executor, jobs, flavor) as pool:
+        pending = collections.deque() if ordered else set()
+        for index, source in enumerate(sources):
+            future = pool.submit(func, index, source, *args)
+            if ordered:
+                pending.append(future)
+                if len(pending) >= max_pending:
+                    yield pending.popleft().result()
+            else:
+                pending.add(future)
+                if len(pending) >= max_pending:
+                    done, pending = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+        if ordered:
+            while pending:
+                yield pending.popleft().result()
+        else:
+            for future in futures.as_completed(pending):
+                yield future.result()
@@ -0,0 +1,186 @@
+"""
+Persistent cache of the data extracted from Factur-X PDFs, in SQLite.
+
+Entries are keyed by the SHA-256 of the PDF content, so that renamed or
+copied files are found again. Paths are also recorded with their size and
+modification time: as long as these match, a file is not even read, only
+stat'ed.
+
+Each entry holds the embedded XML bytes, the detected flavor and level, the
+result of FacturX.validate() and the FacturX.to_dict() output. The whole
+cache is cleared when the library version, its files or the field mappings
+(fields.yml, flavors.yml) change.
+"""
+
+import collections
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+from .extract import xml_bytes_from_reader
+from .facturx import FacturX
+from .flavors.xml_flavor import yaml_digests
+from .utils import metrics
+from .utils.buffers import BUFFER_TYPES
+
+__all__ = ['CachedInvoice', 'InvoiceCache']
+
+# Bumped whenever the layout or the meaning of the stored values changes.
+CACHE_FORMAT = 1
+
+CachedInvoice = collections.namedtuple('CachedInvoice', ['sha256', 'xml', 'flavor', 'level', 'valid', 'data'])
+CachedInvoice.__doc__ = """Data extracted from one PDF.
+
+- sha256: hex digest of the PDF content.
+- xml: embedded XML bytes, as found in the PDF. None, like flavor, level
+  and data, when the PDF has no Factur-X XML.
+- valid: FacturX.validate().valid.
+- data: FacturX.to_dict() output.
+"""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS invoices (
+    sha256 TEXT PRIMARY KEY, xml BLOB, flavor TEXT, level TEXT, valid INTEGER NOT NULL, data TEXT);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, sha256 TEXT NOT NULL);
+"""
+
+
+@functools.lru_cache(maxsize=None)
+def _source_digest():
+    """Return the digest of the package files: code, schemas and templates."""
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    for dir_path, dir_names, file_names in os.walk(package_dir):
+        dir_names[:] = sorted(name for name in dir_names if name not in ('tests', '__pycache__'))
+        for file_name in sorted(file_names):
+            path = os.path.join(dir_path, file_name)
+            digest.update(os.path.relpath(path, package_dir).replace(os.sep, '/').encode('utf-8') + b'\0')
+            with open(path, 'rb') as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+def _library_version():
+    from importlib.metadata import PackageNotFoundError, version
+    try:
+        release = version('pyfacturx')
+    except PackageNotFoundError:
+        # running from a source tree
+        release = 'source'
+    # source trees and editable installs change without a new release
+    return '%s+%s' % (release, _source_digest())
+
+
+def cache_fingerprint():
+    """Return the digest of everything the cached values depend on."""
+    key = json.dumps([CACHE_FORMAT, _library_version(), yaml_digests()], sort_keys=True)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def extract_invoice(pdf_bytes, sha256=None):
+    """Compute the CachedInvoice of a PDF, without using the cache."""
+    if sha256 is None:
+        sha256 = hashlib.sha256(pdf_bytes).hexdigest()
+    with FacturX(pdf_bytes, validation='off') as inv:
+        xml = xml_bytes_from_reader(inv.pdf_reader)
+        if xml is None:
+            return CachedInvoice(sha256, None, None, None, False, None)
+        return CachedInvoice(sha256, xml, inv.flavor.name, inv.flavor.level, inv.validate().valid, inv.to_dict())
+
+
+class InvoiceCache(object):
+    """SQLite cache of CachedInvoice entries, stored at path.
+
+    The cache can be shared by threads, and by processes opening the same
+    file. Use get() to read an entry, computed and stored on a miss.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            self._connection.executescript(_SCHEMA)
+            fingerprint = cache_fingerprint()
+            row = self._connection.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+            if row is None or row[0] != fingerprint:
+                self._clear()
+                self._connection.execute("INSERT OR REPLACE INTO meta VALUES ('fingerprint', ?)", (fingerprint,))
+
+    def get(self, source):
+        """Return the CachedInvoice of source, a path or PDF content in memory."""
+        if isinstance(source, BUFFER_TYPES):
+            pdf_bytes = bytes(source)
+            return self._get_content(pdf_bytes, hashlib.sha256(pdf_bytes).hexdigest())
+
+        path = os.path.abspath(source)
+        stat = os.stat(path)
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT sha256 FROM files WHERE path = ? AND size = ? AND mtime_ns = ?',
+                (path, stat.st_size, stat.st_mtime_ns)).fetchone()
+            entry = self._load(row[0]) if row is not None else None
+        if entry is not None:
+            metrics.count('cache.hit', cache='invoice')
+            return entry
+
+        with open(path, 'rb') as f:
+            pdf_bytes = f.read()
+        sha256 = hashlib.sha256(pdf_bytes).hexdigest()
+        entry = self._get_content(pdf_bytes, sha256)
+        with self._lock, self._connection:
+            self._connection.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)',
+                                     (path, stat.st_size, stat.st_mtime_ns, sha256))
+        return entry
+
+    def _get_content(self, pdf_bytes, sha256):
+        with self._lock:
+            entry = self._load(sha256)
+        if entry is not None:
+            metrics.count('cache.hit', cache='invoice')
+            return entry
+        metrics.count('cache.miss', cache='invoice')
+        entry = extract_invoice(pdf_bytes, sha256)
+        data = json.dumps(entry.data) if entry.data is not None else None
+        with self._lock, self._connection:
+            self._connection.execute('INSERT OR REPLACE INTO invoices VALUES (?, ?, ?, ?, ?, ?)',
+                                     (sha256, entry.xml, entry.flavor, entry.level, int(entry.valid), data))
+        return entry
+
+    def _load(self, sha256):
+        row = self._connection.execute(
+            'SELECT xml, flavor, level, valid, data FROM invoices WHERE sha256 = ?', (sha256,)).fetchone()
+        if row is None:
+            return None
+        xml, flavor, level, valid, data = row
+        return CachedInvoice(sha256, xml, flavor, level, bool(valid),
+                             json.loads(data) if data is not None else None)
+
+    def clear(self):
+        """Remove every entry."""
+        with self._lock, self._connection:
+            self._clear()
+
+    def _clear(self):
+        self._connection.execute('DELETE FROM files')
+        self._connection.execute('DELETE FROM invoices')
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM invoices').fetchone()[0]
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
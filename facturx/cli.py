@@ -0,0 +1,196 @@
+"""
+Command-line interface: python -m facturx, or the facturx script.
+
+Every command takes PDF files, directories (searched recursively for PDFs),
+glob patterns, or '-' to read paths from stdin, one per line. Invoices are
+processed in a single process, by --jobs workers, and one JSON record per
+invoice is written to stdout as soon as it is available (NDJSON):
+
+    {"source": "a.pdf", "status": "ok", "elapsed_ms": 12.3, ...}
+
+status is 'ok', 'invalid' (validate only) or 'error', with the error message
+in 'error'. The exit status is 0 when every record is 'ok', 1 otherwise.
+
+Output files are prefixed with the index of their input (0003-invoice.pdf),
+so that inputs with the same name do not collide. Existing files, and the
+inputs themselves, are not overwritten unless --force is given (inputs never).
+"""
+
+import argparse
+import functools
+import glob
+import json
+import os
+import sys
+import time
+
+__all__ = ['COMMANDS', 'iter_paths', 'main', 'process_path']
+
+COMMANDS = ('extract', 'validate', 'to-json', 'embed')
+
+
+def iter_paths(inputs, stdin=None):
+    """Expand files, directories, glob patterns and '-' (stdin) into paths."""
+    for item in inputs:
+        if item == '-':
+            for line in stdin if stdin is not None else sys.stdin:
+                line = line.strip()
+                if line:
+                    yield line
+        elif os.path.isdir(item):
+            for dir_path, dir_names, file_names in os.walk(item):
+                dir_names.sort()
+                for file_name in sorted(file_names):
+                    if file_name.lower().endswith('.pdf'):
+                        yield os.path.join(dir_path, file_name)
+        elif glob.has_magic(item):
+            for path in sorted(glob.glob(item, recursive=True)):
+                if os.path.isfile(path):
+                    yield path
+        else:
+            # missing files are reported by their own record
+            yield item
+
+
+def _extract(index, path, options):
+    from .batch import open_output, output_path
+    from .extract import extract_xml_bytes
+    xml_bytes = extract_xml_bytes(path)
+    if xml_bytes is None:
+        raise ValueError('No Factur-X XML embedded in the PDF.')
+    if options['output_dir']:
+        xml_path = output_path(options['output_dir'], index, path, '.xml')
+        with open_output(xml_path, path, options['force']) as f:
+            f.write(xml_bytes)
+        return 'ok', {'output': xml_path}
+    return 'ok', {'xml': xml_bytes.decode('utf-8')}
+
+
+def _validate(index, path, options):
+    from .facturx import FacturX
+    with FacturX(path, options['flavor'], options['level'], validation='off') as inv:
+        report = inv.validate(business_rules=options['rules'])
+        record = {'flavor': inv.flavor.name, 'level': inv.flavor.level}
+        record.update(report._asdict())
+        record['rule_violations'] = [violation._asdict() for violation in report.rule_violations]
+    return 'ok' if report.valid else 'invalid', record
+
+
+@functools.lru_cache(maxsize=None)
+def _open_cache(cache_path):
+    # one connection per process, shared by its threads
+    from .cache import InvoiceCache
+    return InvoiceCache(cache_path)
+
+
+def _to_json(index, path, options):
+    if options['cache']:
+        entry = _open_cache(options['cache']).get(path)
+        # PDFs without XML give the fields of a template, not cached
+        if entry.data is not None:
+            return 'ok', {'data': entry.data}
+    from .facturx import FacturX
+    with FacturX(path, options['flavor'], options['level'], validation='off') as inv:
+        return 'ok', {'data': inv.to_dict()}
+
+
+def _embed(index, path, options):
+    from .batch import open_output, output_path
+    from .facturx import FacturX
+    xml_path = options['xml'] or os.path.splitext(path)[0] + '.xml'
+    pdf_path = output_path(options['output_dir'], index, path)
+    # the XML of the PDF is replaced, read_xml() validates the new one
+    with FacturX(path, options['flavor'], options['level'], validation='off') as inv:
+        inv.read_xml(xml_path)
+        with open_output(pdf_path, path, options['force']) as f:
+            inv.write_pdf(f, incremental=options['incremental'], optimize=options['optimize'])
+        return 'ok', {'xml': xml_path, 'output': pdf_path}
+
+
+_HANDLERS = {
+    'extract': _extract,
+    'validate': _validate,
+    'to-json': _to_json,
+    'embed': _embed,
+}
+
+
+def process_path(index, path, command, options):
+    """Run command on one PDF and return its record. Never raises."""
+    start = time.perf_counter()
+    try:
+        status, record = _HANDLERS[command](index, path, options)
+        error = None
+    except Exception as e:
+        status, record = 'error', {}
+        error = '%s: %s' % (type(e).__name__, e)
+    result = {'source': path, 'status': status,
+              'elapsed_ms': round((time.perf_counter() - start) * 1000, 3)}
+    result.update(record)
+    if error is not None:
+        result['error'] = error
+    return result
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='facturx', description='Process Factur-X invoices, one JSON record per line.')
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
+    subparsers.required = True
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('inputs', nargs='+', metavar='input',
+                        help="PDF file, directory, glob pattern, or '-' to read paths from stdin")
+    common.add_argument('-j', '--jobs', type=int, default=1, help='number of workers (default: 1)')
+    common.add_argument('--executor', choices=('process', 'thread'), default='process',
+                        help='kind of workers when --jobs > 1 (default: process)')
+    common.add_argument('--unordered', action='store_true',
+                        help='write records as soon as they are ready instead of in input order')
+    common.add_argument('--flavor', default='factur-x')
+    common.add_argument('--level', default='minimum', help='level of the template for PDFs without XML')
+
+    extract = subparsers.add_parser('extract', parents=[common], help='extract the embedded XML')
+    extract.add_argument('-o', '--output-dir',
+                         help='write <index>-<name>.xml files there instead of including the XML in the records')
+    extract.add_argument('--force', action='store_true', help='overwrite existing output files')
+    validate = subparsers.add_parser('validate', parents=[common], help='validate the embedded XML')
+    validate.add_argument('--rules', action='store_true', help='also check the EN 16931 business rules')
+    to_json = subparsers.add_parser('to-json', parents=[common], help='export the invoice fields')
+    to_json.add_argument('--cache', metavar='PATH',
+                         help='SQLite cache of the fields, unchanged PDFs are not read again')
+    embed = subparsers.add_parser('embed', parents=[common], help='embed XML files in PDFs')
+    embed.add_argument('-o', '--output-dir', required=True,
+                       help='directory receiving the Factur-X PDFs, named <index>-<name>.pdf')
+    embed.add_argument('--force', action='store_true', help='overwrite existing output files')
+    embed.add_argument('--xml', help='XML file embedded in every PDF (default: <name>.xml next to each PDF)')
+    embed.add_argument('--incremental', action='store_true', help='append the XML as an incremental update')
+    embed.add_argument('--optimize', action='store_true', help='compress the output')
+    return parser
+
+
+def main(argv=None, stdin=None, stdout=None):
+    args = build_parser().parse_args(argv)
+    stdout = stdout or sys.stdout
+    options = {
+        'flavor': args.flavor,
+        'level': args.level,
+        'output_dir': getattr(args, 'output_dir', None),
+        'xml': getattr(args, 'xml', None),
+        'incremental': getattr(args, 'incremental', False),
+        'optimize': getattr(args, 'optimize', False),
+        'force': getattr(args, 'force', False),
+        'rules': getattr(args, 'rules', False),
+        'cache': getattr(args, 'cache', None),
+    }
+    if options['output_dir']:
+        os.makedirs(options['output_dir'], exist_ok=True)
+
+    from .batch import map_sources
+    executor = args.executor if args.jobs > 1 else 'serial'
+    records = map_sources(process_path, iter_paths(args.inputs, stdin), (args.command, options),
+                          jobs=args.jobs, executor=executor, ordered=not args.unordered, flavor=args.flavor)
+    all_ok = True
+    for record in records:
+        all_ok = all_ok and record['status'] == 'ok'
+        stdout.write(json.dumps(record, ensure_ascii=False) + '\n')
+        stdout.flush()
+    return 0 if all_ok else 1
@@ -0,0 +1,146 @@
+"""
+Stream the fields of many invoices to one NDJSON or CSV output.
+
+Rows are written as soon as each invoice is processed and only the invoices
+being processed are held in memory, however many sources there are. Columns
+are the fields of fields.yml, converted according to their `_type`:
+- date: DateTimeString (format 102, YYYYMMDD) -> ISO date, e.g. 2017-11-13,
+- decimal: amounts and rates -> exact decimal, written as a string in
+  NDJSON (e.g. "671.15") and as text in CSV, so that every value of a
+  column has the same JSON type and no precision is lost to floats.
+
+A failing invoice does not stop the export, its row gets an 'error' column.
+"""
+
+import csv
+import datetime
+import json
+import os
+from decimal import Decimal, InvalidOperation
+
+from .flavors.xml_flavor import FIELDS
+
+__all__ = ['FORMATS', 'convert_value', 'export', 'export_columns', 'export_row']
+
+FORMATS = ('ndjson', 'csv')
+
+
+def export_columns(flavor='factur-x'):
+    """Names of the fields defined for flavor, in fields.yml order."""
+    return [name for name, details in FIELDS.items() if details['_path'].get(flavor) is not None]
+
+
+def convert_value(field_name, text):
+    """Convert the text of a field to the Python type given by its `_type`.
+
+    Values that do not match their type, e.g. dates in another format, are
+    returned unchanged.
+    """
+    if text is None:
+        return None
+    field_type = FIELDS[field_name].get('_type')
+    text = text.strip()
+    if field_type == 'date':
+        if len(text) == 8 and text.isdigit():
+            try:
+                return datetime.date(int(text[:4]), int(text[4:6]), int(text[6:]))
+            except ValueError:
+                pass
+        return text
+    if field_type == 'decimal':
+        try:
+            return Decimal(text)
+        except InvalidOperation:
+            return text
+    return text
+
+
+def export_row(index, source, columns, validate=False, flavor='factur-x', level='minimum'):
+    """Return the row of one source: a path, PDF bytes, a file object or a FacturX.
+
+    Defined at module level so that process pool workers can run it.
+    """
+    from .facturx import FacturX
+    row = {'source': source if isinstance(source, str) else None}
+    try:
+        if isinstance(source, FacturX):
+            inv, owned = source, False
+        else:
+            # nothing is validated unless asked, and then once, by validate()
+            inv, owned = FacturX(source, flavor, level, validation='lazy' if validate else 'off'), True
+        try:
+            values = inv.to_dict()
+            for column in columns:
+                row[column] = convert_value(column, values.get(column))
+            if validate:
+                # validate() does not modify the tree, unlike is_valid(): the
+                # FacturX instances of the caller are left untouched
+                row['valid'] = inv.validate().valid
+        finally:
+            if owned:
+                inv.close()
+        row['error'] = None
+    except Exception as e:
+        row['error'] = '%s: %s' % (type(e).__name__, e)
+    return row
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    raise TypeError('%r is not JSON serializable' % (value,))
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return value
+
+
+def export(sources, output, format='ndjson', columns=None, validate=False, flavor='factur-x',
+           level='minimum', jobs=None, executor='serial'):
+    """Write one row per source to output, a text file object or a path.
+
+    Args:
+    - sources: iterable of paths, PDF bytes, binary file objects or FacturX
+      instances, consumed lazily. FacturX instances and file objects cannot be
+      sent to process workers.
+    - format: 'ndjson' or 'csv'.
+    - columns: field names to export, defaults to export_columns(flavor).
+    - validate: add a 'valid' column with the validate().valid result of
+      each row.
+    - jobs, executor: workers, see facturx.batch.run_batch. Serial by default.
+
+    Every row also has the 'source' path (empty for other sources) and an
+    'error' column. Returns the number of rows written.
+    """
+    if format not in FORMATS:
+        raise ValueError("Unknown format '%s', expected one of %s." % (format, FORMATS))
+    columns = list(columns) if columns is not None else export_columns(flavor)
+    for column in columns:
+        if column not in FIELDS:
+            raise ValueError("Unknown field '%s'." % column)
+
+    if isinstance(output, (str, os.PathLike)):
+        with open(output, 'w', newline='' if format == 'csv' else None, encoding='utf-8') as f:
+            return export(sources, f, format, columns, validate, flavor, level, jobs, executor)
+
+    from .batch import map_sources
+    rows = map_sources(export_row, sources, (columns, validate, flavor, level), jobs, executor, flavor=flavor)
+    header = ['source'] + columns + (['valid'] if validate else []) + ['error']
+    if format == 'csv':
+        writer = csv.writer(output)
+        writer.writerow(header)
+    count = 0
+    for row in rows:
+        if format == 'csv':
+            writer.writerow([_csv_value(row.get(column)) for column in header])
+        else:
+            output.write(json.dumps({column: row.get(column) for column in header},
+                                    default=_json_default, ensure_ascii=False) + '\n')
+        count += 1
+    return count
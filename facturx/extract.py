@@ -0,0 +1,133 @@
+"""
+Fast access to the XML embedded in a Factur-X PDF.
+
+Only the PDF catalog and the embedded files name tree are read: no page is
+loaded, no FacturX object is built and no validation is done.
+"""
+
+import os
+import threading
+
+from lxml import etree
+
+from .flavors.xml_flavor import XMLFlavor
+from .utils.buffers import BUFFER_TYPES, buffer_stream
+
+__all__ = ['extract_xml', 'extract_xml_bytes']
+
+# Name trees are shallow in practice; the limit only guards against loops.
+MAX_NAME_TREE_DEPTH = 32
+
+_local = threading.local()
+
+
+def get_xml_parser():
+    """Return the hardened XMLParser of the current thread.
+
+    lxml parsers must not be shared between threads, so one parser is built
+    and reused per thread. Entities are not resolved and the network is
+    never accessed.
+    """
+    parser = getattr(_local, 'parser', None)
+    if parser is None:
+        parser = etree.XMLParser(
+            resolve_entities=False, no_network=True, load_dtd=False, huge_tree=False)
+        _local.parser = parser
+    return parser
+
+
+def parse_xml(xml_bytes):
+    """Parse embedded XML bytes with the shared hardened parser."""
+    return etree.fromstring(xml_bytes, get_xml_parser())
+
+
+def iter_embedded_files(pdf_root):
+    """Yield (name, filespec) pairs of the /EmbeddedFiles name tree.
+
+    Both flat /Names arrays and trees split in /Kids nodes are supported.
+    filespec is yielded as stored in the tree, possibly as an IndirectObject.
+    """
+    names = pdf_root.get('/Names')
+    if names is None:
+        return
+    names = names.get_object()
+    if '/EmbeddedFiles' not in names:
+        return
+    nodes = [(names['/EmbeddedFiles'].get_object(), 0)]
+    seen = set()
+    while nodes:
+        node, depth = nodes.pop()
+        if depth > MAX_NAME_TREE_DEPTH or id(node) in seen:
+            continue
+        seen.add(id(node))
+        if '/Names' in node:
+            entries = node['/Names']
+            for i in range(0, len(entries) - 1, 2):
+                yield entries[i], entries[i + 1]
+        if '/Kids' in node:
+            # reversed so that kids are visited in order
+            for kid in reversed(node['/Kids']):
+                nodes.append((kid.get_object(), depth + 1))
+
+
+def _resolved(dictionary, key):
+    """Return dictionary[key] with indirect references resolved, or None."""
+    value = dictionary.get(key)
+    return value.get_object() if value is not None else None
+
+
+def is_facturx_filespec(filespec, valid_filenames=None):
+    """Tell whether a (resolved) file specification holds a Factur-X XML file."""
+    if valid_filenames is None:
+        valid_filenames = XMLFlavor.valid_xmp_filenames()
+    if not hasattr(filespec, 'get') or '/EF' not in filespec:
+        return False
+    return (_resolved(filespec, '/F') in valid_filenames or
+            _resolved(filespec, '/UF') in valid_filenames)
+
+
+def xml_bytes_from_reader(pdf):
+    """Return the Factur-X XML embedded in the PDF read by `pdf`, or None."""
+    valid_filenames = XMLFlavor.valid_xmp_filenames()
+    for _, filespec in iter_embedded_files(pdf.trailer['/Root']):
+        filespec = filespec.get_object()
+        if not is_facturx_filespec(filespec, valid_filenames):
+            continue
+        ef = filespec['/EF']
+        embedded_file = _resolved(ef, '/F')
+        if embedded_file is None:
+            embedded_file = _resolved(ef, '/UF')
+        if embedded_file is not None:
+            return embedded_file.get_data()
+    return None
+
+
+def extract_xml_bytes(source):
+    """Return the raw Factur-X XML embedded in a PDF, or None if there is none.
+
+    source can be a path, a binary file object or the PDF content as bytes,
+    bytearray, memoryview or mmap, read in place.
+    """
+    from pypdf import PdfReader
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return xml_bytes_from_reader(PdfReader(f))
+    if isinstance(source, BUFFER_TYPES):
+        stream, owned = buffer_stream(source)
+        try:
+            return xml_bytes_from_reader(PdfReader(stream))
+        finally:
+            if owned:
+                stream.close()
+    return xml_bytes_from_reader(PdfReader(source))
+
+
+def extract_xml(source):
+    """Return the Factur-X XML embedded in a PDF as a parsed tree root, or None.
+
+    See `extract_xml_bytes` for accepted sources. The XML is not validated.
+    """
+    xml_bytes = extract_xml_bytes(source)
+    if xml_bytes is None:
+        return None
+    return parse_xml(xml_bytes)
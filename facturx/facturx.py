@@ -1,25 +1,73 @@
+import collections
 import copy
+import hashlib
 import io
 import json
+import mmap
 import os
 from datetime import datetime
 from io import BytesIO
 
-import yaml
 from .constants import EN16931, EN16931_FE
 from lxml import etree
 from pypdf import PdfReader
-from pypdf.generic import IndirectObject
 
 from .flavors import xml_flavor
+from facturx.utils import metrics
+from facturx.utils.buffers import BUFFER_TYPES, buffer_stream
 from facturx.utils.logger import logger
+from .extract import parse_xml, xml_bytes_from_reader
 from .flavors.xml_flavor import XMLFlavor
-from .pdfwriter import FacturXPDFWriter
+from .pdfwriter import FacturXIncrementalWriter, FacturXPDFWriter
 
 file_types = (io.IOBase,)
 unicode = str
 
-__all__ = ['FacturX']
+__all__ = ['FacturX', 'VALIDATION_POLICIES', 'ValidationReport', 'warm_up']
+
+# eager: check the embedded XML against the XSD when the invoice is opened
+# lazy: check it on the first is_valid(), validate() or write
+# off: only check it when is_valid() or validate() is called
+VALIDATION_POLICIES = ('eager', 'lazy', 'off')
+
+# (code type, field name) of the codes checked by is_valid() and validate()
+CODES_TO_CHECK = (
+    ('currency', 'currency'),
+    ('country', 'seller_country'),
+    ('country', 'buyer_country'),
+    ('country', 'shipping_country'),
+)
+
+ValidationReport = collections.namedtuple(
+    'ValidationReport',
+    ['valid', 'xsd_errors', 'missing_fields', 'defaulted_fields', 'invalid_codes', 'rule_violations'])
+ValidationReport.__doc__ = """Outcome of FacturX.validate().
+
+- valid: True if there is no XSD error, missing field or invalid code.
+- xsd_errors: dicts with the 'line', 'column', 'message' and 'path' of each
+  XSD error.
+- missing_fields: required fields without a value nor a default.
+- defaulted_fields: required fields without a value, that is_valid() would
+  set to their default. They do not make the invoice invalid.
+- invalid_codes: dicts with the 'field', 'code_type' and 'value' of each
+  code that is not a valid ISO 3166 / ISO 4217 code.
+- rule_violations: facturx.rules.RuleViolation of each EN 16931 business
+  rule not met, if they were checked.
+"""
+
+
+def warm_up(flavor='factur-x'):
+    """Build the process-wide caches shared by every invoice of a flavor.
+
+    Compiles the XSD schemas, the field XPaths and the to_dict dispatch
+    table and loads the XML templates, so that the first invoice of a worker
+    does not pay for them.
+    """
+    XMLFlavor.preload_schemas(flavor)
+    XMLFlavor.preload_templates(flavor)
+    XMLFlavor.compile_xpaths(flavor)
+    XMLFlavor.get_dispatch_table(flavor)
+
 
 class FacturX(object):
     """Represents an electronic PDF invoice with embedded XML metadata following the
@@ -34,60 +82,222 @@ class FacturX(object):
     - xml: xml tree of machine-readable representation.
     - pdf: underlying graphical PDF representation.
     - flavor: which flavor (Factur-x) to use.
+
+    validation is one of VALIDATION_POLICIES. With 'lazy' or 'off', opening
+    an invoice whose embedded XML does not match the XSD does not raise;
+    'off' suits read-only extraction.
+
+    pdf_invoice is a path, a binary file object or the PDF content as bytes,
+    bytearray, memoryview or mmap. Contents in memory are read in place, not
+    copied, and must not be modified while the invoice is open.
     """
 
-    def __init__(self, pdf_invoice, flavor='factur-x', level='minimum'):
+    def __init__(self, pdf_invoice, flavor='factur-x', level='minimum', use_mmap=False, validation='eager'):
+        if validation not in VALIDATION_POLICIES:
+            raise ValueError("Unknown validation policy '%s', expected one of %s." % (
+                validation, VALIDATION_POLICIES))
         # Read PDF from path, pointer or string
-        if isinstance(pdf_invoice, str) and os.path.isfile(pdf_invoice):
-            with open(pdf_invoice, 'rb') as f:
-                pdf_file = BytesIO(f.read())
-        elif isinstance(pdf_invoice, file_types):
-            pdf_file = pdf_invoice
-        else:
-            raise TypeError(
-                "The first argument of the method get_facturx_xml_from_pdf must "
-                "be either a string or a file (it is a %s)." % type(pdf_invoice))
-        xml = self._xml_from_file(pdf_file)
-        self.pdf = pdf_file
-
-        # PDF has metadata embedded
-        if xml is not None:
-            # 'Read existing XML from PDF
-            self.xml = xml
-            self.flavor = xml_flavor.XMLFlavor(xml)
-        else:
-            # No metadata embedded. Create from template.
-            # 'PDF does not have XML embedded. Adding from template.'
-            self.flavor, self.xml = xml_flavor.XMLFlavor.from_template(flavor, level)
-
-        self.flavor.check_xsd(self.xml)
+        self._file = None
+        self._owns_pdf = True
+        self.pdf = None
+        try:
+            if isinstance(pdf_invoice, str) and os.path.isfile(pdf_invoice):
+                if use_mmap:
+                    # Keep the file mapped instead of copying it in memory: only the
+                    # pages actually read by pypdf become resident.
+                    self._file = open(pdf_invoice, 'rb')
+                    pdf_file = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+                else:
+                    with open(pdf_invoice, 'rb') as f:
+                        pdf_file = BytesIO(f.read())
+            elif isinstance(pdf_invoice, file_types):
+                pdf_file = pdf_invoice
+                self._owns_pdf = False
+            elif isinstance(pdf_invoice, BUFFER_TYPES):
+                # PDF content in memory, read in place
+                pdf_file, self._owns_pdf = buffer_stream(pdf_invoice)
+            else:
+                raise TypeError(
+                    "The first argument of the method get_facturx_xml_from_pdf must "
+                    "be either a string, a file or a bytes-like object (it is a %s)." % type(pdf_invoice))
+            self.pdf = pdf_file
+            # Only the trailer and cross-reference data are parsed here. Objects,
+            # including the page tree, are loaded on demand by pypdf.
+            with metrics.span('open.pdf'):
+                self._pdf_reader = PdfReader(pdf_file)
+            xml = self._xml_from_reader(self._pdf_reader)
+
+            # PDF has metadata embedded
+            if xml is not None:
+                # 'Read existing XML from PDF
+                self.xml = xml
+                self.flavor = xml_flavor.XMLFlavor(xml)
+                xsd_checked = validation == 'eager'
+                if xsd_checked:
+                    with metrics.span('open.check_xsd'):
+                        self.flavor.check_xsd(self.xml)
+            else:
+                # No metadata embedded. Create from template.
+                # 'PDF does not have XML embedded. Adding from template.'
+                # Templates are validated once, when they are loaded or registered.
+                with metrics.span('open.template'):
+                    self.flavor, self.xml = xml_flavor.XMLFlavor.from_template(flavor, level)
+                xsd_checked = True
+        except BaseException:
+            # release the file and its mapping, __exit__ will not be called
+            self.close()
+            raise
         self._namespaces = self.xml.nsmap
+        self.validation = validation
+        # the XSD check still owed by a lazy invoice, done on the first write
+        self._xsd_pending = validation == 'lazy' and not xsd_checked
+
+        self.already_added_field = {}
+        self.last_write_stats = None
+        # field name -> elements matched by its XPath, valid until the tree
+        # is structurally changed (see invalidate_cache)
+        self._node_index = {}
+        self._node_index_root = self.xml
+        # Incremented on every change made through the API. Serializations
+        # are cached per pretty_print option: (revision, root, bytes, md5).
+        self._revision = 0
+        self._serialized = {}
+
+    @classmethod
+    async def aopen(cls, pdf_invoice, flavor='factur-x', level='minimum', validation='eager'):
+        """Asynchronous constructor, see facturx.aio.
+
+        The file is read without blocking the event loop, then parsed and
+        validated on the configured executor.
+        """
+        from . import aio
+        if isinstance(pdf_invoice, str):
+            if not os.path.isfile(pdf_invoice):
+                raise TypeError(
+                    "The first argument of the method get_facturx_xml_from_pdf must "
+                    "be either a string, a file or a bytes-like object (it is a %s)." % type(pdf_invoice))
+            # the content read is owned, and closed, like a path given to FacturX()
+            pdf_invoice = await aio.read_file(pdf_invoice)
+        return await aio.run_blocking(cls, pdf_invoice, flavor, level, validation=validation)
+
+    async def ais_valid(self):
+        """Asynchronous is_valid(), run on the configured executor."""
+        from . import aio
+        return await aio.run_blocking(self.is_valid)
+
+    async def ato_dict(self):
+        """Asynchronous to_dict(), run on the configured executor."""
+        from . import aio
+        return await aio.run_blocking(self.to_dict)
+
+    async def awrite_pdf(self, path_or_stream, incremental=False, optimize=False, deduplicate=False,
+                         pretty_print=True):
+        """Asynchronous write_pdf().
+
+        The PDF is serialized on the configured executor and written to a
+        path, an asyncio StreamWriter or a binary file object without
+        blocking the event loop.
+        """
+        from . import aio
+        pdf_bytes = await aio.run_blocking(self.to_pdf_bytes, incremental, optimize, deduplicate, pretty_print)
+        await aio.write_file(path_or_stream, pdf_bytes)
+        return True
+
+    def to_pdf_bytes(self, incremental=False, optimize=False, deduplicate=False, pretty_print=True):
+        """Return the PDF with the embedded XML as bytes, see write_pdf()."""
+        output = BytesIO()
+        self._get_pdf_writer(incremental, optimize, deduplicate, pretty_print).write(output)
+        pdf_bytes = output.getvalue()
+        self._record_write_stats('memory', len(pdf_bytes))
+        return pdf_bytes
 
+    def read_xml(self, xml):
+        """Use XML data from external file. Replaces existing XML or template.
+
+        xml is a file path, XML bytes or an lxml element. It is validated
+        against the schema of its own flavor and level.
+        """
+        if isinstance(xml, str):
+            with open(xml, 'rb') as f:
+                xml = f.read()
+        if isinstance(xml, bytes):
+            xml = parse_xml(xml)
+        flavor = xml_flavor.XMLFlavor(xml)
+        flavor.check_xsd(xml)
+        self.xml = xml
+        self.flavor = flavor
+        self._namespaces = self.xml.nsmap
         self.already_added_field = {}
+        self.invalidate_cache()
+
+    @property
+    def pdf_reader(self):
+        """PdfReader over the source PDF, shared by reading and writing."""
+        if self._pdf_reader is None:
+            raise ValueError('I/O operation on closed invoice.')
+        return self._pdf_reader
 
-    def read_xml(self):
-        """Use XML data from external file. Replaces existing XML or template."""
-        pass
+    def close(self):
+        """Release the PDF buffer, the PdfReader and the file handle, if any.
+
+        Streams passed by the caller are left open. The XML tree stays usable,
+        but the invoice can no longer be written as PDF.
+        """
+        self._pdf_reader = None
+        if self.pdf is not None and self._owns_pdf:
+            self.pdf.close()
+        self.pdf = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def _xml_from_file(self, pdf_file):
-        pdf = PdfReader(pdf_file)
-        pdf_root = pdf.trailer['/Root']
-        if '/Names' not in pdf_root or '/EmbeddedFiles' not in pdf_root['/Names']:
+        return self._xml_from_reader(PdfReader(pdf_file))
+
+    def _xml_from_reader(self, pdf):
+        with metrics.span('open.extract_xml'):
+            xml_bytes = xml_bytes_from_reader(pdf)
+        if xml_bytes is None:
             # 'No existing XML file found.'
             return None
+        metrics.count('bytes_in', len(xml_bytes), data='xml')
+        with metrics.span('open.parse_xml'):
+            return parse_xml(xml_bytes)
+
+    def _resolve(self, field_name):
+        """Return the elements matching field_name, using the per-invoice node index."""
+        if self._node_index_root is not self.xml:
+            # the whole tree was replaced through FacturX.xml
+            self.invalidate_cache()
+        nodes = self._node_index.get(field_name)
+        if nodes is None:
+            nodes = self.flavor.get_compiled_xpath(field_name)(self.xml)
+            self._node_index[field_name] = nodes
+        return nodes
+
+    def invalidate_cache(self):
+        """Forget resolved field nodes and cached serializations.
+
+        Must be called after adding, moving or removing elements directly on
+        `FacturX.xml`. After changing element text or attributes directly,
+        mark_modified() is enough.
+        """
+        self._node_index = {}
+        self._node_index_root = self.xml
+        self.mark_modified()
 
-        for file in pdf_root['/Names']['/EmbeddedFiles']['/Names']:
-            if isinstance(file, IndirectObject):
-                obj = file.get_object()
-                if obj['/F'] in XMLFlavor.valid_xmp_filenames():
-                    xml_root = etree.fromstring(obj['/EF']['/F'].get_data())
-                    xml_content = xml_root
-
-                    return xml_content
+    def mark_modified(self):
+        """Record a change of the XML tree, so that it is serialized again."""
+        self._revision += 1
 
     def __getitem__(self, field_name):
-        path = self.flavor.get_xml_path(field_name)
-        value = self.xml.xpath(path, namespaces=self._namespaces)
+        value = self._resolve(field_name)
         if value:
             value = value[0].text
         if 'date' in field_name and value:
@@ -95,8 +305,7 @@ class FacturX(object):
         return value
 
     def __setitem__(self, field_name, value):
-        path = self.flavor.get_xml_path(field_name)
-        res = self.xml.xpath(path, namespaces=self._namespaces)
+        res = self._resolve(field_name)
         if not res:
             # The node is not defined at all in the parsed xml
             # logger.warning("{} is not defined in {}".format(path, self.flavor.name))
@@ -108,6 +317,7 @@ class FacturX(object):
         current_el = self._handle_duplicated_node(current_el, parent_tag)
         self._write_element(current_el, field_name, value)
         self._save_to_registry(current_el, parent_tag)
+        self.mark_modified()
 
     def _handle_duplicated_node(self, current_el, parent_tag):
         # method meant to handle cardinality 1.n (ApplicableTradeTax or IncludedSupplyChainTradeLineItem)
@@ -116,6 +326,7 @@ class FacturX(object):
             parent_el = current_el.getparent()
             new_parent = copy.deepcopy(parent_el)
             parent_el.addnext(new_parent)
+            self.invalidate_cache()
             new_current_el = new_parent.find(current_el.tag)
             return new_current_el
         return current_el
@@ -135,10 +346,82 @@ class FacturX(object):
             current_el.text = str(value)
 
     def _save_to_registry(self, current_el, parent_tag):
-        if parent_tag not in self.already_added_field:
-            self.already_added_field[parent_tag] = [current_el]
-        elif current_el not in self.already_added_field[parent_tag]:
-            self.already_added_field[parent_tag].append(current_el)
+        self.already_added_field.setdefault(parent_tag, set()).add(current_el)
+
+    def add_line_items(self, rows, replace=False):
+        """Add one IncludedSupplyChainTradeLineItem per row, in a single pass.
+
+        rows is an iterable of dicts using the line fields of fields.yml
+        (line_id, item_name, line_total_amount, ...). Each new line is a copy
+        of the first existing line, fields missing from a row keep the value
+        of that line. Lines are added after the existing ones, or replace them
+        with replace=True (the usual case for invoices created from a template,
+        whose line is a placeholder).
+
+        Returns the number of lines added.
+        """
+        return self._add_repeated('line_items', rows, replace)
+
+    def add_tax_breakdowns(self, rows, replace=False):
+        """Add one header ApplicableTradeTax per row, see add_line_items().
+
+        Rows use the tva_* fields of fields.yml (tva_basis_amount, tva_rate, ...).
+        """
+        return self._add_repeated('tax_breakdowns', rows, replace)
+
+    def _add_repeated(self, name, rows, replace):
+        element_xpath, field_xpaths = self.flavor.get_repeated_fields(self.flavor.name, name)
+        existing = element_xpath(self.xml)
+        if not existing:
+            raise ValueError("The %s level of %s has no %s to use as a model." % (
+                self.flavor.level, self.flavor.name, name.replace('_', ' ')))
+        prototype = copy.deepcopy(existing[0])
+
+        # field name -> child indexes leading to the field element, the same
+        # in every copy of the prototype
+        locators = {}
+
+        def locate(field_name):
+            if field_name not in field_xpaths:
+                raise ValueError("Field '%s' is not part of %s." % (field_name, name))
+            nodes = field_xpaths[field_name](prototype)
+            if not nodes:
+                raise ValueError("Field '%s' is not present in the %s of this invoice." % (field_name, name))
+            node, indexes = nodes[0], []
+            while node is not prototype:
+                parent = node.getparent()
+                indexes.append(parent.index(node))
+                node = parent
+            locators[field_name] = indexes[::-1]
+            return locators[field_name]
+
+        anchor = existing[-1]
+        written = []
+        count = 0
+        for row in rows:
+            element = copy.deepcopy(prototype)
+            written = []
+            for field_name, value in row.items():
+                indexes = locators.get(field_name) or locate(field_name)
+                node = element
+                for index in indexes:
+                    node = node[index]
+                self._write_element(node, field_name, value)
+                written.append(node)
+            anchor.addnext(element)
+            anchor = element
+            count += 1
+
+        if replace and count:
+            for element in existing:
+                element.getparent().remove(element)
+        # fields set afterwards through __setitem__ start a new element
+        # instead of overwriting the last row
+        for node in written:
+            self._save_to_registry(node, node.getparent().tag)
+        self.invalidate_cache()
+        metrics.count(name, count)
+        return count
 
     def is_valid(self):
         """Make every effort to validate the current XML.
@@ -148,49 +431,150 @@ class FacturX(object):
         - XML is valid
         - ...
 
+        Required fields that have a default are set to it. See validate()
+        for a report that leaves the invoice untouched.
+
         Returns: true/false (validation passed/failed)
         """
         # validate against XSD
         try:
-            self.flavor.check_xsd(self.xml)
+            with metrics.span('is_valid.check_xsd'):
+                self._check_xsd()
         except Exception:
             return False
+        return self._check_fields()
 
-        # Check for required fields
-        fields_data = xml_flavor.FIELDS
-        for field in fields_data.keys():
-            if fields_data[field]['_required']:
-                r = self.xml.xpath(fields_data[field]['_path'][self.flavor.name], namespaces=self._namespaces)
-                if not len(r) or r[0].text is None:
-                    if '_default' in fields_data[field].keys():
-                        self[field] = fields_data[field]['_default']
+    def _check_xsd(self):
+        """check_xsd() the tree, settling the check owed by a lazy invoice once it passes."""
+        self.flavor.check_xsd(self.xml)
+        self._xsd_pending = False
+
+    def validate(self, business_rules=False):
+        """Check the invoice like is_valid(), without changing it, and report every problem.
+
+        Returns a ValidationReport listing all the XSD errors, missing
+        required fields and invalid codes, instead of stopping at the first.
+        With business_rules=True, the EN 16931 business rules are checked
+        too, see check_rules().
+        """
+        with metrics.span('validate.xsd'):
+            xsd_errors = self.flavor.xsd_errors(self.xml)
+        if not xsd_errors:
+            self._xsd_pending = False
+
+        with metrics.span('validate.fields'):
+            # one tree walk gives the value of every field
+            values = self.to_dict()
+            missing_fields, defaulted_fields = [], []
+            for field, details in xml_flavor.FIELDS.items():
+                if details.get('_required') and values.get(field) is None:
+                    if '_default' in details:
+                        defaulted_fields.append(field)
                     else:
-                        logger.warning("Required field '%s' is not present", field)
-                        return False
+                        missing_fields.append(field)
+            invalid_codes = [
+                {'field': field_name, 'code_type': code_type, 'value': values.get(field_name)}
+                for code_type, field_name in CODES_TO_CHECK
+                if values.get(field_name) and not self.flavor.valid_code(code_type, values[field_name])]
+
+        rule_violations = self.check_rules() if business_rules else []
+        valid = not (xsd_errors or missing_fields or invalid_codes or rule_violations)
+        return ValidationReport(valid, xsd_errors, missing_fields, defaulted_fields, invalid_codes, rule_violations)
+
+    def check_rules(self, rules=None):
+        """Check the EN 16931 business rules (totals, VAT categories, mandatory elements).
+
+        Returns the list of facturx.rules.RuleViolation, empty if all the
+        rules applying to the level of the invoice are met. rules restricts
+        the check to some rule identifiers, see facturx.rules.RULES.
+        """
+        from . import rules as business_rules
+        if self.flavor.name != 'factur-x':
+            raise ValueError("Business rules are only available for the factur-x flavor.")
+        with metrics.span('check_rules'):
+            return business_rules.check_rules(self.xml, self.flavor.level, rules)
+
+    def _check_fields(self):
+        """The checks of is_valid() that come after the XSD validation."""
+        # Check for required fields
+        with metrics.span('is_valid.required_fields'):
+            fields_data = xml_flavor.FIELDS
+            for field in fields_data.keys():
+                if fields_data[field].get('_required'):
+                    r = self._resolve(field)
+                    if not len(r) or r[0].text is None:
+                        if '_default' in fields_data[field].keys():
+                            self[field] = fields_data[field]['_default']
+                        else:
+                            logger.warning("Required field '%s' is not present", field)
+                            return False
 
         # Check for codes (ISO:3166, ISO:4217)
-        codes_to_check = [
-            ('currency', 'currency'),
-            ('country', 'seller_country'),
-            ('country', 'buyer_country'),
-            ('country', 'shipping_country')
-        ]
-        for code_type, field_name in codes_to_check:
-            if self[field_name] and not self.flavor.valid_code(code_type, self[field_name]):
-                logger.warning("Field %s is not a valid %s code." % (field_name, code_type))
-                return False
+        with metrics.span('is_valid.codes'):
+            for code_type, field_name in CODES_TO_CHECK:
+                value = self[field_name]
+                if value and not self.flavor.valid_code(code_type, value):
+                    logger.warning("Field %s is not a valid %s code." % (field_name, code_type))
+                    return False
 
         return True
 
-    def write_pdf(self, path):
-        pdfwriter = FacturXPDFWriter(self)
-        with open(path, 'wb') as output_f:
+    def write_pdf(self, path_or_stream, incremental=False, optimize=False, deduplicate=False, pretty_print=True):
+        """Write the PDF with the embedded XML to a path or a binary stream.
+
+        Streams are left open. The PDF is written directly to seekable
+        streams at position 0; others, e.g. pipes, receive it in one write
+        since the cross-reference table holds absolute offsets.
+
+        With incremental=True, the original PDF is kept byte for byte and
+        the Factur-X objects are appended as an incremental update, so the
+        cost depends on the size of the attachment instead of the document.
+
+        With optimize=True, streams are Flate-compressed (except the XMP
+        metadata) and, unless incremental, objects are packed in object
+        streams. deduplicate=True merges identical objects (full rewrite
+        only). pretty_print=False embeds the XML without indentation.
+
+        Input and output sizes are logged and kept in `last_write_stats`.
+        """
+        if hasattr(path_or_stream, 'write'):
+            if not (getattr(path_or_stream, 'seekable', None) and path_or_stream.seekable()
+                    and path_or_stream.tell() == 0):
+                path_or_stream.write(self.to_pdf_bytes(incremental, optimize, deduplicate, pretty_print))
+                return True
+            self._get_pdf_writer(incremental, optimize, deduplicate, pretty_print).write(path_or_stream)
+            self._record_write_stats(getattr(path_or_stream, 'name', 'stream'), path_or_stream.tell())
+            return True
+        pdfwriter = self._get_pdf_writer(incremental, optimize, deduplicate, pretty_print)
+        with open(path_or_stream, 'wb') as output_f:
             pdfwriter.write(output_f)
+            bytes_out = output_f.tell()
+        self._record_write_stats(path_or_stream, bytes_out)
         return True
 
+    def _get_pdf_writer(self, incremental=False, optimize=False, deduplicate=False, pretty_print=True):
+        if self._xsd_pending:
+            # lazy validation: raises like an eager FacturX() would have
+            self._check_xsd()
+        if incremental:
+            if deduplicate:
+                raise ValueError('Objects cannot be deduplicated in an incremental update.')
+            return FacturXIncrementalWriter(self, optimize=optimize, pretty_print=pretty_print)
+        return FacturXPDFWriter(self, optimize=optimize, deduplicate=deduplicate, pretty_print=pretty_print)
+
+    def _record_write_stats(self, destination, bytes_out):
+        source = self.pdf_reader.stream
+        source.seek(0, os.SEEK_END)
+        bytes_in = source.tell()
+        self.last_write_stats = {'bytes_in': bytes_in, 'bytes_out': bytes_out}
+        metrics.count('bytes_in', bytes_in, data='pdf')
+        metrics.count('bytes_out', bytes_out, data='pdf')
+        logger.debug("Wrote %s: %d bytes (source PDF: %d bytes, %+.1f%%)",
+                     destination, bytes_out, bytes_in, 100.0 * (bytes_out - bytes_in) / (bytes_in or 1))
+
     def _remove_empty_elements(self, element=None):
         """
-        Recursively remove empty XML elements.
+        Remove empty XML elements, innermost first.
         An element is considered empty if:
           - It has no children
           - Its text is None or whitespace
@@ -199,46 +583,80 @@ class FacturX(object):
         if element is None:
             element = self.xml
 
-        # Work on a copy of children list since we may modify it
-        for child in list(element):
-            self._remove_empty_elements(child)
+        removed = False
+        # In reverse document order, children are visited before their
+        # parent, which may become empty once they are removed.
+        for child in reversed(list(element.iter())):
+            if (
+                    len(child) == 0 and
+                    (child.text is None or not child.text.strip()) and
+                    not child.attrib
+            ):
+                parent = child.getparent()
+                if parent is not None:
+                    parent.remove(child)
+                    removed = True
+        if removed:
+            self.invalidate_cache()
+
+    def _serialize(self, pretty_print):
+        cached = self._serialized.get(pretty_print)
+        if cached is not None and cached[0] == self._revision and cached[1] is self.xml:
+            metrics.count('cache.hit', cache='serialization')
+            return cached
+        metrics.count('cache.miss', cache='serialization')
+        with metrics.span('serialize', pretty_print=pretty_print):
+            self._remove_empty_elements()
+            if pretty_print:
+                xml_bytes = etree.tostring(self.xml, pretty_print=True)
+            else:
+                # drop the indentation read from the PDF, on a copy so that the
+                # indented output is left as is
+                root = copy.deepcopy(self.xml)
+                for element in root.iter():
+                    if element.tail is not None and not element.tail.strip():
+                        element.tail = None
+                    if len(element) and element.text is not None and not element.text.strip():
+                        element.text = None
+                xml_bytes = etree.tostring(root)
+        metrics.count('bytes_out', len(xml_bytes), data='xml')
+        cached = [self._revision, self.xml, xml_bytes, None]
+        self._serialized[pretty_print] = cached
+        return cached
+
+    def xml_bytes(self, pretty_print=True):
+        """Serialize the XML, without its empty elements.
+
+        The result is cached until the invoice is changed through the API
+        (see mark_modified). pretty_print=False gives a smaller, unindented
+        document.
+        """
+        return self._serialize(pretty_print)[2]
+
+    def xml_md5(self, pretty_print=True):
+        """MD5 hex digest of xml_bytes(pretty_print), cached like it."""
+        cached = self._serialize(pretty_print)
+        if cached[3] is None:
+            cached[3] = hashlib.md5(cached[2]).hexdigest()
+        return cached[3]
 
-        # After children are processed, check if current element is empty
-        if (
-                len(element) == 0 and
-                (element.text is None or not element.text.strip()) and
-                not element.attrib
-        ):
-            parent = element.getparent()
-            if parent is not None:
-                parent.remove(element)
+    def xml_size(self, pretty_print=True):
+        """Size in bytes of xml_bytes(pretty_print)."""
+        return len(self.xml_bytes(pretty_print))
 
     @property
     def xml_str(self):
-        """Calculate MD5 checksum of XML file. Used for PDF attachment."""
-        self._remove_empty_elements()
-        return etree.tostring(self.xml, pretty_print=True)
+        """Indented XML, as embedded in the PDF."""
+        return self.xml_bytes()
 
-    def write_xml(self, path):
+    def write_xml(self, path, pretty_print=True):
         with open(path, 'wb') as f:
-            f.write(self.xml_str)
+            f.write(self.xml_bytes(pretty_print))
 
     def to_dict(self):
         """Get all available fields as dict."""
-        fields_data = xml_flavor.FIELDS
-        flavor = self.flavor.name
-
-        output_dict = {}
-        for field in fields_data.keys():
-            try:
-                if fields_data[field]['_path'][flavor] is not None:
-                    r = self.xml.xpath(fields_data[field]['_path'][flavor],
-                                       namespaces=self._namespaces)
-                    output_dict[field] = r[0].text
-            except IndexError:
-                output_dict[field] = None
-
-        return output_dict
+        with metrics.span('to_dict'):
+            return self.flavor.extract_fields(self.xml)
 
     def write_json(self, json_file_path='output.json'):
         json_output = self.to_dict()
@@ -248,6 +666,7 @@ class FacturX(object):
                 json.dump(json_output, json_file, indent=4, sort_keys=True)
 
     def write_yaml(self, yml_file_path='output.yml'):
+        import yaml
         yml_output = self.to_dict()
         if self.is_valid():
             with open(yml_file_path, 'w') as yml_file:
@@ -0,0 +1,190 @@
+"""
+Precompiled fields.yml and flavors.yml, do not edit.
+
+Generated by `python -m facturx.flavors.generate_tables`.
+"""
+
+YAML_SHA256 = {'fields.yml': '157c919c47578046b207bee45eac1d460378e1ef5d80f995f5c1383a4386a5be',
+ 'flavors.yml': 'd02d9ec1a3f6a93b93ff678829e408d747fcb94918710b16eded058516dc3c7f'}
+FIELDS = {'version': {'_path': {'factur-x': '//rsm:ExchangedDocumentContext/ram:GuidelineSpecifiedDocumentContextParameter/ram:ID',
+                       'ubl': '//cbc:ProfileID'},
+             '_required': True,
+             '_default': 'urn:ferd:CrossIndustryDocument:invoice:1p0:basic'},
+ 'invoice_number': {'_path': {'factur-x': '//rsm:ExchangedDocument/ram:ID'}, '_required': False},
+ 'avoir_number': {'_path': {'factur-x': '//rsm:ExchangedDocument/ram:ID'}, '_required': False},
+ 'avoir_invoice_number': {'_path': {'factur-x': '/rsm:CrossIndustryInvoice/rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeSettlement/ram:InvoiceReferencedDocument/ram:IssuerAssignedID'},
+                          '_required': False},
+ 'date': {'_path': {'factur-x': '//rsm:ExchangedDocument/ram:IssueDateTime/udt:DateTimeString'},
+          '_type': 'date',
+          '_required': True},
+ 'date_due': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeSettlement/ram:SpecifiedTradePaymentTerms/ram:DueDateDateTime/udt:DateTimeString'},
+              '_type': 'date',
+              '_required': False},
+ 'payment_description': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeSettlement/ram:SpecifiedTradePaymentTerms/ram:Description'},
+                         '_required': False},
+ 'date_delivery': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeDelivery/ram:ActualDeliverySupplyChainEvent/ram:OccurrenceDateTime/udt:DateTimeString'},
+                   '_type': 'date',
+                   '_required': False},
+ 'name': {'_path': {'factur-x': '//rsm:ExchangedDocument/ram:Name'}, '_default': 'invoice', '_required': False},
+ 'type': {'_path': {'factur-x': '//rsm:ExchangedDocument/ram:TypeCode'}, '_required': True, '_default': 380},
+ 'currency': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeSettlement/ram:InvoiceCurrencyCode'},
+              '_required': True,
+              '_default': 'EUR'},
+ 'amount_untaxed': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeSettlement/ram:SpecifiedTradeSettlementHeaderMonetarySummation/ram:LineTotalAmount'},
+                    '_type': 'decimal',
+                    '_required': False},
+ 'amount_basis': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeSettlement/ram:SpecifiedTradeSettlementHeaderMonetarySummation/ram:TaxBasisTotalAmount'},
+                  '_type': 'decimal',
+                  '_required': False},
+ 'amount_tax': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeSettlement/ram:SpecifiedTradeSettlementHeaderMonetarySummation/ram:TaxTotalAmount'},
+                '_type': 'decimal',
+                '_required': False},
+ 'amount_total': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeSettlement/ram:SpecifiedTradeSettlementHeaderMonetarySummation/ram:GrandTotalAmount'},
+                  '_type': 'decimal',
+                  '_required': True},
+ 'amount_to_pay': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeSettlement/ram:SpecifiedTradeSettlementHeaderMonetarySummation/ram:DuePayableAmount'},
+                   '_type': 'decimal',
+                   '_required': True},
+ 'tva_calculated': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeSettlement/ram:ApplicableTradeTax/ram:CalculatedAmount'},
+                    '_type': 'decimal',
+                    '_required': False},
+ 'tva_type': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeSettlement/ram:ApplicableTradeTax/ram:TypeCode'},
+              '_required': False,
+              '_default': 'VAT'},
+ 'tva_basis_amount': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeSettlement/ram:ApplicableTradeTax/ram:BasisAmount'},
+                      '_type': 'decimal',
+                      '_required': False},
+ 'tva_category_code': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeSettlement/ram:ApplicableTradeTax/ram:CategoryCode'},
+                       '_required': False},
+ 'tva_due_code': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeSettlement/ram:ApplicableTradeTax/ram:DueDateTypeCode'},
+                  '_required': False},
+ 'tva_rate': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeSettlement/ram:ApplicableTradeTax/ram:RateApplicablePercent'},
+              '_type': 'decimal',
+              '_required': False},
+ 'included_note_content': {'_path': {'factur-x': '//rsm:ExchangedDocument/ram:IncludedNote/ram:Content'},
+                           '_required': False},
+ 'included_note_subject_code': {'_path': {'factur-x': '//rsm:ExchangedDocument/ram:IncludedNote/ram:SubjectCode'},
+                                '_required': False},
+ 'seller_name': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeAgreement/ram:SellerTradeParty/ram:Name'},
+                 '_required': True},
+ 'seller_global_siret': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeAgreement/ram:SellerTradeParty/ram:GlobalID'},
+                         '_required': False},
+ 'seller_siret': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeAgreement/ram:SellerTradeParty/ram:ID'},
+                  '_required': False},
+ 'seller_tva_intra': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeAgreement/ram:SellerTradeParty/ram:SpecifiedTaxRegistration/ram:ID'},
+                      '_required': True},
+ 'seller_specified_siret': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeAgreement/ram:SellerTradeParty/ram:SpecifiedLegalOrganization/ram:ID'},
+                            '_required': True},
+ 'seller_iban': {'_path': {'factur-x': '/rsm:CrossIndustryInvoice/rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeSettlement/ram:SpecifiedTradeSettlementPaymentMeans/ram:PayeePartyCreditorFinancialAccount/ram:IBANID'},
+                 '_required': False},
+ 'seller_rib': {'_path': {'factur-x': '/rsm:CrossIndustryInvoice/rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeSettlement/ram:SpecifiedTradeSettlementPaymentMeans/ram:PayeePartyCreditorFinancialAccount/ram:ProprietaryID'},
+                '_required': False},
+ 'seller_account_name': {'_path': {'factur-x': '/rsm:CrossIndustryInvoice/rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeSettlement/ram:SpecifiedTradeSettlementPaymentMeans/ram:PayeePartyCreditorFinancialAccount/ram:AccountName'},
+                         '_required': False},
+ 'seller_payment_type_code': {'_path': {'factur-x': '/rsm:CrossIndustryInvoice/rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeSettlement/ram:SpecifiedTradeSettlementPaymentMeans/ram:TypeCode'},
+                              '_required': False},
+ 'seller_country': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeAgreement/ram:SellerTradeParty/ram:PostalTradeAddress/ram:CountryID'},
+                    '_required': False},
+ 'seller_post_code': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeAgreement/ram:SellerTradeParty/ram:PostalTradeAddress/ram:PostcodeCode'},
+                      '_required': False},
+ 'seller_address': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeAgreement/ram:SellerTradeParty/ram:PostalTradeAddress/ram:LineOne'},
+                    '_required': False},
+ 'seller_address2': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeAgreement/ram:SellerTradeParty/ram:PostalTradeAddress/ram:LineTwo'},
+                     '_required': False},
+ 'seller_address3': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeAgreement/ram:SellerTradeParty/ram:PostalTradeAddress/ram:LineThree'},
+                     '_required': False},
+ 'seller_city_name': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeAgreement/ram:SellerTradeParty/ram:PostalTradeAddress/ram:CityName'},
+                      '_required': False},
+ 'buyer_siret': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeAgreement/ram:BuyerTradeParty/ram:ID'},
+                 '_required': True},
+ 'buyer_specified_siret': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeAgreement/ram:BuyerTradeParty/ram:SpecifiedLegalOrganization/ram:ID'},
+                           '_required': True},
+ 'buyer_name': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeAgreement/ram:BuyerTradeParty/ram:Name'},
+                '_required': True},
+ 'buyer_address': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeAgreement/ram:BuyerTradeParty/ram:PostalTradeAddress/ram:LineOne'},
+                   '_required': False},
+ 'buyer_address_2': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeAgreement/ram:BuyerTradeParty/ram:PostalTradeAddress/ram:LineTwo'},
+                     '_required': False},
+ 'buyer_address_3': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeAgreement/ram:BuyerTradeParty/ram:PostalTradeAddress/ram:LineThree'},
+                     '_required': False},
+ 'buyer_post_code': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeAgreement/ram:BuyerTradeParty/ram:PostalTradeAddress/ram:PostcodeCode'},
+                     '_required': False},
+ 'buyer_city_name': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeAgreement/ram:BuyerTradeParty/ram:PostalTradeAddress/ram:CityName'},
+                     '_required': False},
+ 'buyer_country': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeAgreement/ram:BuyerTradeParty/ram:PostalTradeAddress/ram:CountryID'},
+                   '_required': False},
+ 'buyer_country_subdivision': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeAgreement/ram:BuyerTradeParty/ram:PostalTradeAddress/ram:CountrySubDivisionName'},
+                               '_required': False},
+ 'buyer_telephone': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeAgreement/ram:BuyerTradeParty/ram:DefinedTradeContact/ram:TelephoneUniversalCommunication/ram:CompleteNumber'},
+                     '_required': False},
+ 'buyer_engagement_number': {'_path': {'factur-x': '/rsm:CrossIndustryInvoice/rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeAgreement/ram:ContractReferencedDocument/ram:IssuerAssignedID'},
+                             '_required': False},
+ 'buyer_bon_commande': {'_path': {'factur-x': '/rsm:CrossIndustryInvoice/rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeAgreement/ram:BuyerOrderReferencedDocument/ram:IssuerAssignedID'},
+                        '_required': False},
+ 'buyer_code_service': {'_path': {'factur-x': '/rsm:CrossIndustryInvoice/rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeAgreement/ram:BuyerReference'},
+                        '_required': False},
+ 'shipping_identifier': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeDelivery/ram:ShipToTradeParty/ram:ID'},
+                         '_required': False},
+ 'shipping_country': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeDelivery/ram:ShipToTradeParty/ram:PostalTradeAddress/ram:CountryID'},
+                      '_required': False},
+ 'shipping_address': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeDelivery/ram:ShipToTradeParty/ram:PostalTradeAddress/ram:LineOne'},
+                      '_required': False},
+ 'shipping_city': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeDelivery/ram:ShipToTradeParty/ram:PostalTradeAddress/ram:CityName'},
+                   '_required': False},
+ 'supply_chain_trade_line_item': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:IncludedSupplyChainTradeLineItem/ram:AssociatedDocumentLineDocument'}},
+ 'line_id': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:IncludedSupplyChainTradeLineItem/ram:AssociatedDocumentLineDocument/ram:LineID'}},
+ 'item_identifier': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:IncludedSupplyChainTradeLineItem/ram:SpecifiedTradeProduct/ram:GlobalID'},
+                     '_required': False},
+ 'buyer_assigned_item_identifier': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:IncludedSupplyChainTradeLineItem/ram:SpecifiedTradeProduct/ram:BuyerAssignedID'},
+                                    '_required': False},
+ 'seller_assigned_item_identifier': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:IncludedSupplyChainTradeLineItem/ram:SpecifiedTradeProduct/ram:SellerAssignedID'},
+                                     '_required': False},
+ 'item_description': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:IncludedSupplyChainTradeLineItem/ram:SpecifiedTradeProduct/ram:Description'},
+                      '_required': False},
+ 'item_name': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:IncludedSupplyChainTradeLineItem/ram:SpecifiedTradeProduct/ram:ApplicableProductCharacteristic/ram:Description'},
+               '_required': False},
+ 'item_value': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:IncludedSupplyChainTradeLineItem/ram:SpecifiedTradeProduct/ram:ApplicableProductCharacteristic/ram:Value'},
+                '_required': False},
+ 'charge_amount': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:IncludedSupplyChainTradeLineItem/ram:SpecifiedLineTradeAgreement/ram:NetPriceProductTradePrice/ram:ChargeAmount'},
+                   '_type': 'decimal',
+                   '_required': False},
+ 'line_total_amount': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:IncludedSupplyChainTradeLineItem/ram:SpecifiedLineTradeSettlement/ram:SpecifiedTradeSettlementLineMonetarySummation/ram:LineTotalAmount'},
+                       '_type': 'decimal',
+                       '_required': False},
+ 'tva_rate2': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:IncludedSupplyChainTradeLineItem/ram:SpecifiedLineTradeSettlement/ram:ApplicableTradeTax/ram:RateApplicablePercent'},
+               '_type': 'decimal',
+               '_required': False},
+ 'tva_rate3': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeSettlement/ram:SpecifiedTradeAllowanceCharge/ram:CategoryTradeTax/ram:RateApplicablePercent'},
+               '_type': 'decimal',
+               '_required': False},
+ 'buyer_tva_intra': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeAgreement/ram:BuyerTradeParty/ram:SpecifiedTaxRegistration/ram:ID'},
+                     '_required': True},
+ 'seller_email': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeAgreement/ram:SellerTradeParty/ram:URIUniversalCommunication/ram:URIID'},
+                  '_required': True},
+ 'buyer_email': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeAgreement/ram:BuyerTradeParty/ram:URIUniversalCommunication/ram:URIID'},
+                 '_required': True},
+ 'seller_bic': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeSettlement/ram:SpecifiedTradeSettlementPaymentMeans/ram:PayeeSpecifiedCreditorFinancialInstitution/ram:BICID'},
+                '_required': True},
+ 'billing_date_start': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeSettlement/ram:BillingSpecifiedPeriod/ram:StartDateTime/udt:DateTimeString'},
+                        '_type': 'date'},
+ 'billing_date_end': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeSettlement/ram:BillingSpecifiedPeriod/ram:EndDateTime/udt:DateTimeString'},
+                      '_type': 'date'},
+ 'payment_reference': {'_path': {'factur-x': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeSettlement/ram:PaymentReference'},
+                       '_required': True}}
+FLAVORS = {'factur-x': {'xmp_schema': 'Factur-X_extension_schema.xmp',
+              'xmp_filename': 'factur-x.xml',
+              'namespaces': {'rsm': 'urn:un:unece:uncefact:data:standard:CrossIndustryInvoice:100',
+                             'ram': 'urn:un:unece:uncefact:data:standard:ReusableAggregateBusinessInformationEntity:100',
+                             'udt': 'urn:un:unece:uncefact:data:standard:UnqualifiedDataType:100',
+                             'qdt': 'urn:un:unece:uncefact:data:standard:QualifiedDataType:100'},
+              'repeated': {'line_items': '//rsm:SupplyChainTradeTransaction/ram:IncludedSupplyChainTradeLineItem',
+                           'tax_breakdowns': '//rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeSettlement/ram:ApplicableTradeTax'},
+              'levels': {'minimum': {'schema': 'FACTUR-X_BASIC-WL.xsd', 'xmp_str': 'MINIMUM', 'xml': 'minimum.xml'},
+                         'basicwl': {'schema': 'FACTUR-X_BASIC-WL.xsd', 'xmp_str': 'BASIC WL', 'xml': 'basicwl.xml'},
+                         'basic': {'schema': 'FACTUR-X_EN16931.xsd', 'xmp_str': 'BASIC', 'xml': 'basic.xml'},
+                         'en16931': {'schema': 'FACTUR-X_EN16931.xsd', 'xmp_str': 'EN 16931', 'xml': 'en16931.xml'},
+                         'en16931_fe': {'schema': 'FACTUR-X_EN16931-FE.xsd',
+                                        'xmp_str': 'EN 16931',
+                                        'xml': 'en16931_fe.xml'}},
+              'standards': {'country': True, 'currency': True}},
+ 'other-standard': {'xmp_filename': 'something.xml'}}
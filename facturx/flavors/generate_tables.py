@@ -0,0 +1,77 @@
+"""
+Regenerate `_tables.py` and `_codes.py`, the precompiled data of this package.
+
+Importing a Python module is much cheaper than parsing the YAML files, so
+xml_flavor loads the tables from `_tables.py` and only falls back to the
+YAML files when their content no longer matches the recorded digests.
+`_codes.py` holds the ISO 3166 / ISO 4217 codes taken from pycountry, so
+that validation does not need pycountry. Run after editing fields.yml or
+flavors.yml, or upgrading pycountry:
+
+    python -m facturx.flavors.generate_tables
+"""
+
+import os
+import pprint
+
+from facturx.flavors.xml_flavor import TABLE_SOURCES, _load_yml, yaml_digests
+
+TABLES_PATH = os.path.join(os.path.dirname(__file__), '_tables.py')
+CODES_PATH = os.path.join(os.path.dirname(__file__), '_codes.py')
+
+HEADER = '''"""
+%s, do not edit.
+
+Generated by `python -m facturx.flavors.generate_tables`.
+"""
+
+'''
+
+# Codes of the EN 16931 country code list that are not ISO 3166-1 entries
+EXTRA_COUNTRY_CODES = (
+    '1A',  # Kosovo
+    'XI',  # United Kingdom (Northern Ireland)
+)
+
+
+def _write_module(path, docstring, values):
+    with open(path, 'w') as f:
+        f.write(HEADER % docstring)
+        for name, value in values.items():
+            f.write('%s = %s\n' % (name, pprint.pformat(value, width=120, sort_dicts=False)))
+    return path
+
+
+def _frozenset_literal(codes, per_line=16):
+    codes = sorted(codes)
+    lines = [', '.join(repr(code) for code in codes[i:i + per_line]) for i in range(0, len(codes), per_line)]
+    return 'frozenset({\n    %s,\n})' % ',\n    '.join(lines)
+
+
+def generate(path=TABLES_PATH):
+    """Write the tables module to path and return path."""
+    return _write_module(path, 'Precompiled fields.yml and flavors.yml', {
+        'YAML_SHA256': yaml_digests(),
+        'FIELDS': _load_yml(TABLE_SOURCES[0]),
+        'FLAVORS': _load_yml(TABLE_SOURCES[1]),
+    })
+
+
+def generate_codes(path=CODES_PATH):
+    """Write the code lists module to path and return path."""
+    from importlib.metadata import version
+    import pycountry
+
+    country_codes = {country.alpha_2 for country in pycountry.countries} | set(EXTRA_COUNTRY_CODES)
+    currency_codes = {currency.alpha_3 for currency in pycountry.currencies}
+    with open(path, 'w') as f:
+        f.write(HEADER % 'ISO 3166-1 alpha-2 country and ISO 4217 alpha-3 currency codes')
+        f.write('PYCOUNTRY_VERSION = %r\n\n' % version('pycountry'))
+        f.write('COUNTRY_CODES = %s\n\n' % _frozenset_literal(country_codes))
+        f.write('CURRENCY_CODES = %s\n' % _frozenset_literal(currency_codes))
+    return path
+
+
+if __name__ == '__main__':
+    print('Wrote %s' % generate())
+    print('Wrote %s' % generate_codes())
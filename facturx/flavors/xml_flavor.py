@@ -9,25 +9,87 @@ Data kept for each flavor:
 - xml templates to create new XML representations
 """
 
+import copy
+import hashlib
 import os
+import re
+import threading
 from lxml import etree
 
-import pycountry
-import yaml
-
+from facturx.utils import metrics
 from facturx.utils.logger import logger
+from ._codes import COUNTRY_CODES, CURRENCY_CODES
 
 unicode = str
 
+TABLE_SOURCES = ('fields.yml', 'flavors.yml')
+
+# Code type -> exact codes allowed by Factur-X: ISO 3166-1 alpha-2 countries
+# and ISO 4217 alpha-3 currencies. See generate_tables.py.
+CODE_INDEXES = {
+    'country': COUNTRY_CODES,
+    'currency': CURRENCY_CODES,
+}
+
 
 # Load information on different XML standards and paths from YML.
 def _load_yml(filename):
+    import yaml
     with open(os.path.join(os.path.dirname(__file__), filename)) as f:
         return yaml.load(f, Loader=yaml.FullLoader)
 
 
-FIELDS = _load_yml('fields.yml')
-FLAVORS = _load_yml('flavors.yml')
+def yaml_digests():
+    """Return the SHA-256 of each YAML file the tables are built from."""
+    digests = {}
+    for filename in TABLE_SOURCES:
+        with open(os.path.join(os.path.dirname(__file__), filename), 'rb') as f:
+            digests[filename] = hashlib.sha256(f.read()).hexdigest()
+    return digests
+
+
+def _load_tables():
+    # The precompiled tables are used as long as they match the YAML files,
+    # parsing YAML is the slowest part of importing this module.
+    try:
+        from . import _tables
+    except ImportError:
+        _tables = None
+    if _tables is not None and _tables.YAML_SHA256 == yaml_digests():
+        return _tables.FIELDS, _tables.FLAVORS
+    logger.debug('Precompiled tables are missing or outdated, loading %s. '
+                 'Run `python -m facturx.flavors.generate_tables` to update them.', ', '.join(TABLE_SOURCES))
+    return _load_yml('fields.yml'), _load_yml('flavors.yml')
+
+
+FIELDS, FLAVORS = _load_tables()
+
+# Compiled XMLSchema objects, keyed by (flavor, level). Compiling a schema
+# (with all its imported data type files) is far more expensive than
+# validating a document against it, so it is done once per process.
+_SCHEMA_CACHE = {}
+_SCHEMA_CACHE_LOCK = threading.Lock()
+# One lock per cached schema, same keys. A validation stores its errors on
+# the shared XMLSchema (error_log): the lock keeps another thread from
+# replacing them before they are read.
+_SCHEMA_LOCKS = {}
+
+# Compiled etree.XPath objects, keyed by (flavor, field_name) and bound to the
+# namespaces declared for the flavor in flavors.yml.
+_XPATH_CACHE = {}
+
+# Single-pass extraction dispatch tables, keyed by flavor. See
+# XMLFlavor.get_dispatch_table().
+_DISPATCH_CACHE = {}
+# Parsed and validated master XML templates, keyed by (flavor, level). New
+# invoices get a deep copy, see XMLFlavor.from_template().
+_TEMPLATE_CACHE = {}
+_TEMPLATE_CACHE_LOCK = threading.Lock()
+
+# Repeated elements, keyed by (flavor, name). See XMLFlavor.get_repeated_fields().
+_REPEATED_CACHE = {}
+
+_STEP_RE = re.compile(r'^(?:([A-Za-z_][\w.-]*):)?([A-Za-z_][\w.-]*)$')
 
 
 class XMLFlavor(object):
@@ -45,24 +107,97 @@ class XMLFlavor(object):
     def from_template(cls, flavor, level):
         """Creates a new XML tree with the desired level and flavor from an existing template
 
-        Returns lxml.etree and xml_flavor.XMLFlavor instance.
+        The tree is a copy of a cached master template, already validated
+        against the XSD: no file is read once the template is loaded.
+
+        Returns xml_flavor.XMLFlavor instance and lxml.etree.
         """
-        template_filename = os.path.join(
-            os.path.dirname(__file__),
-            flavor,
-            'xml',
-            FLAVORS[flavor]['levels'][level]['xml'])
-        assert os.path.isfile(template_filename), 'Template for this flavor/level does not exist.'
-        parser = etree.XMLParser(remove_blank_text=True)
-        with open(template_filename) as f:
-            xml_tree = etree.parse(f, parser).getroot()
+        xml_tree = copy.deepcopy(cls.get_template(flavor, level))
         return cls(xml_tree), xml_tree
 
+    @classmethod
+    def get_template(cls, flavor, level):
+        """Return the master template of flavor/level, loading and validating it on first use.
+
+        The master tree is shared: never modify it, use from_template() to
+        get a copy.
+        """
+        key = (flavor, level)
+        xml_tree = _TEMPLATE_CACHE.get(key)
+        if xml_tree is not None:
+            metrics.count('cache.hit', cache='template')
+            return xml_tree
+        with _TEMPLATE_CACHE_LOCK:
+            xml_tree = _TEMPLATE_CACHE.get(key)
+            if xml_tree is None:
+                metrics.count('cache.miss', cache='template')
+                template_filename = os.path.join(
+                    os.path.dirname(__file__),
+                    flavor,
+                    'xml',
+                    FLAVORS[flavor]['levels'][level]['xml'])
+                assert os.path.isfile(template_filename), 'Template for this flavor/level does not exist.'
+                parser = etree.XMLParser(remove_blank_text=True)
+                with open(template_filename) as f:
+                    xml_tree = etree.parse(f, parser).getroot()
+                cls(xml_tree).check_xsd(xml_tree)
+                _TEMPLATE_CACHE[key] = xml_tree
+        return xml_tree
+
+    @classmethod
+    def register_template(cls, xml, flavor='factur-x', level=None):
+        """Use xml as the template of new invoices of flavor/level.
+
+        xml is an etree.Element or a XML string, for example a template with
+        the seller fields already filled. It is validated once, here, and
+        copied: later changes to the given tree are not seen. level defaults
+        to the level declared in the XML. A flavor or level other than the
+        declared ones raises ValueError; en16931_fe accepts EN 16931 XML.
+        """
+        if isinstance(xml, (str, bytes)):
+            parser = etree.XMLParser(remove_blank_text=True, resolve_entities=False, no_network=True)
+            xml = etree.fromstring(xml.encode('utf-8') if isinstance(xml, str) else xml, parser)
+        else:
+            xml = copy.deepcopy(xml)
+        xml_flavor = cls(xml)
+        if xml_flavor.name != flavor:
+            raise ValueError("The template is a %s XML, not %s." % (xml_flavor.name, flavor))
+        levels = FLAVORS[flavor]['levels']
+        if level is None:
+            level = xml_flavor.level
+        elif level not in levels:
+            raise ValueError("Unknown level '%s' for flavor '%s'." % (level, flavor))
+        elif levels[level]['xmp_str'] != levels[xml_flavor.level]['xmp_str']:
+            # the template would give new invoices the wrong level and schema
+            raise ValueError("The template declares the level '%s', not '%s'." % (xml_flavor.level, level))
+        xml_flavor.check_xsd(xml)
+        with _TEMPLATE_CACHE_LOCK:
+            _TEMPLATE_CACHE[(flavor, level)] = xml
+        return level
+
+    @classmethod
+    def preload_templates(cls, flavor=None):
+        """Load and validate the template of every level listed in flavors.yml."""
+        flavors = [flavor] if flavor is not None else list(FLAVORS.keys())
+        for flavor_name in flavors:
+            for level in FLAVORS[flavor_name].get('levels', {}):
+                cls.get_template(flavor_name, level)
+
+    @staticmethod
+    def clear_template_cache(flavor=None, level=None):
+        """Drop master templates, registered ones included; they are reloaded from disk on next use."""
+        with _TEMPLATE_CACHE_LOCK:
+            for key in list(_TEMPLATE_CACHE.keys()):
+                if flavor is not None and key[0] != flavor:
+                    continue
+                if level is not None and key[1] != level:
+                    continue
+                del _TEMPLATE_CACHE[key]
+
     def get_level(self, facturx_xml_etree):
         if not isinstance(facturx_xml_etree, type(etree.Element('pouet'))):
             raise ValueError('facturx_xml_etree must be an etree.Element() object')
-        namespaces = facturx_xml_etree.nsmap
-        doc_id_xpath = facturx_xml_etree.xpath(self.get_xml_path('version'), namespaces=namespaces)
+        doc_id_xpath = self.get_compiled_xpath('version')(facturx_xml_etree)
         if not doc_id_xpath:
             raise ValueError("Version field not found.")
         doc_id = doc_id_xpath[0].text
@@ -78,16 +213,10 @@ class XMLFlavor(object):
     def check_xsd(self, etree_to_validate):
         """Validate the XML file against the XSD"""
 
-        xsd_filename = FLAVORS[self.name]['levels'][self.level]['schema']
-        xsd_file = os.path.join(
-            os.path.dirname(__file__),
-            self.name, 'xsd', xsd_filename)
-
-        with open(xsd_file) as f:
-            xsd_etree_obj = etree.parse(f)
-        official_schema = etree.XMLSchema(xsd_etree_obj)
+        official_schema = self.get_schema(self.name, self.level)
         try:
-            official_schema.assertValid(etree_to_validate)
+            with _SCHEMA_LOCKS[(self.name, self.level)]:
+                official_schema.assertValid(etree_to_validate)
         except Exception as e:
             # if the validation of the XSD fails, we arrive here
             logger.warning(
@@ -100,6 +229,68 @@ class XMLFlavor(object):
                 "cause of the problem: %s." % (self.name, unicode(e)))
         return True
 
+    def xsd_errors(self, etree_to_validate):
+        """Validate against the XSD, return every error instead of raising on the first.
+
+        Each error is a dict with 'line', 'column', 'message' and 'path' keys.
+        """
+        official_schema = self.get_schema(self.name, self.level)
+        with _SCHEMA_LOCKS[(self.name, self.level)]:
+            if official_schema.validate(etree_to_validate):
+                return []
+            return [{'line': error.line, 'column': error.column, 'message': error.message, 'path': error.path}
+                    for error in official_schema.error_log]
+
+    @classmethod
+    def get_schema(cls, flavor, level):
+        """Return the compiled XMLSchema for flavor/level, compiling it on first use.
+
+        Compiled schemas are shared by every thread of the process, validate
+        with check_xsd() or xsd_errors(), which serialize their use.
+        """
+        key = (flavor, level)
+        schema = _SCHEMA_CACHE.get(key)
+        if schema is not None:
+            metrics.count('cache.hit', cache='schema')
+            return schema
+        with _SCHEMA_CACHE_LOCK:
+            # another thread may have compiled it while we were waiting
+            schema = _SCHEMA_CACHE.get(key)
+            if schema is None:
+                metrics.count('cache.miss', cache='schema')
+                xsd_filename = FLAVORS[flavor]['levels'][level]['schema']
+                xsd_file = os.path.join(
+                    os.path.dirname(__file__),
+                    flavor, 'xsd', xsd_filename)
+                logger.debug('Compiling XSD %s for %s/%s', xsd_filename, flavor, level)
+                schema = etree.XMLSchema(etree.parse(xsd_file))
+                _SCHEMA_LOCKS.setdefault(key, threading.Lock())
+                _SCHEMA_CACHE[key] = schema
+        return schema
+
+    @classmethod
+    def preload_schemas(cls, flavor=None):
+        """Compile the schema of every level listed in flavors.yml ahead of time.
+
+        Only flavors defining levels are considered. Pass `flavor` to restrict
+        the warm-up to a single flavor.
+        """
+        flavors = [flavor] if flavor is not None else list(FLAVORS.keys())
+        for flavor_name in flavors:
+            for level in FLAVORS[flavor_name].get('levels', {}):
+                cls.get_schema(flavor_name, level)
+
+    @staticmethod
+    def clear_schema_cache(flavor=None, level=None):
+        """Drop compiled schemas, either all of them or those matching flavor/level."""
+        with _SCHEMA_CACHE_LOCK:
+            for key in list(_SCHEMA_CACHE.keys()):
+                if flavor is not None and key[0] != flavor:
+                    continue
+                if level is not None and key[1] != level:
+                    continue
+                del _SCHEMA_CACHE[key]
+
     def get_xmp_xml(self):
         xmp_file = os.path.join(
             os.path.dirname(__file__),
@@ -119,15 +310,175 @@ class XMLFlavor(object):
         else:
             raise KeyError('Path not defined for currenct flavor.')
 
-    def valid_code(self, code_type, field_value):
-        try:
-            if code_type == 'country':
-                pycountry.countries.lookup(field_value)
-            elif code_type == 'currency':
-                pycountry.currencies.lookup(field_value)
-            return True
-        except LookupError:
-            return False
+    def get_compiled_xpath(self, field_name):
+        """Return the compiled XPath of field_name for this flavor."""
+        compiled = _XPATH_CACHE.get((self.name, field_name))
+        if compiled is None:
+            compiled = self.compile_xpath(self.name, field_name)
+        return compiled
+
+    @classmethod
+    def compile_xpath(cls, flavor, field_name):
+        """Compile the path of field_name once and keep it for the whole process."""
+        assert field_name in FIELDS.keys(), 'Field not specified. Try working directly on the XML tree.'
+        path = FIELDS[field_name]['_path'].get(flavor)
+        if path is None:
+            raise KeyError('Path not defined for currenct flavor.')
+        compiled = etree.XPath(path, namespaces=FLAVORS[flavor]['namespaces'])
+        _XPATH_CACHE[(flavor, field_name)] = compiled
+        return compiled
+
+    @classmethod
+    def compile_xpaths(cls, flavor='factur-x'):
+        """Compile the path of every field defined for flavor ahead of time."""
+        for field_name, field_details in FIELDS.items():
+            if field_details['_path'].get(flavor) is not None:
+                cls.compile_xpath(flavor, field_name)
+
+    @classmethod
+    def get_repeated_fields(cls, flavor, name):
+        """Describe the repeated element `name` ('line_items', 'tax_breakdowns') of flavor.
+
+        Returns (element_xpath, field_xpaths): the compiled XPath of the
+        repeated element, and a dict mapping the fields defined inside it to
+        their compiled XPath relative to the element.
+        """
+        key = (flavor, name)
+        repeated = _REPEATED_CACHE.get(key)
+        if repeated is not None:
+            return repeated
+
+        namespaces = FLAVORS[flavor]['namespaces']
+        element_path = FLAVORS[flavor]['repeated'][name]
+        field_xpaths = {}
+        for field_name, field_details in FIELDS.items():
+            path = field_details['_path'].get(flavor)
+            if path is not None and path.startswith(element_path + '/'):
+                field_xpaths[field_name] = etree.XPath(path[len(element_path) + 1:], namespaces=namespaces)
+        repeated = (etree.XPath(element_path, namespaces=namespaces), field_xpaths)
+        _REPEATED_CACHE[key] = repeated
+        return repeated
+
+    @classmethod
+    def get_dispatch_table(cls, flavor):
+        """Map element paths to field names for a single walk over the tree.
+
+        Returns (table, fallback, field_names):
+        - table: last step tag -> list of (steps, anchored, field_name), where
+          steps is the list of Clark notation tags of the path and anchored
+          tells whether the path starts at the document root ('/') or may
+          start anywhere ('//').
+        - fallback: fields whose path is not a plain chain of child steps and
+          must be evaluated with their compiled XPath.
+        - field_names: fields having a path for flavor, in fields.yml order.
+        """
+        dispatch = _DISPATCH_CACHE.get(flavor)
+        if dispatch is not None:
+            return dispatch
+
+        namespaces = FLAVORS[flavor]['namespaces']
+        table = {}
+        fallback = []
+        field_names = []
+        for field_name, field_details in FIELDS.items():
+            path = field_details['_path'].get(flavor)
+            if path is None:
+                continue
+            field_names.append(field_name)
+            steps = cls._path_steps(path, namespaces)
+            if steps is None:
+                fallback.append(field_name)
+                continue
+            anchored = not path.startswith('//')
+            table.setdefault(steps[-1], []).append((steps, anchored, field_name))
+
+        dispatch = (table, fallback, field_names)
+        _DISPATCH_CACHE[flavor] = dispatch
+        return dispatch
+
+    @staticmethod
+    def _path_steps(path, namespaces):
+        """Split an absolute path of plain child steps into Clark notation tags.
+
+        Returns None when the path uses anything else (predicates, axes,
+        wildcards, attributes...).
+        """
+        if path.startswith('//'):
+            path = path[2:]
+        elif path.startswith('/'):
+            path = path[1:]
+        else:
+            return None
+        steps = []
+        for step in path.split('/'):
+            match = _STEP_RE.match(step)
+            if match is None:
+                return None
+            prefix, local_name = match.groups()
+            if prefix is None:
+                steps.append(local_name)
+            elif prefix in namespaces:
+                steps.append('{%s}%s' % (namespaces[prefix], local_name))
+            else:
+                return None
+        return steps
+
+    def extract_fields(self, xml_root):
+        """Return the text of every field defined for the flavor, in one tree walk.
+
+        Fields missing from the tree are set to None. When a path matches
+        several elements, the first one in document order wins, like
+        `xpath(...)[0]`.
+        """
+        table, fallback, field_names = self.get_dispatch_table(self.name)
+        found = {}
+        remaining = len(field_names) - len(fallback)
+        stack = []
+        for event, element in etree.iterwalk(xml_root, events=('start', 'end')):
+            if event == 'end':
+                stack.pop()
+                continue
+            stack.append(element.tag)
+            candidates = table.get(element.tag)
+            if candidates is None:
+                continue
+            depth = len(stack)
+            for steps, anchored, field_name in candidates:
+                if field_name in found:
+                    continue
+                size = len(steps)
+                if depth < size or (anchored and depth != size):
+                    continue
+                if stack[depth - size:] == steps:
+                    found[field_name] = element.text
+                    remaining -= 1
+            if not remaining:
+                break
+
+        for field_name in fallback:
+            nodes = self.get_compiled_xpath(field_name)(xml_root)
+            found[field_name] = nodes[0].text if nodes else None
+
+        return {field_name: found.get(field_name) for field_name in field_names}
+
+    @staticmethod
+    def valid_code(code_type, field_value):
+        """Check field_value is a code of code_type ('country' or 'currency')."""
+        return field_value in CODE_INDEXES[code_type]
+
+    @staticmethod
+    def valid_codes(code_type, values):
+        """Check a column of codes at once, return one boolean per value.
+
+        Empty values (None or '') are considered valid, like unset optional
+        fields in FacturX.is_valid(). Each distinct value is checked once.
+        """
+        values = list(values)
+        invalid = set(values).difference(CODE_INDEXES[code_type])
+        invalid.difference_update((None, ''))
+        if not invalid:
+            return [True] * len(values)
+        return [value not in invalid for value in values]
 
     @staticmethod
     def valid_xmp_filenames():
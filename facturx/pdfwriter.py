@@ -1,34 +1,35 @@
 import hashlib
 import io
+import zlib
 
-from pypdf import PdfWriter, PdfReader
+from pypdf import PdfWriter
 from pypdf.generic import (DictionaryObject, NumberObject, NameObject, create_string_object, ArrayObject,
-                           DecodedStreamObject)
+                           DecodedStreamObject, IndirectObject, ByteStringObject, StreamObject)
 
+from facturx.extract import is_facturx_filespec, iter_embedded_files
+from facturx.utils import metrics
+from facturx.utils.buffers import source_buffer
 from facturx.utils.logger import logger
 from facturx.utils.writer_utils import get_original_output_intents, base_info2pdf_metadata, get_pdf_timestamp, \
-    read_icc_profile, create_output_intent, prepare_pdf_metadata_txt, prepare_pdf_metadata_xml
+    create_output_intent, prepare_pdf_metadata_txt, render_pdf_metadata_xml
 
 file_types = (io.IOBase,)
 unicode = str
 
-class FacturXPDFWriter(PdfWriter):
-    def __init__(self, facturx, pdf_metadata=None):
-        """Take a FacturX instance and write the XML to the attached PDF file"""
 
-        super().__init__()
-        self.factx = facturx
+class FacturXObjectsMixin(object):
+    """Builds the objects turning a PDF into a Factur-X invoice.
 
-        original_pdf = PdfReader(facturx.pdf)
-        # Extract /OutputIntents obj from original invoice
-        output_intents = get_original_output_intents(original_pdf)
-        self.append_pages_from_reader(original_pdf)
+    Classes using it provide `factx` (the FacturX instance) and
+    `_add_object(obj)`, returning an IndirectObject.
+    """
 
-        original_pdf_id = original_pdf.trailer.get("/ID")
-        logger.debug('original_pdf_id=%s', original_pdf_id)
-        if original_pdf_id:
-            self._ID = original_pdf_id
+    # Flate-compress the embedded XML file
+    compress_streams = False
+    # Indent the embedded XML file
+    pretty_print = True
 
+    def _get_pdf_metadata(self, pdf_metadata):
         if pdf_metadata is None:
             base_info = {
                 'seller': self.factx['seller_name'],
@@ -36,27 +37,32 @@ class FacturXPDFWriter(PdfWriter):
                 'date': self.factx['date'],
                 'doc_type': self.factx['type'],
             }
-            pdf_metadata = base_info2pdf_metadata(base_info)
-        else:
-            # clean-up pdf_metadata dict
-            for key, value in pdf_metadata.items():
-                if not isinstance(value, (str, unicode)):
-                    pdf_metadata[key] = ''
-
-        self._update_metadata_add_attachment(pdf_metadata, output_intents)
+            return base_info2pdf_metadata(base_info)
+        # clean-up pdf_metadata dict
+        for key, value in pdf_metadata.items():
+            if not isinstance(value, (str, unicode)):
+                pdf_metadata[key] = ''
+        return pdf_metadata
 
-    def _update_metadata_add_attachment(self, pdf_metadata, output_intents):
+    def _add_attachment(self):
+        """Add the embedded XML file and its Filespec, return (file name, Filespec)."""
         # The entry for the file
-        facturx_xml_str = self.factx.xml_str
-        md5sum = hashlib.md5(facturx_xml_str).hexdigest()
+        facturx_xml_str = self.factx.xml_bytes(self.pretty_print)
+        md5sum = self.factx.xml_md5(self.pretty_print)
         md5sum_obj = create_string_object(md5sum)
         params_dict = DictionaryObject({
             NameObject('/CheckSum'): md5sum_obj,
             NameObject('/ModDate'): create_string_object(get_pdf_timestamp()),
             NameObject('/Size'): NumberObject(len(facturx_xml_str)),
         })
-        file_entry = DecodedStreamObject()
-        file_entry.set_data(facturx_xml_str)  # here we integrate the file itself
+        if self.compress_streams:
+            file_entry = StreamObject.initialize_from_dictionary({
+                NameObject("/Filter"): NameObject("/FlateDecode"),
+                "__streamdata__": zlib.compress(facturx_xml_str),
+            })
+        else:
+            file_entry = DecodedStreamObject()
+            file_entry.set_data(facturx_xml_str)  # here we integrate the file itself
         file_entry.update({
             NameObject("/Type"): NameObject("/EmbeddedFile"),
             NameObject("/Params"): params_dict,
@@ -80,6 +86,62 @@ class FacturXPDFWriter(PdfWriter):
             NameObject("/UF"): fname_obj,
         })
         filespec_obj = self._add_object(filespec_dict)
+        return fname_obj, filespec_obj
+
+    def _add_default_output_intent(self):
+        # logger.info("No OutputIntent found, embedding sRGB ICC profile")
+        return create_output_intent(self)
+
+    def _add_xmp_metadata(self, pdf_metadata):
+        metadata_xml_str = render_pdf_metadata_xml(self.factx.flavor, pdf_metadata)
+        metadata_file_entry = DecodedStreamObject()
+        metadata_file_entry.set_data(metadata_xml_str)
+        metadata_file_entry.update({
+            NameObject('/Subtype'): NameObject('/XML'),
+            NameObject('/Type'): NameObject('/Metadata'),
+        })
+        return self._add_object(metadata_file_entry)
+
+
+class FacturXPDFWriter(FacturXObjectsMixin, PdfWriter):
+    # Maximum number of objects packed in one object stream
+    OBJECT_STREAM_SIZE = 100
+
+    def __init__(self, facturx, pdf_metadata=None, optimize=False, deduplicate=False, pretty_print=True):
+        """Take a FacturX instance and write the XML to the attached PDF file
+
+        With optimize=True, the output is made smaller: streams without
+        filter (the embedded XML, ICC profiles, page contents...) are
+        Flate-compressed, except XMP metadata which PDF/A requires in clear,
+        and objects are packed into object streams with a cross-reference
+        stream. deduplicate=True also merges identical objects.
+        pretty_print=False embeds the XML without indentation.
+        """
+
+        super().__init__()
+        self.factx = facturx
+        self.pretty_print = pretty_print
+        self.compress_streams = optimize
+        self._object_streams = optimize
+        self._deduplicate = deduplicate
+
+        original_pdf = facturx.pdf_reader
+        # Extract /OutputIntents obj from original invoice
+        output_intents = get_original_output_intents(original_pdf)
+        with metrics.span('write.pages'):
+            self.append_pages_from_reader(original_pdf)
+
+        original_pdf_id = original_pdf.trailer.get("/ID")
+        logger.debug('original_pdf_id=%s', original_pdf_id)
+        if original_pdf_id:
+            self._ID = original_pdf_id
+
+        pdf_metadata = self._get_pdf_metadata(pdf_metadata)
+        self._update_metadata_add_attachment(pdf_metadata, output_intents)
+
+    def _update_metadata_add_attachment(self, pdf_metadata, output_intents):
+        with metrics.span('write.attachment'):
+            fname_obj, filespec_obj = self._add_attachment()
 
         # Create embedded files dictionary
         embedded_files_names_dict = DictionaryObject({
@@ -92,29 +154,21 @@ class FacturXPDFWriter(PdfWriter):
         # Handle OutputIntents
         res_output_intents = []
         for output_intent_dict, dest_output_profile_dict in output_intents:
-            dest_output_profile_obj = self._add_object(dest_output_profile_dict)
+            # The reader is shared with the FacturX instance: copy its objects
+            # instead of re-registering them in this writer.
+            dest_output_profile_obj = dest_output_profile_dict.clone(self).indirect_reference
+            output_intent_dict = DictionaryObject(output_intent_dict)
             output_intent_dict.update({NameObject("/DestOutputProfile"): dest_output_profile_obj})
             output_intent_obj = self._add_object(output_intent_dict)
             res_output_intents.append(output_intent_obj)
 
         if not res_output_intents:
-            # logger.info("No OutputIntent found, embedding sRGB ICC profile")
-            icc_path = "/usr/share/color/icc/colord/sRGB.icc"
-            icc_bytes = read_icc_profile(icc_path)
-            output_intent_obj = create_output_intent(self, icc_bytes)
-            res_output_intents.append(output_intent_obj)
+            with metrics.span('write.output_intent'):
+                res_output_intents.append(self._add_default_output_intent())
 
         # Embed metadata XML
-        xmp_level_str = self.factx.flavor.details['levels'][self.factx.flavor.level]['xmp_str']
-        xmp_template = self.factx.flavor.get_xmp_xml()
-        metadata_xml_str = prepare_pdf_metadata_xml(xmp_level_str, xmp_filename, xmp_template, pdf_metadata)
-        metadata_file_entry = DecodedStreamObject()
-        metadata_file_entry.set_data(metadata_xml_str)
-        metadata_file_entry.update({
-            NameObject('/Subtype'): NameObject('/XML'),
-            NameObject('/Type'): NameObject('/Metadata'),
-        })
-        metadata_obj = self._add_object(metadata_file_entry)
+        with metrics.span('write.xmp'):
+            metadata_obj = self._add_xmp_metadata(pdf_metadata)
         af_value_obj = self._add_object(ArrayObject([filespec_obj]))
         self._root_object.update({
             NameObject("/AF"): af_value_obj,
@@ -125,3 +179,295 @@ class FacturXPDFWriter(PdfWriter):
         })
         metadata_txt_dict = prepare_pdf_metadata_txt(pdf_metadata)
         self.add_metadata(metadata_txt_dict)
+
+    def _compress_unfiltered_streams(self):
+        for i, obj in enumerate(self._objects):
+            if (not isinstance(obj, StreamObject) or '/Filter' in obj or
+                    obj.get('/Type') == '/Metadata'):
+                continue
+            compressed = obj.flate_encode()
+            compressed.indirect_reference = obj.indirect_reference
+            self._objects[i] = compressed
+
+    def write_stream(self, stream):
+        if self._deduplicate:
+            with metrics.span('write.deduplicate'):
+                self.compress_identical_objects()
+        if self.compress_streams:
+            with metrics.span('write.compress'):
+                self._compress_unfiltered_streams()
+        with metrics.span('write.serialize', incremental=False):
+            if not self._object_streams or self._encryption:
+                return super().write_stream(stream)
+
+            self._resolve_links()
+            # object and cross-reference streams appeared in PDF 1.5
+            self.pdf_header = '%PDF-1.7'
+            self._write_with_object_streams(stream)
+
+    def _write_with_object_streams(self, stream):
+        """Write the document with non-stream objects packed in object streams.
+
+        Cross-reference data then goes in a cross-reference stream, which
+        also holds the trailer entries.
+        """
+        # xref entries, indexed by idnum: (type, field 2, field 3)
+        entries = [(0, 0, 65535)]
+        packable = []
+        stream.write(self.pdf_header.encode() + b"\n")
+        stream.write(b"%\xE2\xE3\xCF\xD3\n")
+        for idnum, obj in enumerate(self._objects, start=1):
+            if obj is None:
+                entries.append((0, 0, 0))
+            elif isinstance(obj, StreamObject):
+                entries.append((1, stream.tell(), 0))
+                self._write_indirect_object(stream, idnum, obj)
+            else:
+                entries.append(None)
+                packable.append((idnum, obj))
+
+        next_idnum = len(self._objects) + 1
+        for start in range(0, len(packable), self.OBJECT_STREAM_SIZE):
+            chunk = packable[start:start + self.OBJECT_STREAM_SIZE]
+            object_stream_idnum = next_idnum
+            next_idnum += 1
+            offsets = []
+            body = io.BytesIO()
+            for index, (idnum, obj) in enumerate(chunk):
+                offsets.append(b'%d %d' % (idnum, body.tell()))
+                obj.write_to_stream(body)
+                body.write(b'\n')
+                entries[idnum] = (2, object_stream_idnum, index)
+            table = b' '.join(offsets) + b'\n'
+            object_stream = StreamObject.initialize_from_dictionary({
+                NameObject('/Type'): NameObject('/ObjStm'),
+                NameObject('/N'): NumberObject(len(chunk)),
+                NameObject('/First'): NumberObject(len(table)),
+                NameObject('/Filter'): NameObject('/FlateDecode'),
+                "__streamdata__": zlib.compress(table + body.getvalue()),
+            })
+            entries.append((1, stream.tell(), 0))
+            self._write_indirect_object(stream, object_stream_idnum, object_stream)
+
+        xref_idnum = next_idnum
+        xref_location = stream.tell()
+        entries.append((1, xref_location, 0))
+        offset_size = max(4, (xref_location.bit_length() + 7) // 8)
+        xref_data = b''.join(
+            entry_type.to_bytes(1, 'big') + field2.to_bytes(offset_size, 'big') + field3.to_bytes(2, 'big')
+            for entry_type, field2, field3 in entries)
+        xref_dict = {
+            NameObject('/Type'): NameObject('/XRef'),
+            NameObject('/Size'): NumberObject(xref_idnum + 1),
+            NameObject('/W'): ArrayObject([NumberObject(1), NumberObject(offset_size), NumberObject(2)]),
+            NameObject('/Root'): self.root_object.indirect_reference,
+            NameObject('/Filter'): NameObject('/FlateDecode'),
+            "__streamdata__": zlib.compress(xref_data),
+        }
+        if self._info is not None:
+            xref_dict[NameObject('/Info')] = self._info.indirect_reference
+        if self._ID is not None:
+            xref_dict[NameObject('/ID')] = self._ID
+        self._write_indirect_object(stream, xref_idnum, StreamObject.initialize_from_dictionary(xref_dict))
+        stream.write(b"startxref\n%d\n%%%%EOF\n" % xref_location)
+
+    @staticmethod
+    def _write_indirect_object(stream, idnum, obj):
+        stream.write(b"%d 0 obj\n" % idnum)
+        obj.write_to_stream(stream)
+        stream.write(b"\nendobj\n")
+
+
+class FacturXIncrementalWriter(FacturXObjectsMixin):
+    """Write a Factur-X PDF as an incremental update of the original PDF.
+
+    The original bytes are copied unchanged and followed by a new revision
+    holding only the attachment, the XMP metadata, the OutputIntents (when
+    the original has none), a new catalog, a new document information
+    dictionary and a cross-reference section of the same kind as the
+    original one (table or stream). Pages are never parsed.
+
+    An existing Factur-X attachment is replaced; other attachments are kept.
+    With optimize=True, the embedded XML is Flate-compressed.
+    """
+
+    COPY_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, facturx, pdf_metadata=None, optimize=False, pretty_print=True):
+        self.factx = facturx
+        self.pretty_print = pretty_print
+        self.compress_streams = optimize
+        self._reader = facturx.pdf_reader
+        if self._reader.is_encrypted:
+            raise ValueError('Incremental updates of encrypted PDFs are not supported.')
+        # idnum -> (generation, object), in writing order
+        self._objects = {}
+        self._next_idnum = int(self._reader.trailer['/Size'])
+
+        pdf_metadata = self._get_pdf_metadata(pdf_metadata)
+        self._update_metadata_add_attachment(pdf_metadata)
+
+    def _add_object(self, obj):
+        ref = IndirectObject(self._next_idnum, 0, self)
+        self._next_idnum += 1
+        self._objects[ref.idnum] = (0, obj)
+        return ref
+
+    def get_object(self, ref):
+        """Resolve references of the new revision, then of the original PDF."""
+        idnum = ref if isinstance(ref, int) else ref.idnum
+        if idnum in self._objects:
+            return self._objects[idnum][1]
+        return self._reader.get_object(ref)
+
+    def _update_metadata_add_attachment(self, pdf_metadata):
+        trailer = self._reader.trailer
+        root_ref = trailer.raw_get('/Root')
+        original_root = trailer['/Root']
+        catalog = DictionaryObject(original_root)
+        # the catalog keeps its object number: it is redefined by this revision
+        self._root_ref = root_ref
+        self._objects[root_ref.idnum] = (root_ref.generation, catalog)
+
+        with metrics.span('write.attachment'):
+            fname_obj, filespec_obj = self._add_attachment()
+
+        # Keep other attachments, name tree entries must stay sorted
+        entries = [(fname_obj, filespec_obj)]
+        for name, filespec in iter_embedded_files(original_root):
+            if not is_facturx_filespec(filespec.get_object()):
+                entries.append((name, filespec))
+        entries.sort(key=lambda entry: str(entry[0]))
+        names_dict = DictionaryObject(original_root['/Names']) if '/Names' in original_root else DictionaryObject()
+        names_dict[NameObject('/EmbeddedFiles')] = DictionaryObject({
+            NameObject('/Names'): ArrayObject([item for entry in entries for item in entry]),
+        })
+
+        af_array = ArrayObject([filespec_obj])
+        if '/AF' in original_root:
+            af_array.extend(filespec for filespec in original_root['/AF']
+                            if not is_facturx_filespec(filespec.get_object()))
+
+        with metrics.span('write.xmp'):
+            metadata_obj = self._add_xmp_metadata(pdf_metadata)
+        catalog.update({
+            NameObject("/AF"): self._add_object(af_array),
+            NameObject("/Metadata"): metadata_obj,
+            NameObject("/Names"): names_dict,
+            NameObject("/PageMode"): NameObject("/UseAttachments"),
+        })
+        if '/OutputIntents' not in original_root:
+            with metrics.span('write.output_intent'):
+                catalog[NameObject("/OutputIntents")] = ArrayObject([self._add_default_output_intent()])
+
+        info = DictionaryObject(trailer['/Info']) if '/Info' in trailer else DictionaryObject()
+        for key, value in prepare_pdf_metadata_txt(pdf_metadata).items():
+            info[NameObject(key)] = create_string_object(value)
+        self._info_ref = self._add_object(info)
+
+        # ISO 32000-1, 14.4: the first identifier is permanent, the second
+        # one changes with every update of the file
+        original_id = trailer.get('/ID')
+        permanent_id = original_id[0] if original_id else None
+        digest = hashlib.md5(self.factx.xml_bytes(self.pretty_print) + get_pdf_timestamp().encode())
+        if permanent_id is not None:
+            digest.update(permanent_id.original_bytes)
+        update_id = ByteStringObject(digest.digest())
+        self._id = ArrayObject([permanent_id if permanent_id is not None else update_id, update_id])
+
+    def _uses_xref_stream(self):
+        stream = self._reader.stream
+        stream.seek(self._reader._startxref)
+        return not stream.read(4).startswith(b'xref')
+
+    def _copy_original(self, stream):
+        source = self._reader.stream
+        buffer = source_buffer(source)
+        if buffer is not None:
+            # already in memory: no intermediate chunk
+            stream.write(buffer)
+            return len(buffer)
+        source.seek(0)
+        size = 0
+        while True:
+            chunk = source.read(self.COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            stream.write(chunk)
+            size += len(chunk)
+        return size
+
+    @staticmethod
+    def _subsections(positions):
+        """Group sorted {idnum: entry} into [(first idnum, [entries])] runs."""
+        subsections = []
+        for idnum in sorted(positions):
+            if subsections and subsections[-1][0] + len(subsections[-1][1]) == idnum:
+                subsections[-1][1].append(positions[idnum])
+            else:
+                subsections.append((idnum, [positions[idnum]]))
+        return subsections
+
+    def write(self, stream):
+        """Write the original PDF followed by the update to a binary stream."""
+        with metrics.span('write.serialize', incremental=True):
+            self._write_update(stream)
+
+    def _write_update(self, stream):
+        uses_xref_stream = self._uses_xref_stream()
+        base = self._copy_original(stream)
+        increment = io.BytesIO()
+        # the original file may not end with an end-of-line marker
+        increment.write(b'\n')
+
+        positions = {}
+        for idnum, (generation, obj) in self._objects.items():
+            positions[idnum] = (base + increment.tell(), generation)
+            increment.write(b'%d %d obj\n' % (idnum, generation))
+            obj.write_to_stream(increment)
+            increment.write(b'\nendobj\n')
+
+        xref_offset = base + increment.tell()
+        trailer = DictionaryObject({
+            NameObject('/Size'): NumberObject(self._next_idnum),
+            NameObject('/Root'): self._root_ref,
+            NameObject('/Info'): self._info_ref,
+            NameObject('/ID'): self._id,
+            NameObject('/Prev'): NumberObject(self._reader._startxref),
+        })
+        if uses_xref_stream:
+            self._write_xref_stream(increment, positions, xref_offset, trailer)
+        else:
+            increment.write(b'xref\n')
+            for first_idnum, entries in self._subsections(positions):
+                increment.write(b'%d %d\n' % (first_idnum, len(entries)))
+                for offset, generation in entries:
+                    increment.write(b'%010d %05d n \n' % (offset, generation))
+            increment.write(b'trailer\n')
+            trailer.write_to_stream(increment)
+            increment.write(b'\n')
+        increment.write(b'startxref\n%d\n%%%%EOF\n' % xref_offset)
+        stream.write(increment.getvalue())
+
+    def _write_xref_stream(self, increment, positions, xref_offset, trailer):
+        xref_idnum = self._next_idnum
+        positions[xref_idnum] = (xref_offset, 0)
+        offset_size = max(4, (xref_offset.bit_length() + 7) // 8)
+        index = ArrayObject()
+        data = []
+        for first_idnum, entries in self._subsections(positions):
+            index.extend([NumberObject(first_idnum), NumberObject(len(entries))])
+            for offset, generation in entries:
+                data.append(b'\x01' + offset.to_bytes(offset_size, 'big') + generation.to_bytes(2, 'big'))
+        xref_stream = DecodedStreamObject()
+        xref_stream.set_data(b''.join(data))
+        xref_stream.update(trailer)
+        xref_stream.update({
+            NameObject('/Type'): NameObject('/XRef'),
+            NameObject('/Size'): NumberObject(xref_idnum + 1),
+            NameObject('/Index'): index,
+            NameObject('/W'): ArrayObject([NumberObject(1), NumberObject(offset_size), NumberObject(2)]),
+        })
+        increment.write(b'%d 0 obj\n' % xref_idnum)
+        xref_stream.write_to_stream(increment)
+        increment.write(b'\nendobj\n')
@@ -0,0 +1,333 @@
+"""
+EN 16931 business rules (BR-xx) checked natively on the Factur-X (CII) tree.
+
+The official Schematron only runs through XSLT, which is too slow to use on
+every invoice. Here the values used by the rules are collected once:
+- header values with XPaths compiled at import,
+- line items and VAT breakdowns in one pass per group, each element being
+  matched on its (parent tag, tag) against a precomputed table,
+then every rule is a Python predicate over those values, computed with
+Decimal arithmetic.
+
+Supported rules are listed in RULES. They apply from the level where the
+values they check exist (e.g. no line rules at MINIMUM or BASIC WL).
+"""
+
+import collections
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from lxml import etree
+
+from .constants import BASIC, BASICWL, EN16931, EN16931_FE, MINIMUM
+
+__all__ = ['RULES', 'RuleViolation', 'check_rules']
+
+NAMESPACES = {
+    'rsm': 'urn:un:unece:uncefact:data:standard:CrossIndustryInvoice:100',
+    'ram': 'urn:un:unece:uncefact:data:standard:ReusableAggregateBusinessInformationEntity:100',
+    'udt': 'urn:un:unece:uncefact:data:standard:UnqualifiedDataType:100',
+}
+LEVEL_RANKS = {MINIMUM: 0, BASICWL: 1, BASIC: 2, EN16931: 3, EN16931_FE: 3}
+
+RuleViolation = collections.namedtuple('RuleViolation', ['rule', 'message', 'location'])
+RuleViolation.__doc__ = """A business rule not met by an invoice.
+
+- rule: rule identifier, e.g. 'BR-CO-10'.
+- message: what is wrong, with the values involved.
+- location: XPath of the offending element, or of its expected parent.
+"""
+
+_TRANSACTION = '/rsm:CrossIndustryInvoice/rsm:SupplyChainTradeTransaction'
+_SETTLEMENT = _TRANSACTION + '/ram:ApplicableHeaderTradeSettlement'
+_SUMMATION = _SETTLEMENT + '/ram:SpecifiedTradeSettlementHeaderMonetarySummation'
+_SELLER = _TRANSACTION + '/ram:ApplicableHeaderTradeAgreement/ram:SellerTradeParty'
+_BUYER = _TRANSACTION + '/ram:ApplicableHeaderTradeAgreement/ram:BuyerTradeParty'
+
+# name -> absolute path of the header values used by the rules
+_HEADER_PATHS = {
+    'currency': _SETTLEMENT + '/ram:InvoiceCurrencyCode',
+    'line_total': _SUMMATION + '/ram:LineTotalAmount',
+    'allowance_total': _SUMMATION + '/ram:AllowanceTotalAmount',
+    'charge_total': _SUMMATION + '/ram:ChargeTotalAmount',
+    'tax_basis_total': _SUMMATION + '/ram:TaxBasisTotalAmount',
+    'tax_total': _SUMMATION + '/ram:TaxTotalAmount',
+    'grand_total': _SUMMATION + '/ram:GrandTotalAmount',
+    'prepaid': _SUMMATION + '/ram:TotalPrepaidAmount',
+    'rounding': _SUMMATION + '/ram:RoundingAmount',
+    'due_payable': _SUMMATION + '/ram:DuePayableAmount',
+    'summation': _SUMMATION,
+    'breakdowns': _SETTLEMENT + '/ram:ApplicableTradeTax',
+    'lines': _TRANSACTION + '/ram:IncludedSupplyChainTradeLineItem',
+}
+
+# (rule, description, path, first level) of the mandatory elements
+_MANDATORY = (
+    ('BR-01', 'Specification identifier', '/rsm:CrossIndustryInvoice/rsm:ExchangedDocumentContext/'
+     'ram:GuidelineSpecifiedDocumentContextParameter/ram:ID', MINIMUM),
+    ('BR-02', 'Invoice number', '/rsm:CrossIndustryInvoice/rsm:ExchangedDocument/ram:ID', MINIMUM),
+    ('BR-03', 'Invoice issue date', '/rsm:CrossIndustryInvoice/rsm:ExchangedDocument/ram:IssueDateTime/'
+     'udt:DateTimeString', MINIMUM),
+    ('BR-04', 'Invoice type code', '/rsm:CrossIndustryInvoice/rsm:ExchangedDocument/ram:TypeCode', MINIMUM),
+    ('BR-05', 'Invoice currency code', _SETTLEMENT + '/ram:InvoiceCurrencyCode', MINIMUM),
+    ('BR-06', 'Seller name', _SELLER + '/ram:Name', MINIMUM),
+    ('BR-07', 'Buyer name', _BUYER + '/ram:Name', MINIMUM),
+    ('BR-08', 'Seller postal address', _SELLER + '/ram:PostalTradeAddress', MINIMUM),
+    ('BR-09', 'Seller country code', _SELLER + '/ram:PostalTradeAddress/ram:CountryID', MINIMUM),
+    ('BR-10', 'Buyer postal address', _BUYER + '/ram:PostalTradeAddress', BASICWL),
+    ('BR-11', 'Buyer country code', _BUYER + '/ram:PostalTradeAddress/ram:CountryID', BASICWL),
+    ('BR-12', 'Sum of invoice line net amount', _SUMMATION + '/ram:LineTotalAmount', BASICWL),
+    ('BR-13', 'Invoice total amount without VAT', _SUMMATION + '/ram:TaxBasisTotalAmount', MINIMUM),
+    ('BR-14', 'Invoice total amount with VAT', _SUMMATION + '/ram:GrandTotalAmount', MINIMUM),
+    ('BR-15', 'Amount due for payment', _SUMMATION + '/ram:DuePayableAmount', MINIMUM),
+)
+
+_RAM = '{%s}' % NAMESPACES['ram']
+
+# (parent tag, tag) -> name of the line item values, relative to the line
+_LINE_VALUES = {
+    (_RAM + 'AssociatedDocumentLineDocument', _RAM + 'LineID'): 'line_id',
+    (_RAM + 'SpecifiedLineTradeDelivery', _RAM + 'BilledQuantity'): 'quantity',
+    (_RAM + 'SpecifiedTradeSettlementLineMonetarySummation', _RAM + 'LineTotalAmount'): 'net_amount',
+    (_RAM + 'SpecifiedTradeProduct', _RAM + 'Name'): 'item_name',
+    (_RAM + 'NetPriceProductTradePrice', _RAM + 'ChargeAmount'): 'net_price',
+    (_RAM + 'ApplicableTradeTax', _RAM + 'CategoryCode'): 'category',
+    (_RAM + 'ApplicableTradeTax', _RAM + 'RateApplicablePercent'): 'rate',
+}
+_LINE_TAGS = sorted({tag for _, tag in _LINE_VALUES})
+
+# tag -> name of the VAT breakdown values, children of ram:ApplicableTradeTax
+_BREAKDOWN_VALUES = {
+    _RAM + 'CalculatedAmount': 'tax_amount',
+    _RAM + 'BasisAmount': 'basis',
+    _RAM + 'CategoryCode': 'category',
+    _RAM + 'RateApplicablePercent': 'rate',
+}
+
+# (rule, description, line value) of the mandatory line values, from BASIC
+_LINE_MANDATORY = (
+    ('BR-21', 'Invoice line identifier', 'line_id'),
+    ('BR-22', 'Invoiced quantity', 'quantity'),
+    ('BR-24', 'Invoice line net amount', 'net_amount'),
+    ('BR-25', 'Item name', 'item_name'),
+    ('BR-26', 'Item net price', 'net_price'),
+)
+
+RULES = collections.OrderedDict(
+    [(rule, '%s is mandatory.' % description) for rule, description, _, _ in _MANDATORY] +
+    [('BR-16', 'An invoice shall have at least one invoice line.')] +
+    [(rule, 'Each invoice line shall have an %s.' % description.lower()) for rule, description, _ in _LINE_MANDATORY] +
+    [
+        ('BR-CO-10', 'Sum of invoice line net amount = sum of the invoice line net amounts.'),
+        ('BR-CO-13', 'Invoice total amount without VAT = sum of invoice line net amount '
+                     '- sum of allowances + sum of charges.'),
+        ('BR-CO-14', 'Invoice total VAT amount = sum of the VAT category tax amounts.'),
+        ('BR-CO-15', 'Invoice total amount with VAT = invoice total amount without VAT + invoice total VAT amount.'),
+        ('BR-CO-16', 'Amount due for payment = invoice total amount with VAT - paid amount + rounding amount.'),
+        ('BR-CO-17', 'VAT category tax amount = VAT category taxable amount x VAT category rate, '
+                     'rounded to two decimals.'),
+        ('BR-S-05', "An invoice line with the 'Standard rated' VAT category shall have a VAT rate greater than zero."),
+        ('BR-E-05', "An invoice line with the 'Exempt from VAT' VAT category shall have a VAT rate of 0."),
+        ('BR-Z-05', "An invoice line with the 'Zero rated' VAT category shall have a VAT rate of 0."),
+    ]
+)
+
+_HEADER_XPATHS = {name: etree.XPath(path, namespaces=NAMESPACES) for name, path in _HEADER_PATHS.items()}
+_MANDATORY_XPATHS = tuple((rule, description, etree.XPath(path, namespaces=NAMESPACES), level)
+                          for rule, description, path, level in _MANDATORY)
+
+_CENT = Decimal('0.01')
+
+
+def _decimal(element):
+    """Decimal value of an element, None if it is missing or not a number."""
+    if element is None or element.text is None:
+        return None
+    try:
+        return Decimal(element.text.strip())
+    except InvalidOperation:
+        return None
+
+
+def _first(elements):
+    return elements[0] if elements else None
+
+
+def _collect_lines(lines):
+    """Values of every line item, read in a single pass over each line."""
+    result = []
+    for line in lines:
+        values = {'element': line}
+        for element in line.iter(*_LINE_TAGS):
+            name = _LINE_VALUES.get((element.getparent().tag, element.tag))
+            if name is not None and name not in values:
+                values[name] = element
+        result.append(values)
+    return result
+
+
+def _collect_breakdowns(breakdowns):
+    result = []
+    for breakdown in breakdowns:
+        values = {'element': breakdown}
+        for element in breakdown.iterchildren(*_BREAKDOWN_VALUES):
+            values.setdefault(_BREAKDOWN_VALUES[element.tag], element)
+        result.append(values)
+    return result
+
+
+def _tax_total(elements, currency):
+    """The TaxTotalAmount in the invoice currency (BT-110), there may be one in the VAT currency too."""
+    for element in elements:
+        if element.get('currencyID') in (None, currency):
+            return element
+    return None
+
+
+class _Checker(object):
+
+    def __init__(self, xml_root, rank, selected):
+        self.tree = xml_root.getroottree()
+        self.rank = rank
+        self.selected = selected
+        self.violations = []
+
+    def wants(self, rule, level=MINIMUM):
+        return self.rank >= LEVEL_RANKS[level] and (self.selected is None or rule in self.selected)
+
+    def add(self, rule, message, element):
+        self.violations.append(RuleViolation(rule, message, self.tree.getpath(element)))
+
+    def check_equal(self, rule, label, element, expected, detail):
+        """Report rule if the amount of element differs from expected."""
+        actual = _decimal(element)
+        if actual is not None and expected is not None and actual != expected:
+            self.add(rule, '%s is %s, expected %s (%s).' % (label, actual, expected, detail), element)
+
+
+def check_rules(xml_root, level, rules=None):
+    """Check the EN 16931 business rules that apply to level, return the RuleViolation list.
+
+    rules restricts the check to some rule identifiers of RULES.
+    """
+    if level not in LEVEL_RANKS:
+        raise ValueError("Business rules are not available for the '%s' level." % level)
+    selected = None
+    if rules is not None:
+        selected = set(rules)
+        unknown = selected.difference(RULES)
+        if unknown:
+            raise ValueError('Unknown rules: %s.' % ', '.join(sorted(unknown)))
+    checker = _Checker(xml_root, LEVEL_RANKS[level], selected)
+    values = {name: xpath(xml_root) for name, xpath in _HEADER_XPATHS.items()}
+    lines = _collect_lines(values['lines'])
+    breakdowns = _collect_breakdowns(values['breakdowns'])
+
+    _check_mandatory(checker, xml_root, lines)
+    _check_totals(checker, values, lines, breakdowns)
+    _check_line_categories(checker, lines)
+    return checker.violations
+
+
+def _check_mandatory(checker, xml_root, lines):
+    for rule, description, xpath, level in _MANDATORY_XPATHS:
+        if not checker.wants(rule, level):
+            continue
+        element = _first(xpath(xml_root))
+        if element is None or (len(element) == 0 and not (element.text or '').strip()):
+            checker.add(rule, '%s is missing.' % description, element if element is not None else xml_root)
+
+    if checker.wants('BR-16', BASIC) and not lines:
+        checker.add('BR-16', 'The invoice has no line.', xml_root)
+    for rule, description, name in _LINE_MANDATORY:
+        if not checker.wants(rule, BASIC):
+            continue
+        for line in lines:
+            element = line.get(name)
+            if element is None or not (element.text or '').strip():
+                checker.add(rule, '%s is missing.' % description, line['element'])
+
+
+def _check_totals(checker, values, lines, breakdowns):
+    currency = (_first(values['currency']).text or '').strip() if values['currency'] else None
+    line_total = _first(values['line_total'])
+    tax_basis_total = _first(values['tax_basis_total'])
+    tax_total = _tax_total(values['tax_total'], currency)
+    grand_total = _first(values['grand_total'])
+
+    if checker.wants('BR-CO-10', BASIC) and line_total is not None:
+        amounts = [_decimal(line.get('net_amount')) for line in lines]
+        if None not in amounts:
+            checker.check_equal('BR-CO-10', 'Sum of invoice line net amount', line_total, sum(amounts, Decimal(0)),
+                                'sum of %d line net amounts' % len(amounts))
+
+    if checker.wants('BR-CO-13', BASICWL) and line_total is not None:
+        allowances = _decimal(_first(values['allowance_total'])) or Decimal(0)
+        charges = _decimal(_first(values['charge_total'])) or Decimal(0)
+        expected = _decimal(line_total)
+        if expected is not None:
+            checker.check_equal('BR-CO-13', 'Invoice total amount without VAT', tax_basis_total,
+                                expected - allowances + charges, 'line net amounts - allowances + charges')
+
+    if checker.wants('BR-CO-14', BASICWL) and breakdowns:
+        amounts = [_decimal(breakdown.get('tax_amount')) for breakdown in breakdowns]
+        if None not in amounts:
+            expected = sum(amounts, Decimal(0))
+            if tax_total is None:
+                if expected:
+                    checker.add('BR-CO-14', 'Invoice total VAT amount is missing, expected %s.' % expected,
+                                _first(values['summation']) if values['summation'] else checker.tree.getroot())
+            else:
+                checker.check_equal('BR-CO-14', 'Invoice total VAT amount', tax_total, expected,
+                                    'sum of %d VAT category tax amounts' % len(amounts))
+
+    if checker.wants('BR-CO-15'):
+        basis = _decimal(tax_basis_total)
+        tax = _decimal(tax_total) if tax_total is not None else Decimal(0)
+        if basis is not None and tax is not None:
+            checker.check_equal('BR-CO-15', 'Invoice total amount with VAT', grand_total, basis + tax,
+                                'total without VAT + total VAT')
+
+    # MINIMUM has no paid amount (BT-113)
+    if checker.wants('BR-CO-16', BASICWL):
+        grand = _decimal(grand_total)
+        prepaid = _decimal(_first(values['prepaid'])) or Decimal(0)
+        rounding = _decimal(_first(values['rounding'])) or Decimal(0)
+        if grand is not None:
+            checker.check_equal('BR-CO-16', 'Amount due for payment', _first(values['due_payable']),
+                                grand - prepaid + rounding, 'total with VAT - paid amount + rounding amount')
+
+    if checker.wants('BR-CO-17', BASICWL):
+        for breakdown in breakdowns:
+            basis = _decimal(breakdown.get('basis'))
+            rate = _decimal(breakdown.get('rate'))
+            if basis is None or rate is None:
+                continue
+            expected = (basis * rate / 100).quantize(_CENT, rounding=ROUND_HALF_UP)
+            amount = _decimal(breakdown.get('tax_amount'))
+            if amount is not None and amount.quantize(_CENT, rounding=ROUND_HALF_UP) != expected:
+                checker.add('BR-CO-17', 'VAT category tax amount is %s, expected %s (%s x %s%%).' % (
+                    amount, expected, basis, rate), breakdown['tax_amount'])
+
+
+def _check_line_categories(checker, lines):
+    checks = (
+        ('BR-S-05', 'S', lambda rate: rate > 0, 'greater than zero'),
+        ('BR-E-05', 'E', lambda rate: rate == 0, '0'),
+        ('BR-Z-05', 'Z', lambda rate: rate == 0, '0'),
+    )
+    checks = [check for check in checks if checker.wants(check[0], BASIC)]
+    if not checks:
+        return
+    for line in lines:
+        category = line.get('category')
+        if category is None:
+            continue
+        category = (category.text or '').strip()
+        for rule, code, predicate, expected in checks:
+            if category != code:
+                continue
+            rate = _decimal(line.get('rate'))
+            if rate is None or not predicate(rate):
+                element = line.get('rate')
+                checker.add(rule, "VAT rate of a line of category '%s' is %s, expected %s." % (
+                    code, rate, expected), element if element is not None else line['element'])
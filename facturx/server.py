@@ -0,0 +1,266 @@
+"""
+Long-lived HTTP service: python -m facturx.server [--port 8080] [--jobs N]
+
+Opening an invoice in a fresh process pays for imports, YAML tables and XSD
+compilation. The service pays for them once: its workers are warmed up
+(see warm_up) and kept. PDFs are sent as the request body:
+
+    POST /extract           -> the embedded XML (application/xml)
+    POST /validate[?rules=1] -> the validate() report, as JSON
+    POST /to-dict           -> the to_dict() fields, as JSON
+    POST /embed[?incremental=1&optimize=1]
+                            -> the Factur-X PDF; the body is multipart/form-data
+                               with a 'pdf' and an 'xml' part
+    GET /health             -> {"status": "ok", "pending": n}
+
+At most max_pending requests are accepted at a time, queued for the jobs
+workers. Beyond that the service answers 503 with Retry-After at once
+instead of queueing without bound. Errors are JSON: {"error": "..."}, with
+status 400 for malformed requests and 422 for PDFs that cannot be processed.
+"""
+
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+from concurrent import futures
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from .batch import make_executor
+from .extract import extract_xml_bytes
+from .facturx import FacturX, warm_up
+from .utils.logger import logger
+
+__all__ = ['ENDPOINTS', 'FacturXServer', 'main', 'make_server', 'process_request']
+
+ENDPOINTS = ('extract', 'validate', 'to-dict', 'embed')
+EXECUTORS = ('process', 'thread')
+# larger bodies are refused with 413 before being read
+MAX_BODY_SIZE = 50 * 1024 * 1024
+# refused bodies up to this size are read and discarded first: a client
+# still sending its body would otherwise miss the response
+MAX_DRAIN_SIZE = 1024 * 1024
+
+JSON_TYPE = 'application/json'
+
+
+class RequestError(Exception):
+    """Malformed request, answered with status 400."""
+
+
+def _json(status, value):
+    return status, JSON_TYPE, json.dumps(value, ensure_ascii=False).encode('utf-8')
+
+
+def _flag(options, name):
+    return options.get(name, ['0'])[-1].lower() in ('1', 'true', 'yes')
+
+
+def _extract(body, options):
+    xml_bytes = extract_xml_bytes(body)
+    if xml_bytes is None:
+        return _json(422, {'error': 'No Factur-X XML embedded in the PDF.'})
+    return 200, 'application/xml', xml_bytes
+
+
+def _validate(body, options):
+    with FacturX(body, validation='off') as inv:
+        report = inv.validate(business_rules=_flag(options, 'rules'))
+        record = {'flavor': inv.flavor.name, 'level': inv.flavor.level}
+    record.update(report._asdict())
+    record['rule_violations'] = [violation._asdict() for violation in report.rule_violations]
+    return _json(200, record)
+
+
+def _to_dict(body, options):
+    with FacturX(body, validation='off') as inv:
+        return _json(200, inv.to_dict())
+
+
+def _form_parts(body, content_type):
+    if not content_type.startswith('multipart/form-data'):
+        raise RequestError("Expected a multipart/form-data body with 'pdf' and 'xml' parts.")
+    message = BytesParser(policy=HTTP).parsebytes(b'Content-Type: %s\r\n\r\n' % content_type.encode('latin-1') + body)
+    return {part.get_param('name', header='content-disposition'): part.get_payload(decode=True)
+            for part in message.iter_parts()}
+
+
+def _embed(body, options):
+    parts = _form_parts(body, options['content_type'])
+    if not parts.get('pdf') or not parts.get('xml'):
+        raise RequestError("Expected a multipart/form-data body with 'pdf' and 'xml' parts.")
+    # the XML of the PDF is replaced, read_xml() validates the new one
+    with FacturX(parts['pdf'], validation='off') as inv:
+        inv.read_xml(parts['xml'])
+        pdf_bytes = inv.to_pdf_bytes(incremental=_flag(options, 'incremental'), optimize=_flag(options, 'optimize'))
+    return 200, 'application/pdf', pdf_bytes
+
+
+_HANDLERS = {
+    'extract': _extract,
+    'validate': _validate,
+    'to-dict': _to_dict,
+    'embed': _embed,
+}
+
+
+def process_request(endpoint, body, options):
+    """Return (status, content type, payload) for a request body. Never raises.
+
+    options holds the query parameters (lists of values, as parse_qs returns
+    them) and the 'content_type' of the request. Defined at module level so
+    that process pool workers can run it.
+    """
+    try:
+        return _HANDLERS[endpoint](body, options)
+    except RequestError as e:
+        return _json(400, {'error': str(e)})
+    except Exception as e:
+        return _json(422, {'error': '%s: %s' % (type(e).__name__, e)})
+
+
+class FacturXRequestHandler(BaseHTTPRequestHandler):
+    # keep-alive connections
+    protocol_version = 'HTTP/1.1'
+    # headers and body are separate writes, do not wait for the client's ACK
+    disable_nagle_algorithm = True
+    server_version = 'facturx'
+
+    def do_GET(self):
+        if urlsplit(self.path).path != '/health':
+            return self._send(*_json(404, {'error': 'Not found.'}))
+        self._send(*_json(200, {'status': 'ok', 'pending': self.server.pending}))
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        endpoint = url.path.strip('/')
+        if endpoint not in ENDPOINTS:
+            return self._refuse(404, 'Not found.')
+        try:
+            length = int(self.headers['Content-Length'])
+        except (TypeError, ValueError):
+            return self._refuse(411, 'Content-Length required.')
+        if length > self.server.max_body_size:
+            return self._refuse(413, 'Body larger than %d bytes.' % self.server.max_body_size)
+        if not self.server.acquire():
+            return self._refuse(503, 'Too many pending requests.', {'Retry-After': '1'})
+        try:
+            body = self.rfile.read(length)
+            options = parse_qs(url.query)
+            options['content_type'] = self.headers.get('Content-Type', '')
+            response = self.server.executor.submit(process_request, endpoint, body, options).result()
+        finally:
+            self.server.release()
+        self._send(*response)
+
+    def _refuse(self, status, message, headers=None):
+        try:
+            length = int(self.headers['Content-Length'])
+        except (TypeError, ValueError):
+            length = 0
+        if 0 < length <= MAX_DRAIN_SIZE:
+            self.rfile.read(length)
+        # larger bodies are left unread: the connection cannot be reused
+        self.close_connection = True
+        self._send(*_json(status, {'error': message}), headers=dict(headers or {}, Connection='close'))
+
+    def _send(self, status, content_type, payload, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        # written straight to the socket, without another buffer
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        logger.debug('%s - %s', self.address_string(), format % args)
+
+
+class FacturXServer(ThreadingHTTPServer):
+    """HTTP server running requests on a pool of warm workers.
+
+    Each connection has its own thread, which only does I/O: parsing,
+    validation and PDF writing run on the executor.
+    """
+
+    daemon_threads = True
+    # the default backlog of 5 makes bursts of clients wait for SYN retries
+    request_queue_size = 128
+
+    def __init__(self, address, jobs=None, executor='process', max_pending=None, max_body_size=MAX_BODY_SIZE,
+                 flavor='factur-x'):
+        if executor not in EXECUTORS:
+            raise ValueError("Unknown executor '%s', expected one of %s." % (executor, EXECUTORS))
+        jobs = jobs or os.cpu_count() or 1
+        self.max_pending = max_pending or jobs * 4
+        self.max_body_size = max_body_size
+        self.pending = 0
+        self._pending_lock = threading.Lock()
+        self.executor = make_executor(executor, jobs, flavor)
+        try:
+            # start and warm up the workers now rather than on the first
+            # requests, and before any handler thread exists to fork from
+            futures.wait([self.executor.submit(warm_up, flavor) for _ in range(jobs)])
+            super().__init__(address, FacturXRequestHandler)
+        except Exception:
+            self.executor.shutdown()
+            raise
+
+    def acquire(self):
+        """Reserve a slot for one request, False when max_pending are in progress."""
+        with self._pending_lock:
+            if self.pending >= self.max_pending:
+                return False
+            self.pending += 1
+            return True
+
+    def release(self):
+        with self._pending_lock:
+            self.pending -= 1
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown()
+
+
+def make_server(host='127.0.0.1', port=8080, **kwargs):
+    """Return a FacturXServer bound to (host, port), see FacturXServer for kwargs.
+
+    Port 0 picks a free port, available in server.server_address.
+    """
+    return FacturXServer((host, port), **kwargs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m facturx.server',
+                                     description='Serve Factur-X operations over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('-j', '--jobs', type=int, help='number of workers (default: number of CPUs)')
+    parser.add_argument('--executor', choices=EXECUTORS, default='process', help='kind of workers (default: process)')
+    parser.add_argument('--max-pending', type=int,
+                        help='requests accepted at a time before answering 503 (default: 4 per worker)')
+    parser.add_argument('--max-body-size', type=int, default=MAX_BODY_SIZE, help='largest accepted body, in bytes')
+    args = parser.parse_args(argv)
+    server = make_server(args.host, args.port, jobs=args.jobs, executor=args.executor,
+                         max_pending=args.max_pending, max_body_size=args.max_body_size)
+    logger.info('Serving Factur-X on http://%s:%d', *server.server_address[:2])
+    # stop the workers too when terminated
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    with server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
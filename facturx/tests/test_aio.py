@@ -0,0 +1,80 @@
+import asyncio
+import io
+import os
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from facturx import FacturX, aio, extract_xml_bytes
+
+
+class TestAsyncAPI(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.test_files_dir = os.path.join(os.path.dirname(__file__), 'sample_invoices')
+        self.test_file = os.path.join(self.test_files_dir, 'embedded_data.pdf')
+
+    def tearDown(self):
+        aio.configure(executor=None, max_concurrency=os.cpu_count() or 1)
+
+    async def test_open_and_read(self):
+        inv = await FacturX.aopen(self.test_file)
+        sync_inv = FacturX(self.test_file)
+        self.assertEqual(await inv.ato_dict(), sync_inv.to_dict())
+        self.assertEqual(await inv.ais_valid(), sync_inv.is_valid())
+        inv.close()
+        self.assertIsNone(inv.pdf)
+
+    async def test_open_buffer(self):
+        with open(self.test_file, 'rb') as f:
+            buffer = bytearray(f.read())
+        inv = await FacturX.aopen(buffer)
+        self.assertEqual(await inv.ato_dict(), FacturX(self.test_file).to_dict())
+        inv.close()
+        # the bytearray is released on close
+        buffer.extend(b'\n')
+
+    async def test_open_missing_file(self):
+        with self.assertRaises(TypeError):
+            await FacturX.aopen('does-not-exist.pdf')
+
+    async def test_write_pdf(self):
+        inv = await FacturX.aopen(os.path.join(self.test_files_dir, 'zugferd_example_invoice_en.pdf'))
+        output = io.BytesIO()
+        await inv.awrite_pdf(output)
+        self.assertEqual(extract_xml_bytes(output.getvalue()), inv.xml_str)
+
+    async def test_concurrency_limit(self):
+        running = []
+        peak = []
+
+        def work():
+            running.append(1)
+            peak.append(len(running))
+            try:
+                return FacturX(self.test_file).to_dict()
+            finally:
+                running.pop()
+
+        aio.configure(executor=ThreadPoolExecutor(8), max_concurrency=2)
+        results = await asyncio.gather(*(aio.run_blocking(work) for _ in range(8)))
+        self.assertEqual(len(results), 8)
+        self.assertLessEqual(max(peak), 2)
+
+    async def test_configure_twice(self):
+        executor = ThreadPoolExecutor(2)
+        self.addCleanup(executor.shutdown)
+        aio.configure(executor=executor)
+        aio.configure(max_concurrency=3)
+        self.assertIs(aio._config['executor'], executor)
+        await aio.run_blocking(int)
+        semaphore = aio._semaphore()
+        # this loop keeps its limit
+        aio.configure(max_concurrency=1)
+        self.assertIs(aio._semaphore(), semaphore)
+        self.assertIs(aio._config['executor'], executor)
+        aio.configure(executor=None)
+        self.assertIsNone(aio._config['executor'])
+
+
+if __name__ == '__main__':
+    unittest.main()
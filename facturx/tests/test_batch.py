@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from facturx import FacturX
+from facturx.batch import open_output, run_batch
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.test_files_dir = os.path.join(os.path.dirname(__file__), 'sample_invoices')
+        self.sources = [os.path.join(self.test_files_dir, f) for f in sorted(os.listdir(self.test_files_dir))]
+
+    def test_ordered_results(self):
+        for executor in ('serial', 'thread', 'process'):
+            results = list(run_batch(self.sources, ('open', 'to_dict'), jobs=2, executor=executor, max_pending=3))
+            self.assertEqual([r.index for r in results], list(range(len(self.sources))), executor)
+            for result in results:
+                self.assertIsNone(result.error, result.error)
+                self.assertEqual(result.source, self.sources[result.index])
+                self.assertEqual(result.result['to_dict'], FacturX(result.source).to_dict())
+
+    def test_unordered_results(self):
+        results = list(run_batch(self.sources, ('is_valid',), jobs=2, executor='thread', ordered=False))
+        self.assertEqual(sorted(r.index for r in results), list(range(len(self.sources))))
+
+    def test_errors_are_captured(self):
+        sources = [self.sources[0], 'does-not-exist.pdf', self.sources[1]]
+        results = list(run_batch(sources, ('open',), jobs=2, executor='process'))
+        self.assertIsNone(results[0].error)
+        self.assertTrue(results[1].error.startswith('TypeError'))
+        self.assertIsNone(results[1].result)
+        self.assertIsNone(results[2].error)
+
+    def test_write_pdf(self):
+        output_dir = tempfile.mkdtemp()
+        try:
+            source = os.path.join(self.test_files_dir, 'zugferd_example_invoice_en.pdf')
+            with open(source, 'rb') as f:
+                content = f.read()
+            results = list(run_batch([source, content], ('write_pdf',), executor='thread', output_dir=output_dir))
+            self.assertEqual(results[0].result['write_pdf'],
+                             os.path.join(output_dir, '0000-zugferd_example_invoice_en.pdf'))
+            self.assertEqual(results[1].result['write_pdf'], os.path.join(output_dir, '0001-invoice.pdf'))
+            for result in results:
+                self.assertTrue(os.path.isfile(result.result['write_pdf']))
+
+            # existing files are left alone
+            results = list(run_batch([source], ('write_pdf',), executor='serial', output_dir=output_dir))
+            self.assertTrue(results[0].error.startswith('FileExistsError'))
+        finally:
+            shutil.rmtree(output_dir)
+
+    def test_write_pdf_same_names(self):
+        work_dir = tempfile.mkdtemp()
+        try:
+            sources = []
+            for sub_dir in ('a', 'b'):
+                os.mkdir(os.path.join(work_dir, sub_dir))
+                sources.append(os.path.join(work_dir, sub_dir, 'invoice.pdf'))
+                shutil.copy(self.sources[0], sources[-1])
+            results = list(run_batch(sources, ('write_pdf',), executor='serial', output_dir=work_dir))
+            paths = [result.result['write_pdf'] for result in results]
+            self.assertEqual(len(set(paths)), 2)
+            self.assertTrue(all(os.path.isfile(path) for path in paths))
+
+            # writing next to the source never replaces it
+            with self.assertRaises(FileExistsError):
+                open_output(sources[0], sources[0], force=True)
+        finally:
+            shutil.rmtree(work_dir)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            list(run_batch(self.sources, ('unknown',)))
+        with self.assertRaises(ValueError):
+            list(run_batch(self.sources, ('write_pdf',)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import io
+import unittest
+
+from facturx.utils.buffers import BufferReader, buffer_stream, source_buffer
+
+
+class TestBufferReader(unittest.TestCase):
+
+    def test_read_and_seek(self):
+        stream = BufferReader(bytearray(b'%PDF-1.7 content'))
+        self.assertEqual(stream.read(4), b'%PDF')
+        self.assertEqual(stream.tell(), 4)
+        self.assertEqual(stream.seek(-7, io.SEEK_END), 9)
+        self.assertEqual(stream.read(), b'content')
+        self.assertEqual(stream.read(1), b'')
+        stream.seek(1)
+        self.assertEqual(stream.readline(), b'PDF-1.7 content')
+        target = bytearray(3)
+        stream.seek(0)
+        self.assertEqual(stream.readinto(target), 3)
+        self.assertEqual(target, b'%PD')
+        with self.assertRaises(ValueError):
+            stream.seek(-1)
+
+    def test_no_copy(self):
+        buffer = bytearray(b'abc')
+        stream = BufferReader(buffer)
+        self.assertIs(source_buffer(stream).obj, buffer)
+        with self.assertRaises(BufferError):
+            buffer.extend(b'd')
+        stream.close()
+        buffer.extend(b'd')
+        with self.assertRaises(ValueError):
+            stream.read()
+
+    def test_buffer_stream(self):
+        stream, owned = buffer_stream(b'abc')
+        self.assertIsInstance(stream, io.BytesIO)
+        self.assertTrue(owned)
+        self.assertIsNone(source_buffer(stream))
+        stream, owned = buffer_stream(memoryview(b'abc'))
+        self.assertIsInstance(stream, io.BytesIO)
+        stream, owned = buffer_stream(memoryview(b'abcd')[1:])
+        self.assertIsInstance(stream, BufferReader)
+        self.assertEqual(stream.read(), b'bcd')
+
+
+if __name__ == '__main__':
+    unittest.main()
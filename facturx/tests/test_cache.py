@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from facturx import FacturX
+from facturx import cache
+from facturx.cache import InvoiceCache
+from facturx.extract import extract_xml_bytes
+from facturx.utils import metrics
+
+SAMPLES_DIR = os.path.join(os.path.dirname(__file__), 'sample_invoices')
+
+
+class TestInvoiceCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.tmp_dir, 'cache.db')
+        self.pdf_path = os.path.join(self.tmp_dir, 'invoice.pdf')
+        shutil.copy(os.path.join(SAMPLES_DIR, 'Facture_FR_EN16931.pdf'), self.pdf_path)
+        self.sink = metrics.add_sink(metrics.AggregatingSink())
+
+    def tearDown(self):
+        metrics.remove_sink(self.sink)
+        shutil.rmtree(self.tmp_dir)
+
+    def count(self, name):
+        return self.sink.total(name, cache='invoice')
+
+    def test_entry(self):
+        with InvoiceCache(self.cache_path) as invoice_cache:
+            entry = invoice_cache.get(self.pdf_path)
+        with FacturX(self.pdf_path) as inv:
+            self.assertEqual(entry.data, inv.to_dict())
+            self.assertEqual(entry.valid, inv.validate().valid)
+        self.assertEqual(entry.xml, extract_xml_bytes(self.pdf_path))
+        self.assertEqual((entry.flavor, entry.level), ('factur-x', 'en16931'))
+
+        with InvoiceCache(self.cache_path) as invoice_cache:
+            entry = invoice_cache.get(os.path.join(SAMPLES_DIR, 'no_embedded_data.pdf'))
+        self.assertEqual((entry.xml, entry.level, entry.valid, entry.data), (None, None, False, None))
+
+    def test_warm_rescan_only_stats(self):
+        with InvoiceCache(self.cache_path) as invoice_cache:
+            entry = invoice_cache.get(self.pdf_path)
+            self.assertEqual(self.count('cache.miss'), 1)
+        with InvoiceCache(self.cache_path) as invoice_cache, \
+                mock.patch('builtins.open', side_effect=AssertionError('file read')), \
+                mock.patch.object(cache, 'FacturX', side_effect=AssertionError('file parsed')):
+            self.assertEqual(invoice_cache.get(self.pdf_path), entry)
+        self.assertEqual(self.count('cache.hit'), 1)
+
+    def test_content_addressed(self):
+        with InvoiceCache(self.cache_path) as invoice_cache:
+            entry = invoice_cache.get(self.pdf_path)
+            copy_path = os.path.join(self.tmp_dir, 'copy.pdf')
+            shutil.copy(self.pdf_path, copy_path)
+            with open(self.pdf_path, 'rb') as f:
+                pdf_bytes = f.read()
+            self.assertEqual(invoice_cache.get(copy_path), entry)
+            self.assertEqual(invoice_cache.get(memoryview(pdf_bytes)), entry)
+            self.assertEqual(self.count('cache.miss'), 1)
+            self.assertEqual(len(invoice_cache), 1)
+
+            # a changed file is read again
+            shutil.copy(os.path.join(SAMPLES_DIR, 'Facture_FR_BASIC.pdf'), self.pdf_path)
+            self.assertEqual(invoice_cache.get(self.pdf_path).level, 'basic')
+            self.assertEqual(self.count('cache.miss'), 2)
+
+    def test_invalidation(self):
+        with InvoiceCache(self.cache_path) as invoice_cache:
+            invoice_cache.get(self.pdf_path)
+        with InvoiceCache(self.cache_path) as invoice_cache:
+            self.assertEqual(len(invoice_cache), 1)
+        with mock.patch.object(cache, '_library_version', return_value='0.0.1'):
+            with InvoiceCache(self.cache_path) as invoice_cache:
+                self.assertEqual(len(invoice_cache), 0)
+        with mock.patch.object(cache, 'yaml_digests', return_value={'fields.yml': 'changed'}):
+            with InvoiceCache(self.cache_path) as invoice_cache:
+                self.assertEqual(len(invoice_cache), 0)
+                invoice_cache.get(self.pdf_path)
+                invoice_cache.clear()
+                self.assertEqual(len(invoice_cache), 0)
+
+    def test_source_version(self):
+        from importlib.metadata import PackageNotFoundError
+        with mock.patch('importlib.metadata.version', side_effect=PackageNotFoundError):
+            version = cache._library_version()
+            self.assertNotIn(version, ('', 'unknown'))
+            # other package files give another version
+            with mock.patch.object(cache, '__file__', os.path.join(self.tmp_dir, 'cache.py')):
+                cache._source_digest.cache_clear()
+                try:
+                    self.assertNotEqual(cache._library_version(), version)
+                finally:
+                    cache._source_digest.cache_clear()
+            self.assertEqual(cache._library_version(), version)
+
+
+if __name__ == '__main__':
+    unittest.main()
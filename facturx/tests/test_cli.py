@@ -0,0 +1,117 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from facturx import FacturX
+from facturx.cli import _open_cache, iter_paths, main
+from facturx.extract import extract_xml_bytes
+
+SAMPLES_DIR = os.path.join(os.path.dirname(__file__), 'sample_invoices')
+
+
+class TestCLI(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def run_cli(self, *argv, stdin=None):
+        stdout = io.StringIO()
+        status = main(list(argv), stdin=stdin, stdout=stdout)
+        return status, [json.loads(line) for line in stdout.getvalue().splitlines()]
+
+    def test_iter_paths(self):
+        all_pdfs = sorted(os.path.join(SAMPLES_DIR, f) for f in os.listdir(SAMPLES_DIR))
+        self.assertEqual(list(iter_paths([SAMPLES_DIR])), all_pdfs)
+        self.assertEqual(list(iter_paths([os.path.join(SAMPLES_DIR, '*_MINIMUM.pdf')])),
+                         [p for p in all_pdfs if p.endswith('_MINIMUM.pdf')])
+        self.assertEqual(list(iter_paths(['-', 'other.pdf'], stdin=io.StringIO('a.pdf\n\nb.pdf\n'))),
+                         ['a.pdf', 'b.pdf', 'other.pdf'])
+
+    def test_extract(self):
+        source = os.path.join(SAMPLES_DIR, 'Facture_FR_BASIC.pdf')
+        status, records = self.run_cli('extract', source)
+        self.assertEqual(status, 0)
+        self.assertEqual(records[0]['source'], source)
+        self.assertEqual(records[0]['status'], 'ok')
+        self.assertEqual(records[0]['xml'].encode('utf-8'), extract_xml_bytes(source))
+
+        status, records = self.run_cli('extract', source, '-o', self.tmp_dir)
+        with open(records[0]['output'], 'rb') as f:
+            self.assertEqual(f.read(), extract_xml_bytes(source))
+
+    def test_validate_and_errors(self):
+        sources = [os.path.join(SAMPLES_DIR, 'Facture_FR_BASIC.pdf'), 'does-not-exist.pdf']
+        status, records = self.run_cli('validate', *sources)
+        self.assertEqual(status, 1)
+        self.assertEqual([r['source'] for r in records], sources)
+        self.assertIn(records[0]['status'], ('ok', 'invalid'))
+        self.assertEqual(records[0]['level'], 'basic')
+        self.assertEqual(records[1]['status'], 'error')
+        self.assertIn('error', records[1])
+        self.assertIn('elapsed_ms', records[1])
+
+    def test_to_json_parallel(self):
+        sources = [os.path.join(SAMPLES_DIR, f) for f in sorted(os.listdir(SAMPLES_DIR))]
+        status, records = self.run_cli('to-json', SAMPLES_DIR, '--jobs', '2', '--executor', 'thread')
+        self.assertEqual(status, 0)
+        self.assertEqual([r['source'] for r in records], sources)
+        self.assertEqual(records[0]['data']['invoice_number'], FacturX(sources[0])['invoice_number'])
+
+    def test_to_json_cache(self):
+        cache_path = os.path.join(self.tmp_dir, 'cache.db')
+        self.addCleanup(_open_cache.cache_clear)
+        status, records = self.run_cli('to-json', SAMPLES_DIR, '--cache', cache_path)
+        self.assertEqual(status, 0)
+        status, cached_records = self.run_cli('to-json', SAMPLES_DIR, '--cache', cache_path)
+        self.assertEqual([r['data'] for r in cached_records], [r['data'] for r in records])
+        self.assertEqual(len(_open_cache(cache_path)), len(records) - 1)  # no_embedded_data.pdf
+
+    def test_embed(self):
+        pdf_path = os.path.join(self.tmp_dir, 'invoice.pdf')
+        shutil.copy(os.path.join(SAMPLES_DIR, 'no_embedded_data.pdf'), pdf_path)
+        xml_bytes = extract_xml_bytes(os.path.join(SAMPLES_DIR, 'Facture_FR_MINIMUM.pdf'))
+        with open(os.path.join(self.tmp_dir, 'invoice.xml'), 'wb') as f:
+            f.write(xml_bytes)
+
+        output_dir = os.path.join(self.tmp_dir, 'out')
+        status, records = self.run_cli('embed', pdf_path, '-o', output_dir, '--incremental')
+        self.assertEqual(status, 0, records)
+        self.assertEqual(records[0]['output'], os.path.join(output_dir, '0000-invoice.pdf'))
+        self.assertIn(b'FA-2017-0010', extract_xml_bytes(records[0]['output']))
+
+        # existing outputs are only replaced with --force
+        status, records = self.run_cli('embed', pdf_path, '-o', output_dir)
+        self.assertEqual(status, 1)
+        self.assertTrue(records[0]['error'].startswith('FileExistsError'))
+        status, records = self.run_cli('embed', pdf_path, '-o', output_dir, '--force')
+        self.assertEqual(status, 0, records)
+
+    def test_embed_same_names(self):
+        pdf_paths = []
+        for sub_dir in ('a', 'b'):
+            os.mkdir(os.path.join(self.tmp_dir, sub_dir))
+            pdf_paths.append(os.path.join(self.tmp_dir, sub_dir, 'invoice.pdf'))
+            shutil.copy(os.path.join(SAMPLES_DIR, 'no_embedded_data.pdf'), pdf_paths[-1])
+        xml_path = os.path.join(self.tmp_dir, 'invoice.xml')
+        with open(xml_path, 'wb') as f:
+            f.write(extract_xml_bytes(os.path.join(SAMPLES_DIR, 'Facture_FR_MINIMUM.pdf')))
+
+        status, records = self.run_cli('embed', *pdf_paths, '--xml', xml_path, '-o', self.tmp_dir)
+        self.assertEqual(status, 0, records)
+        self.assertEqual(len({record['output'] for record in records}), 2)
+
+        # the output directory is the one of the input: the input is kept
+        source = os.path.join(self.tmp_dir, '0000-invoice.pdf')
+        status, records = self.run_cli('embed', source, '--xml', xml_path, '-o', self.tmp_dir, '--force')
+        self.assertEqual(status, 0, records)
+        self.assertEqual(records[0]['output'], os.path.join(self.tmp_dir, '0000-0000-invoice.pdf'))
+
+
+if __name__ == '__main__':
+    unittest.main()
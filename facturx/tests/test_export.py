@@ -0,0 +1,71 @@
+import csv
+import datetime
+import io
+import json
+import os
+import unittest
+from decimal import Decimal
+
+from facturx import FacturX
+from facturx.export import convert_value, export, export_columns
+from facturx.flavors.xml_flavor import FIELDS
+
+SAMPLES_DIR = os.path.join(os.path.dirname(__file__), 'sample_invoices')
+
+
+class TestExport(unittest.TestCase):
+
+    def setUp(self):
+        self.source = os.path.join(SAMPLES_DIR, 'Facture_FR_EN16931.pdf')
+
+    def test_convert_value(self):
+        self.assertEqual(convert_value('date', '20171113'), datetime.date(2017, 11, 13))
+        self.assertEqual(convert_value('date', '201711'), '201711')
+        self.assertEqual(convert_value('amount_total', ' 671.15 '), Decimal('671.15'))
+        self.assertEqual(convert_value('amount_total', 'n/a'), 'n/a')
+        self.assertEqual(convert_value('invoice_number', '00012'), '00012')
+        self.assertIsNone(convert_value('date', None))
+
+    def test_columns(self):
+        columns = export_columns()
+        self.assertEqual(columns[0], 'version')
+        self.assertEqual(set(columns), {name for name, details in FIELDS.items() if 'factur-x' in details['_path']})
+
+    def test_ndjson(self):
+        output = io.StringIO()
+        invoice = FacturX(self.source)
+        xml_bytes = invoice.xml_bytes()
+        sources = [self.source, 'does-not-exist.pdf', invoice]
+        self.assertEqual(export(iter(sources), output, validate=True), 3)
+        rows = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(rows[0]['source'], self.source)
+        self.assertEqual(rows[0]['date'], '2017-11-13')
+        # exact decimals, always as strings
+        self.assertEqual(rows[0]['amount_total'], '671.15')
+        self.assertEqual(rows[0]['tva_rate'], '20.00')
+        self.assertIs(rows[0]['valid'], invoice.validate().valid)
+        # validating does not fill in the missing fields of the caller's invoice
+        self.assertEqual(invoice.xml_bytes(), xml_bytes)
+        self.assertIsNone(rows[0]['error'])
+        self.assertTrue(rows[1]['error'].startswith('TypeError'))
+        self.assertIsNone(rows[2]['source'])
+        self.assertEqual(rows[2]['invoice_number'], 'FA-2017-0010')
+
+    def test_csv(self):
+        output = io.StringIO()
+        export([self.source, self.source], output, format='csv', columns=['invoice_number', 'date', 'amount_total'],
+               jobs=2, executor='thread')
+        rows = list(csv.reader(io.StringIO(output.getvalue())))
+        self.assertEqual(rows[0], ['source', 'invoice_number', 'date', 'amount_total', 'error'])
+        self.assertEqual(rows[1], [self.source, 'FA-2017-0010', '2017-11-13', '671.15', ''])
+        self.assertEqual(len(rows), 3)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            export([], io.StringIO(), format='xml')
+        with self.assertRaises(ValueError):
+            export([], io.StringIO(), columns=['unknown'])
+
+
+if __name__ == '__main__':
+    unittest.main()
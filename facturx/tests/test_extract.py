@@ -0,0 +1,86 @@
+import io
+import os
+import unittest
+
+from lxml import etree
+from pypdf import PdfWriter
+from pypdf.generic import (ArrayObject, DecodedStreamObject, DictionaryObject, NameObject,
+                           create_string_object)
+
+from facturx import FacturX, extract_xml, extract_xml_bytes
+from facturx.extract import get_xml_parser
+
+
+def pdf_with_kids_name_tree(xml_bytes):
+    """Build a PDF whose /EmbeddedFiles name tree stores entries in /Kids nodes."""
+    writer = PdfWriter()
+    writer.add_blank_page(100, 100)
+
+    def filespec(name, data):
+        file_entry = DecodedStreamObject()
+        file_entry.set_data(data)
+        file_entry.update({NameObject('/Type'): NameObject('/EmbeddedFile')})
+        fname = create_string_object(name)
+        return writer._add_object(DictionaryObject({
+            NameObject('/Type'): NameObject('/Filespec'),
+            NameObject('/F'): fname,
+            NameObject('/UF'): fname,
+            NameObject('/EF'): DictionaryObject({NameObject('/F'): writer._add_object(file_entry)}),
+        }))
+
+    kids = []
+    for name, data in (('a.txt', b'first'), ('factur-x.xml', xml_bytes)):
+        kids.append(writer._add_object(DictionaryObject({
+            NameObject('/Names'): ArrayObject([create_string_object(name), filespec(name, data)]),
+            NameObject('/Limits'): ArrayObject([create_string_object(name), create_string_object(name)]),
+        })))
+    writer._root_object[NameObject('/Names')] = DictionaryObject({
+        NameObject('/EmbeddedFiles'): DictionaryObject({NameObject('/Kids'): ArrayObject(kids)}),
+    })
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+class TestExtract(unittest.TestCase):
+
+    def setUp(self):
+        self.test_files_dir = os.path.join(os.path.dirname(__file__), 'sample_invoices')
+
+    def test_extract_matches_facturx(self):
+        for file_name in sorted(os.listdir(self.test_files_dir)):
+            file_path = os.path.join(self.test_files_dir, file_name)
+            xml = extract_xml(file_path)
+            if xml is None:
+                continue
+            self.assertEqual(etree.tostring(xml), etree.tostring(FacturX(file_path).xml), file_name)
+
+    def test_no_embedded_data(self):
+        file_path = os.path.join(self.test_files_dir, 'no_embedded_data.pdf')
+        self.assertIsNone(extract_xml_bytes(file_path))
+        self.assertIsNone(extract_xml(file_path))
+
+    def test_sources(self):
+        file_path = os.path.join(self.test_files_dir, 'embedded_data.pdf')
+        expected = extract_xml_bytes(file_path)
+        with open(file_path, 'rb') as f:
+            content = f.read()
+            f.seek(0)
+            self.assertEqual(extract_xml_bytes(f), expected)
+        self.assertEqual(extract_xml_bytes(content), expected)
+
+    def test_kids_name_tree(self):
+        xml_bytes = extract_xml_bytes(os.path.join(self.test_files_dir, 'embedded_data.pdf'))
+        pdf_bytes = pdf_with_kids_name_tree(xml_bytes)
+        self.assertEqual(extract_xml_bytes(pdf_bytes), xml_bytes)
+        self.assertIsNotNone(FacturX(io.BytesIO(pdf_bytes)).xml)
+
+    def test_parser_does_not_resolve_entities(self):
+        xml = etree.fromstring(
+            b'<!DOCTYPE r [<!ENTITY e SYSTEM "file:///etc/passwd">]><r>&e;</r>', get_xml_parser())
+        self.assertIsNone(xml.text)
+        self.assertIs(get_xml_parser(), get_xml_parser())
+
+
+if __name__ == '__main__':
+    unittest.main()
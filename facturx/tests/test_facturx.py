@@ -1,8 +1,21 @@
+import copy
+import hashlib
+import mmap
 import os
+import shutil
+import tempfile
 import unittest
+from concurrent import futures
 from datetime import datetime
+from io import BytesIO
+from unittest import mock
 from facturx.facturx import *
+from facturx.flavors import xml_flavor
+from facturx.flavors.xml_flavor import XMLFlavor, FIELDS, FLAVORS
 from lxml import etree
+from pypdf import PdfReader
+from facturx.extract import extract_xml_bytes, iter_embedded_files, xml_bytes_from_reader
+from facturx.utils import writer_utils
 
 
 class TestReading(unittest.TestCase):
@@ -24,6 +37,12 @@ class TestReading(unittest.TestCase):
                 file_path = os.path.join(self.test_files_dir, file)
                 return file_path
 
+    # returning a path in a temporary directory, removed after the test
+    def output_path(self, file_name):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        return os.path.join(tmp_dir, file_name)
+
     # def test_input_error(self):
     #     with self.assertRaises(TypeError) as context:
     #         FacturX('non-existant.pdf')
@@ -39,7 +58,7 @@ class TestReading(unittest.TestCase):
     def test_write_pdf(self):
         file_path = self.find_file('no_embedded_data.pdf')
         factx = FacturX(file_path)
-        test_file_path = os.path.join(self.test_files_dir, 'test.pdf')
+        test_file_path = self.output_path('test.pdf')
 
         # checking if pdf file is made
         factx.write_pdf(test_file_path)
@@ -49,12 +68,152 @@ class TestReading(unittest.TestCase):
         test_factx = FacturX(test_file_path)
         self.assertIsNotNone(test_factx.xml, "XML should be embedded in the PDF")
 
-        os.remove(test_file_path)
+    def test_mmap_loading(self):
+        file_path = self.find_file('embedded_data.pdf')
+        with FacturX(file_path, use_mmap=True) as factx:
+            # pages are only loaded when writing
+            self.assertIsNone(factx.pdf_reader.flattened_pages)
+            self.assertIsNotNone(factx['currency'])
+        self.assertIsNone(factx.pdf)
+        with self.assertRaises(ValueError):
+            factx.pdf_reader
+
+    def test_mmap_closed_on_error(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        file_path = os.path.join(tmp_dir, 'broken.pdf')
+        with open(file_path, 'wb') as f:
+            f.write(b'not a PDF')
+        mappings, files = [], []
+        real_mmap, real_open = mmap.mmap, open
+
+        def mapping(*args, **kwargs):
+            mappings.append(real_mmap(*args, **kwargs))
+            return mappings[-1]
+
+        def opening(*args, **kwargs):
+            files.append(real_open(*args, **kwargs))
+            return files[-1]
+
+        with mock.patch('mmap.mmap', side_effect=mapping), mock.patch('builtins.open', side_effect=opening):
+            with self.assertRaises(Exception):
+                FacturX(file_path, use_mmap=True)
+        self.assertEqual((len(mappings), len(files)), (1, 1))
+        self.assertTrue(mappings[0].closed)
+        self.assertTrue(files[0].closed)
+
+    def test_from_buffers(self):
+        file_path = self.find_file('embedded_data.pdf')
+        with open(file_path, 'rb') as f:
+            pdf_bytes = f.read()
+        expected = FacturX(file_path).to_dict()
+        buffer = bytearray(pdf_bytes)
+        for source in (pdf_bytes, buffer, memoryview(pdf_bytes)):
+            with FacturX(source) as factx:
+                self.assertEqual(factx.to_dict(), expected)
+                # read in place: the incremental update starts with the very same bytes
+                self.assertTrue(factx.to_pdf_bytes(incremental=True).startswith(pdf_bytes))
+        # the bytearray is released on close
+        buffer.extend(b'\n')
+        with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with FacturX(mapped) as factx:
+                self.assertEqual(factx.to_dict(), expected)
+            self.assertFalse(mapped.closed)
+        self.assertEqual(extract_xml_bytes(memoryview(pdf_bytes)), extract_xml_bytes(file_path))
+        with self.assertRaises(TypeError):
+            FacturX(memoryview(pdf_bytes)[::2])
+
+    def test_write_pdf_to_stream(self):
+        factx = FacturX(self.find_file('embedded_data.pdf'))
+        for incremental in (False, True):
+            pdf_bytes = factx.to_pdf_bytes(incremental=incremental)
+            output = BytesIO()
+            self.assertTrue(factx.write_pdf(output, incremental=incremental))
+            self.assertFalse(output.closed)
+            self.assertEqual(output.getvalue(), pdf_bytes)
+            self.assertEqual(factx.last_write_stats['bytes_out'], len(pdf_bytes))
+            # streams which cannot seek, or not at their start, get the PDF in one write
+            chunks = []
+            unseekable = mock.Mock(write=chunks.append, seekable=lambda: False)
+            factx.write_pdf(unseekable, incremental=incremental)
+            self.assertEqual(chunks, [pdf_bytes])
+            output = BytesIO(b'prefix')
+            output.seek(0, os.SEEK_END)
+            factx.write_pdf(output, incremental=incremental)
+            self.assertEqual(output.getvalue(), b'prefix' + pdf_bytes)
+
+    def test_write_pdf_twice_with_output_intents(self):
+        factx = FacturX(self.find_file('zugferd_example_invoice_en.pdf'), use_mmap=True)
+        test_file_path = self.output_path('test.pdf')
+        try:
+            for _ in range(2):
+                factx.write_pdf(test_file_path)
+                with open(test_file_path, 'rb') as f:
+                    pdf = PdfReader(f)
+                    self.assertIn('/OutputIntents', pdf.trailer['/Root'])
+                    self.assertIsNotNone(factx._xml_from_reader(pdf))
+        finally:
+            factx.close()
+
+    def test_write_pdf_incremental(self):
+        # classic cross-reference table, with OutputIntents and another attachment
+        self._check_write_pdf_incremental('zugferd_example_invoice_en.pdf', 2)
+        # cross-reference stream, without OutputIntents
+        self._check_write_pdf_incremental('embedded_data.pdf', 1)
+
+    def _check_write_pdf_incremental(self, file_name, attachments):
+        file_path = self.find_file(file_name)
+        factx = FacturX(file_path)
+        factx['invoice_number'] = 'INV-2025-001'
+        test_file_path = self.output_path('test.pdf')
+        factx.write_pdf(test_file_path, incremental=True)
+        with open(file_path, 'rb') as original, open(test_file_path, 'rb') as written:
+            original_bytes = original.read()
+            written_bytes = written.read()
+        # the original revision is left untouched
+        self.assertTrue(written_bytes.startswith(original_bytes))
+
+        pdf = PdfReader(test_file_path, strict=True)
+        self.assertEqual(len(pdf.pages), len(factx.pdf_reader.pages))
+        self.assertTrue(pdf.metadata.title.endswith('Invoice INV-2025-001'))
+        self.assertEqual(xml_bytes_from_reader(pdf), factx.xml_str)
+        # other attachments are kept, the Factur-X one is replaced
+        names = [str(name) for name, _ in iter_embedded_files(pdf.trailer['/Root'])]
+        self.assertEqual(names.count('factur-x.xml'), 1)
+        self.assertEqual(len(names), attachments)
+        self.assertIn('/OutputIntents', pdf.trailer['/Root'])
+        # the permanent identifier is kept, the changing one is new
+        original_id = factx.pdf_reader.trailer.get('/ID')
+        if original_id:
+            self.assertEqual(pdf.trailer['/ID'][0].original_bytes, original_id[0].original_bytes)
+            self.assertNotEqual(pdf.trailer['/ID'][1].original_bytes, original_id[1].original_bytes)
+
+    def test_write_pdf_optimized(self):
+        factx = FacturX(self.find_file('zugferd_example_invoice_en.pdf'))
+        default_bytes = factx.to_pdf_bytes()
+        for options in ({'optimize': True}, {'optimize': True, 'deduplicate': True}):
+            pdf_bytes = factx.to_pdf_bytes(**options)
+            self.assertLess(len(pdf_bytes), len(default_bytes))
+            self.assertEqual(factx.last_write_stats['bytes_out'], len(pdf_bytes))
+            self.assertIn(b'/ObjStm', pdf_bytes)
+            # the XMP metadata stays readable by PDF/A validators
+            self.assertIn(b'<x:xmpmeta', pdf_bytes)
+            pdf = PdfReader(BytesIO(pdf_bytes), strict=True)
+            self.assertEqual(len(pdf.pages), len(factx.pdf_reader.pages))
+            self.assertEqual(xml_bytes_from_reader(pdf), factx.xml_str)
+
+    def test_write_pdf_incremental_optimized(self):
+        factx = FacturX(self.find_file('embedded_data.pdf'))
+        pdf_bytes = factx.to_pdf_bytes(incremental=True, optimize=True)
+        self.assertLess(len(pdf_bytes), len(factx.to_pdf_bytes(incremental=True)))
+        self.assertEqual(xml_bytes_from_reader(PdfReader(BytesIO(pdf_bytes), strict=True)), factx.xml_str)
+        with self.assertRaises(ValueError):
+            factx.to_pdf_bytes(incremental=True, deduplicate=True)
 
     def test_write_xml(self):
         compare_file_dir = os.path.join(os.path.dirname(__file__), 'compare')
         expected_file_path = os.path.join(compare_file_dir, 'no_embedded_data.xml')
-        test_file_path = os.path.join(compare_file_dir, 'test.xml')
+        test_file_path = self.output_path('test.xml')
 
         factx = FacturX(self.find_file('no_embedded_data.pdf'))
         factx.write_xml(test_file_path)
@@ -71,7 +230,6 @@ class TestReading(unittest.TestCase):
         expected_file_str = expected_file_str.decode('utf-8')
         test_file_str = test_file_str.decode('utf-8')
         self.assertTrue(expected_file_str == test_file_str, "Files don't match")
-        os.remove(test_file_path)
 
 
 class TestFieldAccess(unittest.TestCase):
@@ -117,6 +275,62 @@ class TestFieldAccess(unittest.TestCase):
         retrieved_date = factx['date']
         self.assertEqual(retrieved_date, test_date)
 
+    def test_compiled_xpath_is_shared(self):
+        """Test field paths are compiled once per flavor"""
+        factx = FacturX(self.test_file)
+        other = FacturX(os.path.join(self.test_files_dir, 'no_embedded_data.pdf'))
+        self.assertIs(factx.flavor.get_compiled_xpath('seller_name'),
+                      other.flavor.get_compiled_xpath('seller_name'))
+
+    def test_node_index_invalidation(self):
+        """Test direct tree edits are picked up after invalidate_cache()"""
+        factx = FacturX(self.test_file)
+        self.assertEqual(factx['currency'], factx['currency'])
+
+        currency_el = factx._resolve('currency')[0]
+        currency_el.getparent().remove(currency_el)
+        factx.invalidate_cache()
+        self.assertFalse(factx['currency'])
+
+    def test_add_line_items(self):
+        """Test adding many line items in one pass"""
+        factx = FacturX(os.path.join(self.test_files_dir, 'no_embedded_data.pdf'), level='en16931')
+        rows = [{'line_id': str(i), 'line_total_amount': '%d.00' % i, 'tva_rate2': '20'} for i in range(1, 501)]
+        self.assertEqual(factx.add_line_items(rows, replace=True), 500)
+
+        self.assertEqual([el.text for el in factx._resolve('line_id')], [str(i) for i in range(1, 501)])
+        self.assertEqual(factx._resolve('line_total_amount')[-1].text, '500.00')
+        # fields not in the rows keep the template values
+        self.assertEqual(len(factx.xml.xpath('//ram:BilledQuantity[@unitCode="C62"]', namespaces=factx.xml.nsmap)), 500)
+        self.assertTrue(factx.flavor.check_xsd(factx.xml))
+
+        # appended after the existing lines
+        factx.add_line_items([{'line_id': '501'}])
+        self.assertEqual(factx._resolve('line_id')[-1].text, '501')
+        # a new line is started instead of overwriting the last one
+        factx['line_id'] = '502'
+        self.assertEqual([el.text for el in factx._resolve('line_id')[-2:]], ['501', '502'])
+
+    def test_add_tax_breakdowns(self):
+        """Test adding header VAT breakdowns"""
+        factx = FacturX(os.path.join(self.test_files_dir, 'no_embedded_data.pdf'), level='en16931')
+        factx.add_tax_breakdowns([
+            {'tva_basis_amount': '100.00', 'tva_rate': '20', 'tva_calculated': '20.00'},
+            {'tva_basis_amount': '50.00', 'tva_rate': '5.5', 'tva_calculated': '2.75'},
+        ], replace=True)
+        self.assertEqual([el.text for el in factx._resolve('tva_rate')], ['20', '5.5'])
+
+    def test_add_line_items_errors(self):
+        factx = FacturX(os.path.join(self.test_files_dir, 'no_embedded_data.pdf'), level='en16931')
+        with self.assertRaises(ValueError):
+            factx.add_line_items([{'seller_name': 'ACME'}])
+        with self.assertRaises(ValueError):
+            # not in the template line
+            factx.add_line_items([{'item_value': 'x'}])
+        minimum = FacturX(os.path.join(self.test_files_dir, 'no_embedded_data.pdf'))
+        with self.assertRaises(ValueError):
+            minimum.add_line_items([{'line_id': '1'}])
+
 
 class TestValidation(unittest.TestCase):
     """Test XML validation functionality"""
@@ -149,6 +363,102 @@ class TestValidation(unittest.TestCase):
         # Even if not valid, this should not raise an exception
         self.assertIsInstance(is_valid, bool)
 
+    def test_valid_code(self):
+        self.assertTrue(XMLFlavor.valid_code('country', 'FR'))
+        self.assertTrue(XMLFlavor.valid_code('country', 'XI'))
+        self.assertTrue(XMLFlavor.valid_code('currency', 'EUR'))
+        # only the exact code forms are allowed
+        for code_type, value in [('country', 'fr'), ('country', 'FRA'), ('country', 'France'),
+                                 ('currency', 'eur'), ('currency', '978'), ('currency', None)]:
+            self.assertFalse(XMLFlavor.valid_code(code_type, value), value)
+
+    def test_valid_codes(self):
+        self.assertEqual(XMLFlavor.valid_codes('country', ['FR', 'DE', None, 'ZZ', '', 'FR', 'ZZ']),
+                         [True, True, True, False, True, True, False])
+        self.assertEqual(XMLFlavor.valid_codes('currency', iter(['EUR', 'USD'])), [True, True])
+
+    def test_invalid_code_field(self):
+        factx = FacturX(os.path.join(self.test_files_dir, 'embedded_data.pdf'))
+        # the sample lacks required fields, only check the codes
+        optional_fields = {name: dict(field, _required=False) for name, field in FIELDS.items()}
+        with mock.patch.object(xml_flavor, 'FIELDS', optional_fields):
+            self.assertTrue(factx.is_valid())
+            factx['currency'] = 'EURO'
+            self.assertFalse(factx.is_valid())
+
+    def invalid_pdf(self):
+        factx = FacturX(os.path.join(self.test_files_dir, 'Facture_FR_MINIMUM.pdf'))
+        etree.SubElement(factx.xml, 'unexpected').text = 'x'
+        factx.invalidate_cache()
+        return factx.to_pdf_bytes()
+
+    def test_validation_policies(self):
+        pdf_bytes = self.invalid_pdf()
+        with self.assertRaises(Exception):
+            FacturX(BytesIO(pdf_bytes))
+        with self.assertRaises(ValueError):
+            FacturX(BytesIO(pdf_bytes), validation='sometimes')
+
+        factx = FacturX(BytesIO(pdf_bytes), validation='off')
+        self.assertEqual(factx['invoice_number'], 'FA-2017-0010')
+        factx.to_pdf_bytes()
+        self.assertFalse(factx.is_valid())
+
+        factx = FacturX(BytesIO(pdf_bytes), validation='lazy')
+        self.assertEqual(factx.to_dict()['invoice_number'], 'FA-2017-0010')
+        with self.assertRaises(Exception):
+            factx.to_pdf_bytes()
+
+        # a failed explicit check still leaves the write-time check owed
+        factx = FacturX(BytesIO(pdf_bytes), validation='lazy')
+        self.assertFalse(factx.is_valid())
+        self.assertFalse(factx.validate().valid)
+        with self.assertRaises(Exception):
+            factx.to_pdf_bytes()
+
+    def test_xsd_checked_once(self):
+        factx = FacturX(os.path.join(self.test_files_dir, 'Facture_FR_EN16931.pdf'), validation='lazy')
+        with mock.patch.object(XMLFlavor, 'check_xsd') as check_xsd:
+            factx.is_valid()
+            factx.is_valid()
+            # the lazy check owed at write time was settled by is_valid()
+            factx.to_pdf_bytes()
+        self.assertEqual(check_xsd.call_count, 2)
+
+    def test_xsd_checked_after_direct_edit(self):
+        factx = FacturX(os.path.join(self.test_files_dir, 'Facture_FR_EN16931.pdf'))
+        # the sample lacks required fields, only the XSD result is tested
+        with mock.patch.object(FacturX, '_check_fields', return_value=True):
+            self.assertTrue(factx.is_valid())
+            # changed behind the API's back, without mark_modified()
+            etree.SubElement(factx.xml, 'unexpected').text = 'x'
+            self.assertFalse(factx.is_valid())
+        self.assertTrue(factx.validate().xsd_errors)
+
+    def test_validate_report(self):
+        factx = FacturX(BytesIO(self.invalid_pdf()), validation='off')
+        factx['currency'] = 'EURO'
+        factx['seller_country'] = 'ZZ'
+        xml_before = etree.tostring(factx.xml)
+        report = factx.validate()
+        self.assertFalse(report.valid)
+        self.assertTrue(any('unexpected' in error['message'] for error in report.xsd_errors))
+        self.assertTrue(all(error['line'] for error in report.xsd_errors))
+        self.assertEqual([(c['field'], c['value']) for c in report.invalid_codes],
+                         [('currency', 'EURO'), ('seller_country', 'ZZ')])
+        self.assertIn('buyer_email', report.missing_fields)
+        self.assertEqual(etree.tostring(factx.xml), xml_before)
+
+        # the same checks as is_valid(), without setting the defaults
+        factx = FacturX(os.path.join(self.test_files_dir, 'no_embedded_data.pdf'))
+        optional_fields = {name: dict(field, _required=name == 'type') for name, field in FIELDS.items()}
+        factx.xml.xpath(FIELDS['type']['_path']['factur-x'], namespaces=factx.xml.nsmap)[0].text = None
+        with mock.patch.object(xml_flavor, 'FIELDS', optional_fields):
+            report = factx.validate()
+            self.assertEqual(report.defaulted_fields, ['type'])
+            self.assertIsNone(factx['type'])
+            self.assertEqual(report.valid, factx.is_valid())
+
 
 class TestExport(unittest.TestCase):
     """Test export functionality (JSON, YAML)"""
@@ -167,6 +477,56 @@ class TestExport(unittest.TestCase):
         self.assertIn('currency', result_dict)
         self.assertIn('type', result_dict)
 
+    def test_to_dict_matches_xpath(self):
+        """Test the single-pass extraction returns what per-field XPath queries return"""
+        for file_name in sorted(os.listdir(self.test_files_dir)):
+            factx = FacturX(os.path.join(self.test_files_dir, file_name))
+            expected = {}
+            for field, details in xml_flavor.FIELDS.items():
+                r = factx.xml.xpath(details['_path']['factur-x'], namespaces=factx._namespaces)
+                expected[field] = r[0].text if r else None
+            self.assertEqual(factx.to_dict(), expected, file_name)
+            self.assertEqual(list(factx.to_dict()), list(expected), file_name)
+
+    def test_serialization_cache(self):
+        """Test XML bytes are serialized once until the invoice changes"""
+        factx = FacturX(os.path.join(self.test_files_dir, 'embedded_data.pdf'))
+        with mock.patch('facturx.facturx.etree.tostring', wraps=etree.tostring) as tostring:
+            xml_bytes = factx.xml_str
+            self.assertIs(factx.xml_bytes(), xml_bytes)
+            self.assertEqual(factx.xml_md5(), hashlib.md5(xml_bytes).hexdigest())
+            self.assertEqual(factx.xml_size(), len(xml_bytes))
+            self.assertEqual(tostring.call_count, 1)
+
+            factx['invoice_number'] = 'INV-2025-042'
+            self.assertIn(b'INV-2025-042', factx.xml_str)
+            self.assertEqual(tostring.call_count, 2)
+
+            # direct tree edits are picked up once reported
+            factx._resolve('invoice_number')[0].text = 'INV-2025-043'
+            factx.mark_modified()
+            self.assertIn(b'INV-2025-043', factx.xml_str)
+
+    def test_compact_output(self):
+        factx = FacturX(os.path.join(self.test_files_dir, 'embedded_data.pdf'))
+        compact = factx.xml_bytes(pretty_print=False)
+        self.assertLess(len(compact), len(factx.xml_str))
+        self.assertEqual(etree.tostring(etree.fromstring(compact)),
+                         etree.tostring(etree.fromstring(factx.xml_str, etree.XMLParser(remove_blank_text=True))))
+        pdf_bytes = factx.to_pdf_bytes(pretty_print=False)
+        self.assertEqual(xml_bytes_from_reader(PdfReader(BytesIO(pdf_bytes))), compact)
+        self.assertIn(factx.xml_md5(pretty_print=False).encode(), pdf_bytes)
+
+    def test_remove_empty_elements(self):
+        factx = FacturX(os.path.join(self.test_files_dir, 'embedded_data.pdf'))
+        # deeper than the recursion limit, emptied from the innermost element
+        parent = factx.xml
+        for _ in range(5000):
+            parent = etree.SubElement(parent, 'nested')
+        etree.SubElement(parent, 'empty').text = '  '
+        factx.invalidate_cache()
+        self.assertNotIn(b'nested', factx.xml_str)
+
     def test_write_json(self):
         """Test exporting to JSON file"""
         test_file = os.path.join(self.test_files_dir, 'embedded_data.pdf')
@@ -228,6 +588,147 @@ class TestDifferentLevels(unittest.TestCase):
             self.assertEqual(factx.flavor.level, 'en16931')
 
 
+class TestOutputIntent(unittest.TestCase):
+    """Test the bundled sRGB OutputIntent"""
+
+    def test_icc_profile_is_read_once(self):
+        writer_utils._ICC_STREAM_CACHE.clear()
+        file_path = os.path.join(os.path.dirname(__file__), 'sample_invoices', 'no_embedded_data.pdf')
+        factx = FacturX(file_path)
+        with mock.patch.object(writer_utils, 'read_icc_profile', wraps=writer_utils.read_icc_profile) as read:
+            for _ in range(3):
+                factx.to_pdf_bytes()
+            self.assertEqual(read.call_count, 1)
+
+    def test_icc_stream(self):
+        icc_stream = writer_utils.create_icc_stream()
+        self.assertEqual(icc_stream['/Filter'], '/FlateDecode')
+        self.assertEqual(icc_stream.get_data(), writer_utils.read_icc_profile(writer_utils.SRGB_ICC_PATH))
+        # compressed payload is shared, not copied
+        self.assertIs(icc_stream._data, writer_utils.create_icc_stream()._data)
+
+
+class TestXMPTemplate(unittest.TestCase):
+    """Test the cached XMP metadata template"""
+
+    def test_same_output_as_builder(self):
+        timestamp = '2025-01-31T12:00:00+00:00'
+        metadata_values = [
+            {'title': 'ACME: Invoice INV-1', 'author': 'ACME', 'subject': 'Factur-X Invoice INV-1'},
+            {'title': 'A & B <Ltd> "quoted" \'single\'', 'author': 'Café\r\nSøren\t€ 😀', 'subject': ']]>'},
+            {'title': '', 'author': '@@facturx-title@@'},
+        ]
+        for level in FLAVORS['factur-x']['levels']:
+            flavor, _ = XMLFlavor.from_template('factur-x', level)
+            details = flavor.details
+            for pdf_metadata in metadata_values:
+                expected = writer_utils.prepare_pdf_metadata_xml(
+                    details['levels'][flavor.level]['xmp_str'], details['xmp_filename'], flavor.get_xmp_xml(),
+                    pdf_metadata, timestamp)
+                self.assertEqual(writer_utils.render_pdf_metadata_xml(flavor, pdf_metadata, timestamp), expected)
+
+    def test_template_is_built_once(self):
+        flavor, _ = XMLFlavor.from_template('factur-x', 'basic')
+        writer_utils._XMP_TEMPLATE_CACHE.clear()
+        with mock.patch.object(flavor, 'get_xmp_xml', wraps=flavor.get_xmp_xml) as get_xmp_xml:
+            for _ in range(3):
+                writer_utils.render_pdf_metadata_xml(flavor, {'title': 'x'})
+            self.assertEqual(get_xmp_xml.call_count, 1)
+
+    def test_illegal_characters(self):
+        flavor, _ = XMLFlavor.from_template('factur-x', 'basic')
+        with self.assertRaises(ValueError):
+            writer_utils.render_pdf_metadata_xml(flavor, {'title': 'bell\x07'})
+
+
+class TestSchemaCache(unittest.TestCase):
+    """Test the process-wide compiled XSD cache"""
+
+    def tearDown(self):
+        XMLFlavor.clear_schema_cache()
+
+    def test_schema_is_compiled_once(self):
+        XMLFlavor.clear_schema_cache()
+        schema = XMLFlavor.get_schema('factur-x', 'minimum')
+        self.assertIs(schema, XMLFlavor.get_schema('factur-x', 'minimum'))
+
+    def test_preload_and_clear(self):
+        XMLFlavor.preload_schemas()
+        for level in FLAVORS['factur-x']['levels']:
+            self.assertIn(('factur-x', level), xml_flavor._SCHEMA_CACHE)
+
+        XMLFlavor.clear_schema_cache(level='minimum')
+        self.assertNotIn(('factur-x', 'minimum'), xml_flavor._SCHEMA_CACHE)
+        self.assertIn(('factur-x', 'basic'), xml_flavor._SCHEMA_CACHE)
+
+        XMLFlavor.clear_schema_cache()
+        self.assertEqual(xml_flavor._SCHEMA_CACHE, {})
+
+    def test_errors_from_threads(self):
+        flavor, valid_xml = XMLFlavor.from_template('factur-x', 'minimum')
+        invalid_xml = copy.deepcopy(valid_xml)
+        etree.SubElement(invalid_xml, 'unexpected').text = 'x'
+
+        def validate(_):
+            # valid documents clear the error log of the shared schema
+            for _ in range(2000):
+                self.assertEqual(flavor.xsd_errors(valid_xml), [])
+                self.assertTrue(flavor.xsd_errors(invalid_xml))
+
+        with futures.ThreadPoolExecutor(4) as executor:
+            list(executor.map(validate, range(4)))
+
+
+class TestTemplatePool(unittest.TestCase):
+    """Test the cached master XML templates"""
+
+    def setUp(self):
+        self.test_file = os.path.join(os.path.dirname(__file__), 'sample_invoices', 'no_embedded_data.pdf')
+
+    def tearDown(self):
+        XMLFlavor.clear_template_cache()
+
+    def test_no_disk_io_once_loaded(self):
+        XMLFlavor.preload_templates('factur-x')
+        with mock.patch.object(xml_flavor, 'open', side_effect=AssertionError, create=True), \
+                mock.patch.object(XMLFlavor, 'check_xsd', side_effect=AssertionError):
+            flavor, xml = XMLFlavor.from_template('factur-x', 'basic')
+        self.assertEqual(flavor.level, 'basic')
+        # every invoice gets its own tree
+        self.assertIsNot(xml, XMLFlavor.from_template('factur-x', 'basic')[1])
+        self.assertIsNot(xml, XMLFlavor.get_template('factur-x', 'basic'))
+
+    def test_register_template(self):
+        template = copy.deepcopy(XMLFlavor.get_template('factur-x', 'minimum'))
+        template.xpath(FIELDS['seller_name']['_path']['factur-x'], namespaces=template.nsmap)[0].text = 'ACME'
+        self.assertEqual(XMLFlavor.register_template(etree.tostring(template)), 'minimum')
+
+        factx = FacturX(self.test_file)
+        self.assertEqual(factx['seller_name'], 'ACME')
+        factx['seller_name'] = 'Other'
+        self.assertEqual(FacturX(self.test_file)['seller_name'], 'ACME')
+
+        XMLFlavor.clear_template_cache(level='minimum')
+        self.assertNotEqual(FacturX(self.test_file)['seller_name'], 'ACME')
+
+    def test_register_template_level_mismatch(self):
+        template = XMLFlavor.get_template('factur-x', 'minimum')
+        with self.assertRaises(ValueError):
+            XMLFlavor.register_template(template, level='en16931')
+        self.assertIsNot(XMLFlavor.get_template('factur-x', 'en16931'), template)
+        # EN 16931 XML is a valid base for the en16931_fe variant
+        self.assertEqual(XMLFlavor.register_template(XMLFlavor.get_template('factur-x', 'en16931'),
+                                                     level='en16931_fe'), 'en16931_fe')
+        XMLFlavor.clear_template_cache(level='en16931_fe')
+
+    def test_register_invalid_template(self):
+        template = copy.deepcopy(XMLFlavor.get_template('factur-x', 'minimum'))
+        template.append(etree.Element('unexpected'))
+        with self.assertRaises(Exception):
+            XMLFlavor.register_template(template)
+        self.assertIsNot(XMLFlavor.get_template('factur-x', 'minimum'), template)
+
+
 def main():
     unittest.main()
 
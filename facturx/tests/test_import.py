@@ -0,0 +1,82 @@
+import os
+import subprocess
+import sys
+import unittest
+from unittest import mock
+
+from facturx.flavors import xml_flavor
+from facturx.flavors import _codes, _tables
+
+# Cumulative `import facturx` time budget, in microseconds
+IMPORT_BUDGET_US = 50000
+
+HEAVY_MODULES = ('lxml', 'pypdf', 'yaml', 'pycountry', 'asyncio')
+
+
+def _import_time(statement):
+    """Run statement in a fresh interpreter, return ({module: cumulative us}, loaded heavy modules)."""
+    code = '%s; import sys; print(",".join(m for m in %r if m in sys.modules))' % (statement, HEAVY_MODULES)
+    # run twice so that the measured run does not pay for compiling .pyc files
+    for _ in range(2):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                                capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+    timings = {}
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line.split('|')
+            if cumulative.strip().isdigit():
+                timings[name.strip()] = int(cumulative)
+    loaded = [m for m in result.stdout.strip().split(',') if m]
+    return timings, loaded
+
+
+class TestImportTime(unittest.TestCase):
+
+    def test_import_budget(self):
+        timings, loaded = _import_time('import facturx')
+        self.assertEqual(loaded, [])
+        self.assertLess(timings['facturx'], IMPORT_BUDGET_US)
+
+    def test_lazy_dependencies(self):
+        _, loaded = _import_time('import facturx.flavors.xml_flavor, facturx.extract')
+        self.assertEqual(loaded, ['lxml'])
+        _, loaded = _import_time('from facturx import FacturX')
+        self.assertNotIn('yaml', loaded)
+        self.assertNotIn('pycountry', loaded)
+        self.assertNotIn('asyncio', loaded)
+
+
+class TestTables(unittest.TestCase):
+
+    def test_tables_are_up_to_date(self):
+        # run `python -m facturx.flavors.generate_tables` after editing the YAML files
+        self.assertEqual(_tables.YAML_SHA256, xml_flavor.yaml_digests())
+        self.assertEqual(_tables.FIELDS, xml_flavor._load_yml('fields.yml'))
+        self.assertEqual(_tables.FLAVORS, xml_flavor._load_yml('flavors.yml'))
+
+    def test_codes_match_pycountry(self):
+        # other pycountry releases add or remove codes: only compare with the
+        # one the code sets were generated from
+        from importlib.metadata import PackageNotFoundError, version
+        try:
+            installed = version('pycountry')
+        except PackageNotFoundError:
+            self.skipTest('pycountry is not installed')
+        if installed != _codes.PYCOUNTRY_VERSION:
+            self.skipTest('code sets were generated with pycountry %s, not %s' % (_codes.PYCOUNTRY_VERSION, installed))
+        import pycountry
+        self.assertLessEqual({country.alpha_2 for country in pycountry.countries}, _codes.COUNTRY_CODES)
+        self.assertEqual({currency.alpha_3 for currency in pycountry.currencies}, _codes.CURRENCY_CODES)
+
+    def test_yaml_fallback(self):
+        with mock.patch.object(xml_flavor, 'yaml_digests', return_value={}), \
+                mock.patch.object(xml_flavor, '_load_yml', wraps=xml_flavor._load_yml) as load_yml:
+            fields, flavors = xml_flavor._load_tables()
+        self.assertEqual(load_yml.call_count, 2)
+        self.assertEqual(fields, xml_flavor.FIELDS)
+        self.assertEqual(flavors, xml_flavor.FLAVORS)
+
+
+if __name__ == '__main__':
+    unittest.main()
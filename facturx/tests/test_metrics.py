@@ -0,0 +1,109 @@
+import logging
+import os
+import unittest
+from unittest import mock
+
+from facturx.facturx import FacturX
+from facturx.utils import metrics
+
+SAMPLES_DIR = os.path.join(os.path.dirname(__file__), 'sample_invoices')
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.sink = metrics.add_sink(metrics.AggregatingSink())
+
+    def tearDown(self):
+        metrics.clear_sinks()
+
+    def names(self, kind):
+        return {name for k, name, tags in self.sink.snapshot() if k == kind}
+
+    def test_disabled(self):
+        metrics.clear_sinks()
+        self.assertFalse(metrics.enabled())
+        with mock.patch.object(metrics.time, 'perf_counter', side_effect=AssertionError):
+            factx = FacturX(os.path.join(SAMPLES_DIR, 'Facture_FR_EN16931.pdf'))
+            factx.is_valid()
+            factx.to_dict()
+            factx.to_pdf_bytes()
+        self.assertEqual(self.sink.snapshot(), {})
+
+    def test_open_phases(self):
+        FacturX(os.path.join(SAMPLES_DIR, 'Facture_FR_EN16931.pdf'))
+        self.assertTrue({'open.pdf', 'open.extract_xml', 'open.parse_xml', 'open.check_xsd'} <= self.names('span'))
+        self.assertGreater(self.sink.total('bytes_in', data='xml'), 0)
+
+        FacturX(os.path.join(SAMPLES_DIR, 'no_embedded_data.pdf'))
+        self.assertIn('open.template', self.names('span'))
+
+    def test_validation_and_export_phases(self):
+        factx = FacturX(os.path.join(SAMPLES_DIR, 'Facture_FR_EN16931.pdf'))
+        factx.is_valid()
+        factx.to_dict()
+        self.assertTrue({'is_valid.check_xsd', 'is_valid.required_fields', 'to_dict'} <= self.names('span'))
+
+    def test_write_phases_and_counters(self):
+        factx = FacturX(os.path.join(SAMPLES_DIR, 'no_embedded_data.pdf'))
+        pdf_bytes = factx.to_pdf_bytes()
+        self.assertTrue({'write.pages', 'write.attachment', 'write.output_intent', 'write.xmp',
+                         'write.serialize', 'serialize'} <= self.names('span'))
+        self.assertEqual(self.sink.total('bytes_out', data='pdf'), len(pdf_bytes))
+        self.assertEqual(self.sink.total('bytes_in', data='pdf'), factx.last_write_stats['bytes_in'])
+
+        factx.to_pdf_bytes(incremental=True)
+        key = ('span', 'write.serialize', (('incremental', True),))
+        self.assertEqual(self.sink.snapshot()[key]['count'], 1)
+
+    def test_cache_counters(self):
+        factx = FacturX(os.path.join(SAMPLES_DIR, 'Facture_FR_EN16931.pdf'))
+        factx.xml_bytes()
+        factx.xml_bytes()
+        self.assertEqual(self.sink.total('cache.miss', cache='serialization'), 1)
+        self.assertEqual(self.sink.total('cache.hit', cache='serialization'), 1)
+        FacturX(os.path.join(SAMPLES_DIR, 'Facture_FR_EN16931.pdf'))
+        self.assertGreaterEqual(self.sink.total('cache.hit', cache='schema'), 1)
+
+    def test_line_items_counter(self):
+        factx = FacturX(os.path.join(SAMPLES_DIR, 'Facture_FR_EN16931.pdf'))
+        factx.add_line_items({'line_id': str(n)} for n in range(5))
+        self.assertEqual(self.sink.total('line_items', kind='counter'), 5)
+
+    def test_callback_sink(self):
+        received = []
+        metrics.add_sink(received.append)
+        with metrics.span('custom', step=1):
+            metrics.count('things', 3)
+        self.assertEqual([(m.kind, m.name) for m in received], [('counter', 'things'), ('span', 'custom')])
+        self.assertEqual(received[1].tags, {'step': 1})
+        self.assertGreaterEqual(received[1].value, 0)
+
+        metrics.remove_sink(received.append)
+        metrics.count('things')
+        self.assertEqual(len(received), 2)
+
+    def test_failing_sink(self):
+        metrics.add_sink(mock.Mock(side_effect=RuntimeError))
+        with self.assertLogs('factur-x', logging.ERROR):
+            metrics.count('things')
+        # other sinks still receive the metric
+        self.assertEqual(self.sink.total('things'), 1)
+
+    def test_aggregation(self):
+        for value in (2, 5, 3):
+            metrics.count('things', value)
+        stats = self.sink.snapshot()[('counter', 'things', ())]
+        self.assertEqual(stats, {'count': 3, 'total': 10, 'min': 2, 'max': 5})
+        self.sink.reset()
+        self.assertEqual(self.sink.snapshot(), {})
+
+    def test_logging_sink(self):
+        metrics.add_sink(metrics.LoggingSink(level=logging.DEBUG))
+        with self.assertLogs('factur-x', logging.DEBUG) as logs:
+            with metrics.span('phase', cache='schema'):
+                pass
+        self.assertRegex(logs.output[0], r'span phase: \d+\.\d{3} ms cache=schema')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import unittest
+
+from facturx import FacturX
+from facturx.rules import NAMESPACES, RULES, check_rules
+
+SAMPLES_DIR = os.path.join(os.path.dirname(__file__), 'sample_invoices')
+SUMMATION = ('//ram:ApplicableHeaderTradeSettlement/ram:SpecifiedTradeSettlementHeaderMonetarySummation/')
+LINE = '//ram:IncludedSupplyChainTradeLineItem'
+
+
+class TestRules(unittest.TestCase):
+
+    def open(self, file_name='Facture_FR_EN16931.pdf'):
+        return FacturX(os.path.join(SAMPLES_DIR, file_name))
+
+    def set_text(self, inv, path, text, index=0):
+        inv.xml.xpath(path, namespaces=NAMESPACES)[index].text = text
+        inv.mark_modified()
+
+    def rules(self, inv):
+        return [violation.rule for violation in inv.check_rules()]
+
+    def test_samples(self):
+        for level in ('MINIMUM', 'BASICWL', 'BASIC', 'EN16931'):
+            for prefix in ('Facture_FR', 'Facture_UE', 'Avoir_FR_type380'):
+                inv = self.open('%s_%s.pdf' % (prefix, level))
+                self.assertEqual(inv.check_rules(), [], (prefix, level))
+
+    def test_totals(self):
+        inv = self.open()
+        self.set_text(inv, LINE + '/ram:SpecifiedLineTradeSettlement/'
+                      'ram:SpecifiedTradeSettlementLineMonetarySummation/ram:LineTotalAmount', '82.00')
+        violations = inv.check_rules()
+        self.assertEqual([v.rule for v in violations], ['BR-CO-10'])
+        self.assertIn('625.00', violations[0].message)
+        self.assertTrue(violations[0].location.endswith('ram:SpecifiedTradeSettlementHeaderMonetarySummation/'
+                                                        'ram:LineTotalAmount'))
+
+        inv = self.open()
+        self.set_text(inv, SUMMATION + 'ram:TaxTotalAmount', '46.26')
+        self.assertEqual(self.rules(inv), ['BR-CO-14', 'BR-CO-15'])
+
+        inv = self.open()
+        self.set_text(inv, SUMMATION + 'ram:TaxBasisTotalAmount', '624.00')
+        self.assertEqual(self.rules(inv), ['BR-CO-13', 'BR-CO-15'])
+
+        inv = self.open()
+        self.set_text(inv, SUMMATION + 'ram:DuePayableAmount', '470.16')
+        self.assertEqual(self.rules(inv), ['BR-CO-16'])
+
+    def test_vat_breakdown(self):
+        inv = self.open()
+        self.set_text(inv, '//ram:ApplicableHeaderTradeSettlement/ram:ApplicableTradeTax/ram:CalculatedAmount', '29.86',
+                      index=1)
+        violations = inv.check_rules()
+        self.assertEqual([v.rule for v in violations], ['BR-CO-14', 'BR-CO-17'])
+        self.assertIn('expected 29.87 (543.00 x 5.50%)', violations[1].message)
+        self.assertTrue(violations[1].location.endswith('ram:ApplicableTradeTax[2]/ram:CalculatedAmount'))
+
+    def test_line_rules(self):
+        inv = self.open()
+        tax = LINE + '/ram:SpecifiedLineTradeSettlement/ram:ApplicableTradeTax/'
+        self.set_text(inv, tax + 'ram:RateApplicablePercent', '0', index=0)
+        self.set_text(inv, tax + 'ram:CategoryCode', 'E', index=1)
+        self.set_text(inv, tax + 'ram:CategoryCode', 'Z', index=2)
+        self.set_text(inv, LINE + '/ram:SpecifiedTradeProduct/ram:Name', '', index=2)
+        violations = inv.check_rules()
+        self.assertEqual([v.rule for v in violations], ['BR-25', 'BR-S-05', 'BR-E-05', 'BR-Z-05'])
+        self.assertTrue(violations[0].location.endswith('ram:IncludedSupplyChainTradeLineItem[3]'))
+
+    def test_levels(self):
+        inv = self.open('Facture_FR_MINIMUM.pdf')
+        # MINIMUM has no lines nor paid amount
+        self.set_text(inv, SUMMATION + 'ram:DuePayableAmount', '1.00')
+        self.assertEqual(inv.check_rules(), [])
+        self.set_text(inv, SUMMATION + 'ram:GrandTotalAmount', '1.00')
+        self.assertEqual(self.rules(inv), ['BR-CO-15'])
+
+        inv = self.open('no_embedded_data.pdf')
+        self.assertIn('BR-02', self.rules(inv))
+
+    def test_selection(self):
+        inv = self.open()
+        self.set_text(inv, SUMMATION + 'ram:TaxTotalAmount', '46.26')
+        self.assertEqual([v.rule for v in inv.check_rules(['BR-CO-15'])], ['BR-CO-15'])
+        with self.assertRaises(ValueError):
+            inv.check_rules(['BR-XX'])
+        with self.assertRaises(ValueError):
+            check_rules(inv.xml, 'extended')
+        self.assertEqual(len(RULES), len(set(RULES)))
+
+    def test_validate_report(self):
+        inv = self.open()
+        self.set_text(inv, SUMMATION + 'ram:DuePayableAmount', '470.16')
+        self.assertEqual(inv.validate().rule_violations, [])
+        report = inv.validate(business_rules=True)
+        self.assertEqual([v.rule for v in report.rule_violations], ['BR-CO-16'])
+        self.assertFalse(report.valid)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import http.client
+import json
+import os
+import socket
+import threading
+import unittest
+import uuid
+from unittest import mock
+
+from facturx import FacturX, extract_xml_bytes
+from facturx import server
+
+SAMPLES_DIR = os.path.join(os.path.dirname(__file__), 'sample_invoices')
+
+
+def read_sample(file_name):
+    with open(os.path.join(SAMPLES_DIR, file_name), 'rb') as f:
+        return f.read()
+
+
+def form_data(**parts):
+    boundary = uuid.uuid4().hex
+    body = b''.join(b'--%s\r\nContent-Disposition: form-data; name="%s"; filename="%s"\r\n'
+                    b'Content-Type: application/octet-stream\r\n\r\n%s\r\n' % (
+                        boundary.encode(), name.encode(), name.encode(), data) for name, data in parts.items())
+    return body + b'--%s--\r\n' % boundary.encode(), 'multipart/form-data; boundary=' + boundary
+
+
+class TestServer(unittest.TestCase):
+
+    def setUp(self):
+        self.server = server.make_server(port=0, jobs=2, executor='thread', max_pending=2, max_body_size=1024 * 1024)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.pdf = read_sample('Facture_FR_EN16931.pdf')
+
+    def request(self, method, path, body=None, content_type='application/pdf'):
+        connection = http.client.HTTPConnection(*self.server.server_address[:2])
+        try:
+            connection.request(method, path, body=body, headers={'Content-Type': content_type})
+            response = connection.getresponse()
+            payload = response.read()
+        finally:
+            connection.close()
+        if response.getheader('Content-Type') == 'application/json':
+            payload = json.loads(payload)
+        return response, payload
+
+    def test_endpoints(self):
+        response, payload = self.request('POST', '/extract', self.pdf)
+        self.assertEqual((response.status, payload), (200, extract_xml_bytes(self.pdf)))
+        self.assertEqual(response.getheader('Content-Type'), 'application/xml')
+
+        response, payload = self.request('POST', '/to-dict', self.pdf)
+        self.assertEqual((response.status, payload), (200, FacturX(self.pdf).to_dict()))
+
+        response, payload = self.request('POST', '/validate?rules=1', self.pdf)
+        report = FacturX(self.pdf).validate(business_rules=True)
+        self.assertEqual(response.status, 200)
+        self.assertEqual((payload['level'], payload['valid'], payload['missing_fields']),
+                         ('en16931', report.valid, report.missing_fields))
+        self.assertEqual(payload['rule_violations'], [])
+
+        response, payload = self.request('GET', '/health')
+        self.assertEqual(payload, {'status': 'ok', 'pending': 0})
+
+    def test_embed(self):
+        xml_bytes = extract_xml_bytes(read_sample('Facture_FR_MINIMUM.pdf'))
+        body, content_type = form_data(pdf=read_sample('no_embedded_data.pdf'), xml=xml_bytes)
+        response, payload = self.request('POST', '/embed?incremental=1', body, content_type)
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader('Content-Type'), 'application/pdf')
+        # empty elements are removed on write, compare the fields
+        expected = FacturX(read_sample('Facture_FR_MINIMUM.pdf'))
+        with FacturX(payload, validation='off') as written:
+            for field_name in ('invoice_number', 'seller_name', 'amount_total'):
+                self.assertEqual(written[field_name], expected[field_name])
+
+        response, payload = self.request('POST', '/embed', self.pdf)
+        self.assertEqual(response.status, 400)
+
+    def test_errors(self):
+        response, payload = self.request('POST', '/to-dict', b'not a PDF')
+        self.assertEqual(response.status, 422)
+        self.assertIn('error', payload)
+        response, payload = self.request('POST', '/extract', read_sample('no_embedded_data.pdf'))
+        self.assertEqual(response.status, 422)
+        self.assertEqual(self.request('POST', '/unknown', self.pdf)[0].status, 404)
+        self.assertEqual(self.request('GET', '/unknown')[0].status, 404)
+
+    def test_body_too_large(self):
+        # only the headers are sent: the body is refused before being read
+        with socket.create_connection(self.server.server_address[:2]) as client:
+            client.sendall(b'POST /to-dict HTTP/1.1\r\nHost: localhost\r\nContent-Length: %d\r\n\r\n'
+                           % (1024 * 1024 + 1))
+            response = http.client.HTTPResponse(client)
+            response.begin()
+            self.assertEqual(response.status, 413)
+            self.assertIn('error', json.loads(response.read()))
+
+    def test_backpressure(self):
+        started, release = threading.Semaphore(0), threading.Event()
+
+        def blocking(body, options):
+            started.release()
+            release.wait()
+            return 200, 'application/json', b'{}'
+
+        with mock.patch.dict(server._HANDLERS, {'to-dict': blocking}):
+            results = []
+            clients = [threading.Thread(target=lambda: results.append(self.request('POST', '/to-dict', self.pdf)))
+                       for _ in range(2)]
+            for client in clients:
+                client.start()
+            started.acquire()
+            started.acquire()
+            response, payload = self.request('POST', '/to-dict', self.pdf)
+            self.assertEqual(response.status, 503)
+            self.assertEqual(response.getheader('Retry-After'), '1')
+            self.assertEqual(self.request('GET', '/health')[1]['pending'], 2)
+            release.set()
+            for client in clients:
+                client.join()
+        self.assertEqual([response.status for response, _ in results], [200, 200])
+        self.assertEqual(self.server.pending, 0)
+
+    def test_unknown_executor(self):
+        with self.assertRaises(ValueError):
+            server.make_server(port=0, executor='serial')
+
+
+if __name__ == '__main__':
+    unittest.main()
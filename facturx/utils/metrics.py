@@ -0,0 +1,162 @@
+"""
+Opt-in instrumentation: timing spans and counters sent to pluggable sinks.
+
+Nothing is measured until a sink is installed with add_sink(). Without sinks,
+span() returns a shared no-op context manager and count() returns at once, so
+instrumented code pays one function call and no clock read.
+
+A sink is any callable receiving a Metric:
+- kind: 'span' (value in seconds) or 'counter' (value is the increment),
+- name: dotted phase or counter name, e.g. 'open.check_xsd', 'cache.hit',
+- value,
+- tags: dict of extra dimensions, e.g. {'cache': 'schema'}.
+
+Sinks may be called from several threads at once.
+"""
+
+import collections
+import logging
+import threading
+import time
+
+from facturx.utils.logger import logger
+
+__all__ = ['AggregatingSink', 'LoggingSink', 'Metric', 'add_sink', 'clear_sinks', 'count', 'enabled',
+           'remove_sink', 'span']
+
+Metric = collections.namedtuple('Metric', ['kind', 'name', 'value', 'tags'])
+
+# Replaced, never mutated, so that emitting needs no lock
+_sinks = ()
+_sinks_lock = threading.Lock()
+
+
+def add_sink(sink):
+    """Start sending metrics to sink, a callable taking a Metric."""
+    global _sinks
+    with _sinks_lock:
+        _sinks = _sinks + (sink,)
+    return sink
+
+
+def remove_sink(sink):
+    global _sinks
+    with _sinks_lock:
+        _sinks = tuple(s for s in _sinks if s != sink)
+
+
+def clear_sinks():
+    global _sinks
+    with _sinks_lock:
+        _sinks = ()
+
+
+def enabled():
+    """Whether metrics are collected. Guard costly measurements with it."""
+    return bool(_sinks)
+
+
+def _emit(metric):
+    for sink in _sinks:
+        try:
+            sink(metric)
+        except Exception:
+            # a broken sink must not break invoice processing
+            logger.exception('Metrics sink %r failed', sink)
+
+
+class _NullSpan(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span(object):
+    __slots__ = ('name', 'tags', 'start')
+
+    def __init__(self, name, tags):
+        self.name = name
+        self.tags = tags
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _emit(Metric('span', self.name, time.perf_counter() - self.start, self.tags))
+        return False
+
+
+def span(name, **tags):
+    """Context manager timing the enclosed block as the phase name."""
+    if not _sinks:
+        return _NULL_SPAN
+    return _Span(name, tags)
+
+
+def count(name, value=1, **tags):
+    """Add value to the counter name."""
+    if _sinks:
+        _emit(Metric('counter', name, value, tags))
+
+
+class LoggingSink(object):
+    """Log every metric with the stdlib logging module."""
+
+    def __init__(self, logger_=None, level=logging.INFO):
+        self.logger = logger_ or logger
+        self.level = level
+
+    def __call__(self, metric):
+        tags = ''.join(' %s=%s' % item for item in sorted(metric.tags.items()))
+        if metric.kind == 'span':
+            self.logger.log(self.level, 'span %s: %.3f ms%s', metric.name, metric.value * 1000, tags)
+        else:
+            self.logger.log(self.level, 'counter %s: +%s%s', metric.name, metric.value, tags)
+
+
+class AggregatingSink(object):
+    """Aggregate metrics in memory, per kind, name and tags.
+
+    snapshot() returns {(kind, name, tags): {'count', 'total', 'min', 'max'}},
+    tags being a sorted tuple of (key, value) pairs. For counters, 'total' is
+    the counter value.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def __call__(self, metric):
+        key = (metric.kind, metric.name, tuple(sorted(metric.tags.items())))
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                self._stats[key] = {'count': 1, 'total': metric.value, 'min': metric.value, 'max': metric.value}
+            else:
+                stats['count'] += 1
+                stats['total'] += metric.value
+                stats['min'] = min(stats['min'], metric.value)
+                stats['max'] = max(stats['max'], metric.value)
+
+    def snapshot(self):
+        with self._lock:
+            return {key: dict(stats) for key, stats in self._stats.items()}
+
+    def total(self, name, kind=None, **tags):
+        """Sum the totals of name, over all tags unless some are given."""
+        wanted = set(tags.items())
+        with self._lock:
+            return sum(stats['total'] for (k, n, t), stats in self._stats.items()
+                       if n == name and (kind is None or k == kind) and wanted <= set(t))
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
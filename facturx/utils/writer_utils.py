@@ -1,10 +1,33 @@
+import os
+import re
+import threading
+import zlib
 from datetime import datetime
 
 from lxml import etree
-from pypdf.generic import (DictionaryObject, NumberObject, NameObject, create_string_object, DecodedStreamObject)
+from pypdf.generic import (DictionaryObject, NumberObject, NameObject, create_string_object, DecodedStreamObject,
+                           StreamObject)
 
+from facturx.utils import metrics
 from facturx.utils.logger import logger
 
+# sRGB IEC61966-2.1 profile shipped with the package, embedded as
+# OutputIntent when the original PDF has none.
+SRGB_ICC_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'icc', 'sRGB.icc')
+
+# ICC path -> Flate-compressed profile, read and compressed once per process
+_ICC_STREAM_CACHE = {}
+_ICC_STREAM_CACHE_LOCK = threading.Lock()
+
+# (flavor, level) -> XMP packet split around its variable parts, see get_xmp_template
+_XMP_TEMPLATE_CACHE = {}
+_XMP_TEMPLATE_LOCK = threading.Lock()
+_XMP_PLACEHOLDER_RE = re.compile(rb'@@facturx-(title|author|subject|timestamp)@@')
+# Same escaping and character checks as lxml text serialization
+_XMP_ESCAPES = {'&': '&amp;', '<': '&lt;', '>': '&gt;', '\r': '&#13;'}
+_XMP_ESCAPE_RE = re.compile('[&<>\r]')
+_XML_ILLEGAL_CHARS_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
 def get_metadata_timestamp():
     now_dt = datetime.now()
     meta_date = now_dt.strftime('%Y-%m-%dT%H:%M:%S+00:00')
@@ -43,7 +66,7 @@ def prepare_pdf_metadata_txt(pdf_metadata):
     }
     return info_dict
 
-def prepare_pdf_metadata_xml(xmp_level_str, xmp_filename, facturx_ext_schema_root, pdf_metadata):
+def prepare_pdf_metadata_xml(xmp_level_str, xmp_filename, facturx_ext_schema_root, pdf_metadata, timestamp=None):
     nsmap_x = {'x': 'adobe:ns:meta/'}
     nsmap_rdf = {'rdf': 'http://www.w3.org/1999/02/22-rdf-syntax-ns#'}
     nsmap_dc = {'dc': 'http://purl.org/dc/elements/1.1/'}
@@ -89,7 +112,8 @@ def prepare_pdf_metadata_xml(xmp_level_str, xmp_filename, facturx_ext_schema_roo
     desc_xmp.set(ns_rdf + 'about', '')
     creator = etree.SubElement(desc_xmp, ns_xmp + 'CreatorTool')
     creator.text = 'factur-x python lib'
-    timestamp = get_metadata_timestamp()
+    if timestamp is None:
+        timestamp = get_metadata_timestamp()
     etree.SubElement(desc_xmp, ns_xmp + 'CreateDate').text = timestamp
     etree.SubElement(desc_xmp, ns_xmp + 'ModifyDate').text = timestamp
 
@@ -109,6 +133,52 @@ def prepare_pdf_metadata_xml(xmp_level_str, xmp_filename, facturx_ext_schema_roo
     logger.debug('metadata XML:')
     return xml_final_str
 
+def get_xmp_template(flavor):
+    """Return the XMP packet of a flavor and level, split around its variable parts.
+
+    The packet is built once by prepare_pdf_metadata_xml with placeholders, the
+    result alternates constant bytes and field names (title, author, subject,
+    timestamp).
+    """
+    key = (flavor.name, flavor.level)
+    template = _XMP_TEMPLATE_CACHE.get(key)
+    if template is None:
+        with _XMP_TEMPLATE_LOCK:
+            template = _XMP_TEMPLATE_CACHE.get(key)
+            if template is None:
+                metrics.count('cache.miss', cache='xmp_template')
+                placeholders = {name: '@@facturx-%s@@' % name for name in ('title', 'author', 'subject')}
+                xml_str = prepare_pdf_metadata_xml(
+                    flavor.details['levels'][flavor.level]['xmp_str'],
+                    flavor.details['xmp_filename'],
+                    flavor.get_xmp_xml(),
+                    placeholders,
+                    timestamp='@@facturx-timestamp@@')
+                template = tuple(_XMP_PLACEHOLDER_RE.split(xml_str))
+                _XMP_TEMPLATE_CACHE[key] = template
+    else:
+        metrics.count('cache.hit', cache='xmp_template')
+    return template
+
+def _escape_xmp_text(value):
+    if _XML_ILLEGAL_CHARS_RE.search(value):
+        raise ValueError('All strings must be XML compatible: Unicode or ASCII, no NULL bytes or control characters')
+    return _XMP_ESCAPE_RE.sub(lambda m: _XMP_ESCAPES[m.group()], value).encode('utf-8')
+
+def render_pdf_metadata_xml(flavor, pdf_metadata, timestamp=None):
+    """Fill the cached XMP template of flavor, same output as prepare_pdf_metadata_xml."""
+    values = {name: pdf_metadata.get(name, '') for name in ('title', 'author', 'subject')}
+    if not all(isinstance(value, str) for value in values.values()):
+        return prepare_pdf_metadata_xml(
+            flavor.details['levels'][flavor.level]['xmp_str'], flavor.details['xmp_filename'],
+            flavor.get_xmp_xml(), pdf_metadata, timestamp)
+    values['timestamp'] = get_metadata_timestamp() if timestamp is None else timestamp
+    template = get_xmp_template(flavor)
+    parts = list(template)
+    for i in range(1, len(parts), 2):
+        parts[i] = _escape_xmp_text(values[template[i].decode('ascii')])
+    return b''.join(parts)
+
 def get_original_output_intents(original_pdf):
     output_intents = []
     try:
@@ -134,14 +204,43 @@ def read_icc_profile(icc_path):
     with open(icc_path, "rb") as f:
         return f.read()
 
-def create_output_intent(self, icc_bytes, output_condition="sRGB IEC61966-2.1"):
-    # Create the ICC profile stream
-    icc_stream = DecodedStreamObject()
-    icc_stream.set_data(icc_bytes)
-    icc_stream.update({
+def get_icc_stream_data(icc_path=SRGB_ICC_PATH):
+    """Return the Flate-compressed content of an ICC profile, cached per path."""
+    data = _ICC_STREAM_CACHE.get(icc_path)
+    if data is None:
+        with _ICC_STREAM_CACHE_LOCK:
+            data = _ICC_STREAM_CACHE.get(icc_path)
+            if data is None:
+                metrics.count('cache.miss', cache='icc')
+                data = zlib.compress(read_icc_profile(icc_path))
+                _ICC_STREAM_CACHE[icc_path] = data
+    else:
+        metrics.count('cache.hit', cache='icc')
+    return data
+
+def create_icc_stream(icc_bytes=None):
+    """Build the ICC profile stream of an OutputIntent.
+
+    Without icc_bytes, the bundled sRGB profile is used: its compressed
+    content is shared by every stream, so no file is read and nothing is
+    compressed again.
+    """
+    if icc_bytes is not None:
+        icc_stream = DecodedStreamObject()
+        icc_stream.set_data(icc_bytes)
+        icc_stream.update({
+            NameObject("/N"): NumberObject(3),  # 3 components for RGB
+        })
+        return icc_stream
+    return StreamObject.initialize_from_dictionary({
         NameObject("/N"): NumberObject(3),  # 3 components for RGB
+        NameObject("/Filter"): NameObject("/FlateDecode"),
+        "__streamdata__": get_icc_stream_data(),
     })
-    icc_obj = self._add_object(icc_stream)
+
+def create_output_intent(self, icc_bytes=None, output_condition="sRGB IEC61966-2.1"):
+    # Create the ICC profile stream
+    icc_obj = self._add_object(create_icc_stream(icc_bytes))
 
     # Build OutputIntent dictionary
     output_intent_dict = DictionaryObject({